@@ -0,0 +1,728 @@
+"""
+Deterministic synthetic data for every GameLens table.
+
+    python -m bench.datagen --conn "host=... dbname=..." --runs 1000000
+
+Rows are generated run by run and streamed into one COPY per table, so memory
+stays flat however many runs are requested. The same seed always produces the
+same rows.
+"""
+
+import argparse
+import hashlib
+import random
+import time
+from bisect import bisect
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+import psycopg
+from psycopg.types.json import Json
+
+EVENT_TYPES = (
+    "room_enter",
+    "room_exit",
+    "boss_enter",
+    "boss_defeated",
+    "choice",
+    "death",
+)
+
+COLUMNS = {
+    "session": ("session_id", "game_id", "started_at", "ended_at"),
+    "run": (
+        "run_id",
+        "game_id",
+        "session_id",
+        "started_at",
+        "ended_at",
+        "end_reason",
+        "game_version",
+        "run_meta",
+    ),
+    "run_summary": (
+        "game_id",
+        "run_id",
+        "started_at",
+        "ended_at",
+        "duration_ms",
+        "result",
+        "final_stage_id",
+        "final_stage_index",
+        "final_room_index",
+        "total_damage_taken",
+        "choice_count",
+        "updated_at",
+    ),
+    "raw_capture": (
+        "capture_id",
+        "game_id",
+        "session_id",
+        "run_id",
+        "captured_at",
+        "received_at",
+        "input_device",
+        "input_code",
+        "mouse_x",
+        "mouse_y",
+        "screenshot_ref",
+        "screenshot_hash",
+        "image_width",
+        "image_height",
+        "status",
+        "process_attempts",
+        "game_version",
+    ),
+    "pipeline_job": (
+        "job_id",
+        "game_id",
+        "capture_id",
+        "run_id",
+        "status",
+        "attempts",
+        "pipeline_version",
+        "model_version",
+    ),
+    "event": (
+        "event_id",
+        "game_id",
+        "run_id",
+        "occurred_at",
+        "ingested_at",
+        "event_type_id",
+        "source_capture_id",
+        "confidence",
+        "pipeline_version",
+        "model_version",
+        "details",
+    ),
+    "room_summary": (
+        "game_id",
+        "run_id",
+        "room_seq",
+        "stage_index",
+        "stage_id",
+        "room_index",
+        "room_name_norm",
+        "entered_at",
+        "exited_at",
+        "completion_ms",
+        "damage_taken_in_room",
+        "updated_at",
+    ),
+    "boss_summary": (
+        "game_id",
+        "run_id",
+        "boss_seq",
+        "stage_index",
+        "stage_id",
+        "boss_name",
+        "entered_at",
+        "defeated_at",
+        "duration_ms",
+        "defeated",
+        "damage_taken_in_boss",
+        "updated_at",
+    ),
+    "choice_fact": (
+        "game_id",
+        "run_id",
+        "occurred_at",
+        "stage_index",
+        "stage_id",
+        "room_index",
+        "choice_context",
+        "selected_upgrade_id",
+        "options_present",
+        "updated_at",
+        "event_id",
+    ),
+    "death_fact": (
+        "game_id",
+        "run_id",
+        "occurred_at",
+        "level_index",
+        "level_name",
+        "room_index",
+        "hp",
+        "max_hp",
+        "upgrades_snapshot",
+        "updated_at",
+        "event_id",
+    ),
+}
+
+# Derived tables that triggers and the insert endpoints would normally
+# maintain. The load bypasses both, so these statements rebuild them afterwards.
+REBUILD_SQL = (
+    "TRUNCATE choice_upgrade_rollup",
+    """
+    INSERT INTO choice_upgrade_rollup
+        (game_id, game_version, selected_upgrade_id, picks, wins,
+         duration_sec_sum, duration_count, updated_at)
+    SELECT
+        r.game_id,
+        r.game_version,
+        cf.selected_upgrade_id,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE r.end_reason = 'win'),
+        COALESCE(SUM(EXTRACT(EPOCH FROM (r.ended_at - r.started_at))), 0),
+        COUNT(r.ended_at),
+        NOW()
+    FROM choice_fact cf
+    JOIN run r ON r.run_id = cf.run_id
+    WHERE r.game_version IS NOT NULL
+    GROUP BY r.game_id, r.game_version, cf.selected_upgrade_id
+    """,
+    "TRUNCATE choice_offer, upgrade",
+    """
+    INSERT INTO upgrade (game_id, name)
+    SELECT DISTINCT cf.game_id, o.name
+    FROM choice_fact cf
+    CROSS JOIN LATERAL choice_option_names(cf.options_present) o
+    """,
+    """
+    INSERT INTO choice_offer (choice_fact_id, position, option_id, picked)
+    SELECT cf.choice_fact_id, o.position, u.upgrade_id, o.name = cf.selected_upgrade_id
+    FROM choice_fact cf
+    CROSS JOIN LATERAL choice_option_names(cf.options_present) o
+    JOIN upgrade u ON u.game_id = cf.game_id AND u.name = o.name
+    """,
+    "TRUNCATE room_funnel_rollup",
+    """
+    INSERT INTO room_funnel_rollup
+        (game_id, game_version, room_name_norm, runs_entered, runs_ended_here,
+         completion_ms_sum, completion_count, updated_at)
+    SELECT
+        r.game_id,
+        r.game_version,
+        rs.room_name_norm,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE rs.exited_at IS NULL),
+        COALESCE(SUM(rs.completion_ms), 0),
+        COUNT(rs.completion_ms),
+        NOW()
+    FROM room_summary rs
+    JOIN run r ON r.run_id = rs.run_id
+    WHERE r.game_version IS NOT NULL AND rs.room_name_norm IS NOT NULL
+    GROUP BY r.game_id, r.game_version, rs.room_name_norm
+    """,
+    # Any non-zero counter will do; it only has to exist for the ETags.
+    "TRUNCATE data_watermark",
+    """
+    INSERT INTO data_watermark (game_id, game_version, shard, changes)
+    SELECT game_id, game_version, 0, COUNT(*)
+    FROM run
+    WHERE game_version IS NOT NULL
+    GROUP BY game_id, game_version
+    """,
+    "TRUNCATE event_hourly_rollup",
+    """
+    INSERT INTO event_hourly_rollup (game_id, bucket, event_type_id, shard, events)
+    SELECT game_id, date_trunc('hour', occurred_at), event_type_id, 0, COUNT(*)
+    FROM event
+    GROUP BY 1, 2, 3
+    """,
+    "TRUNCATE metric_sketch",
+    """
+    INSERT INTO metric_sketch (game_id, game_version, metric, key, day, bin, shard, count)
+    SELECT game_id, game_version, metric, key, day, metric_sketch_bin(value), 0, COUNT(*)
+    FROM (
+        SELECT r.game_id, r.game_version, 'run_duration_ms' AS metric, '' AS key,
+            r.started_at::date AS day,
+            EXTRACT(EPOCH FROM (r.ended_at - r.started_at)) * 1000 AS value
+        FROM run r
+        UNION ALL
+        SELECT r.game_id, r.game_version, m.metric, '', c.entered_at::date, m.value
+        FROM room_summary c
+        JOIN run r ON r.run_id = c.run_id
+        CROSS JOIN LATERAL (VALUES
+            ('room_completion_ms', c.completion_ms::double precision),
+            ('room_damage_taken', c.damage_taken_in_room::double precision)
+        ) AS m(metric, value)
+        UNION ALL
+        SELECT r.game_id, r.game_version, m.metric, '', c.entered_at::date, m.value
+        FROM boss_summary c
+        JOIN run r ON r.run_id = c.run_id
+        CROSS JOIN LATERAL (VALUES
+            ('boss_duration_ms', c.duration_ms::double precision),
+            ('boss_damage_taken', c.damage_taken_in_boss::double precision)
+        ) AS m(metric, value)
+        UNION ALL
+        SELECT r.game_id, r.game_version, 'run_damage_taken', '', c.started_at::date,
+            c.total_damage_taken
+        FROM run_summary c
+        JOIN run r ON r.run_id = c.run_id
+        UNION ALL
+        SELECT r.game_id, r.game_version, 'choice_run_duration_ms',
+            cf.selected_upgrade_id, r.started_at::date,
+            EXTRACT(EPOCH FROM (r.ended_at - r.started_at)) * 1000
+        FROM choice_fact cf
+        JOIN run r ON r.run_id = cf.run_id
+    ) samples
+    WHERE game_version IS NOT NULL AND value IS NOT NULL AND day IS NOT NULL
+        AND key IS NOT NULL
+    GROUP BY 1, 2, 3, 4, 5, 6
+    """,
+)
+
+
+def zipf_weights(n, s=1.1):
+    """
+    Cumulative Zipf weights: rank 0 is the hottest item.
+    """
+    return list(accumulate(1 / (rank + 1) ** s for rank in range(n)))
+
+
+def pick(rng, items, cum_weights):
+    return items[bisect(cum_weights, rng.random() * cum_weights[-1])]
+
+
+class GameSpec:
+    def __init__(self, game_id, stages=4, rooms_per_stage=12, upgrades=60, versions=5):
+        self.game_id = game_id
+        self.stage_ids = [f"{game_id}-stage-{i}" for i in range(stages)]
+        self.rooms = [
+            [f"{game_id}-s{i}-room-{j}" for j in range(rooms_per_stage)]
+            for i in range(stages)
+        ]
+        self.room_weights = zipf_weights(rooms_per_stage)
+        # Hot rooms are also the deadly ones.
+        self.room_death_rate = [0.12 / (1 + j) ** 0.5 for j in range(rooms_per_stage)]
+        self.bosses = [f"{game_id}:boss-{i}" for i in range(stages)]
+        self.upgrades = [f"upgrade-{i}" for i in range(upgrades)]
+        self.upgrade_weights = zipf_weights(upgrades, s=0.9)
+        self.versions = [f"1.{i}.0" for i in range(versions)]
+
+
+class Generator:
+    """
+    Produces the rows of each run from a per-run RNG, so the output depends
+    only on the seed and the run count.
+    """
+
+    def __init__(self, seed, runs, games=2, runs_per_session=4, days=90):
+        self.seed = seed
+        self.runs = runs
+        self.games = [GameSpec(f"game-{i}") for i in range(games)]
+        self.runs_per_session = runs_per_session
+        self.start = datetime(2026, 1, 1)
+        self.span = timedelta(days=days)
+        self.event_id = 0
+        self.event_types = {}
+        # room_enter events of the first game, which no fact row refers to;
+        # the benchmark attaches its death and choice inserts to them.
+        self.free_event_ids = []
+
+    def run_rng(self, index):
+        return random.Random(f"{self.seed}:{index}")
+
+    def version_for(self, game, rng, position):
+        # Versions ship evenly over the time span; most players are on the
+        # newest one, the rest lag one behind.
+        released = min(len(game.versions) - 1, int(position * len(game.versions)))
+        if released > 0 and rng.random() < 0.15:
+            released -= 1
+        return game.versions[released]
+
+    def next_event(self, game, run_id, at, type_name, details, capture_id=None):
+        self.event_id += 1
+        return (
+            self.event_id,
+            game.game_id,
+            run_id,
+            at,
+            at + timedelta(milliseconds=300),
+            self.event_types[type_name],
+            capture_id,
+            0.9 if capture_id else None,
+            "pipeline-1" if capture_id else None,
+            "model-1" if capture_id else None,
+            Json(details),
+        )
+
+    def rows(self):
+        """
+        Yields (table, row) pairs in an order that satisfies every foreign
+        key when the tables are loaded side by side.
+        """
+        for index in range(self.runs):
+            rng = self.run_rng(index)
+            game = self.games[index % len(self.games)]
+            session_index = index // (self.runs_per_session * len(self.games))
+            session_id = f"{game.game_id}-session-{session_index}"
+            position = index / max(self.runs, 1)
+            started = self.start + self.span * position
+            version = self.version_for(game, rng, position)
+            run_id = f"{game.game_id}-run-{index}"
+
+            if index % (self.runs_per_session * len(self.games)) < len(self.games):
+                yield "session", (session_id, game.game_id, started, None)
+
+            yield from self.run_rows(rng, game, session_id, run_id, started, version)
+
+    def run_rows(self, rng, game, session_id, run_id, started, version):
+        at = started
+        room_seq = 0
+        boss_seq = 0
+        damage_total = 0
+        picked = []
+        child_rows = []
+        end_reason = "win"
+        final_stage, final_room = 0, 0
+
+        for stage_index, stage_id in enumerate(game.stage_ids):
+            for _ in range(rng.randint(3, 6)):
+                room_name = pick(rng, game.rooms[stage_index], game.room_weights)
+                room_index = game.rooms[stage_index].index(room_name)
+                completion_ms = int(rng.lognormvariate(10, 0.5))
+                damage = int(rng.expovariate(1 / 20))
+                damage_total += damage
+                died = rng.random() < game.room_death_rate[room_index]
+                quit_run = not died and rng.random() < 0.01
+
+                capture_id = None
+                if rng.random() < 0.5:
+                    capture_id = f"{run_id}-cap-{room_seq}"
+                    digest = hashlib.sha1(f"{room_name}:{rng.randint(0, 50)}".encode())
+                    status = "done" if rng.random() < 0.9 else "pending"
+                    child_rows.append(
+                        (
+                            "raw_capture",
+                            (
+                                capture_id,
+                                game.game_id,
+                                session_id,
+                                run_id,
+                                at,
+                                at + timedelta(milliseconds=200),
+                                "keyboard",
+                                "KeyE",
+                                rng.randint(0, 1920),
+                                rng.randint(0, 1080),
+                                f"frames/{digest.hexdigest()}.png",
+                                digest.hexdigest(),
+                                1920,
+                                1080,
+                                status,
+                                1 if status == "done" else 0,
+                                version,
+                            ),
+                        )
+                    )
+                    child_rows.append(
+                        (
+                            "pipeline_job",
+                            (
+                                f"job-{capture_id}",
+                                game.game_id,
+                                capture_id,
+                                run_id,
+                                status,
+                                1 if status == "done" else 0,
+                                "pipeline-1",
+                                "model-1",
+                            ),
+                        )
+                    )
+                child_rows.append(
+                    (
+                        "event",
+                        self.next_event(
+                            game,
+                            run_id,
+                            at,
+                            "room_enter",
+                            {"room": room_name},
+                            capture_id,
+                        ),
+                    )
+                )
+                if game is self.games[0] and len(self.free_event_ids) < 100000:
+                    self.free_event_ids.append(self.event_id)
+
+                exited = (
+                    None
+                    if died or quit_run
+                    else at + timedelta(milliseconds=completion_ms)
+                )
+                child_rows.append(
+                    (
+                        "room_summary",
+                        (
+                            game.game_id,
+                            run_id,
+                            room_seq,
+                            stage_index,
+                            stage_id,
+                            room_index,
+                            room_name,
+                            at,
+                            exited,
+                            None if exited is None else completion_ms,
+                            damage,
+                            at,
+                        ),
+                    )
+                )
+                room_seq += 1
+                final_stage, final_room = stage_index, room_index
+                at += timedelta(milliseconds=completion_ms)
+
+                if died:
+                    event = self.next_event(
+                        game, run_id, at, "death", {"room": room_name}
+                    )
+                    child_rows.append(("event", event))
+                    child_rows.append(
+                        (
+                            "death_fact",
+                            (
+                                game.game_id,
+                                run_id,
+                                at,
+                                stage_index,
+                                stage_id,
+                                room_index,
+                                0,
+                                100,
+                                Json({"upgrades": picked}),
+                                at,
+                                event[0],
+                            ),
+                        )
+                    )
+                    end_reason = "loss"
+                    break
+                if quit_run:
+                    end_reason = "quit"
+                    break
+
+                if rng.random() < 0.4:
+                    options = set()
+                    while len(options) < 3:
+                        options.add(pick(rng, game.upgrades, game.upgrade_weights))
+                    options = sorted(options, key=game.upgrades.index)
+                    # Players lean towards the most popular option on offer.
+                    selected = options[0] if rng.random() < 0.6 else rng.choice(options)
+                    picked.append(selected)
+                    event = self.next_event(
+                        game, run_id, at, "choice", {"selected": selected}
+                    )
+                    child_rows.append(("event", event))
+                    child_rows.append(
+                        (
+                            "choice_fact",
+                            (
+                                game.game_id,
+                                run_id,
+                                at,
+                                stage_index,
+                                stage_id,
+                                room_index,
+                                "room_reward",
+                                selected,
+                                Json({"options": options}),
+                                at,
+                                event[0],
+                            ),
+                        )
+                    )
+            else:
+                boss = game.bosses[stage_index]
+                duration_ms = int(rng.lognormvariate(11, 0.4))
+                defeated = rng.random() < 0.75
+                damage = int(rng.expovariate(1 / 60))
+                damage_total += damage
+                child_rows.append(
+                    (
+                        "event",
+                        self.next_event(game, run_id, at, "boss_enter", {"boss": boss}),
+                    )
+                )
+                end = at + timedelta(milliseconds=duration_ms)
+                child_rows.append(
+                    (
+                        "boss_summary",
+                        (
+                            game.game_id,
+                            run_id,
+                            boss_seq,
+                            stage_index,
+                            stage_id,
+                            boss,
+                            at,
+                            end if defeated else None,
+                            duration_ms,
+                            defeated,
+                            damage,
+                            end,
+                        ),
+                    )
+                )
+                boss_seq += 1
+                at = end
+                if defeated:
+                    child_rows.append(
+                        (
+                            "event",
+                            self.next_event(
+                                game, run_id, at, "boss_defeated", {"boss": boss}
+                            ),
+                        )
+                    )
+                    continue
+                end_reason = "loss"
+            break
+
+        yield (
+            "run",
+            (
+                run_id,
+                game.game_id,
+                session_id,
+                started,
+                at,
+                end_reason,
+                version,
+                Json({"seed": self.seed}),
+            ),
+        )
+        yield from child_rows
+        yield (
+            "run_summary",
+            (
+                game.game_id,
+                run_id,
+                started,
+                at,
+                int((at - started).total_seconds() * 1000),
+                end_reason,
+                game.stage_ids[final_stage],
+                final_stage,
+                final_room,
+                damage_total,
+                len(picked),
+                at,
+            ),
+        )
+
+
+def load(conn_str, runs, seed=42, games=2, report_every=100000):
+    """
+    Creates the dimension rows, streams every run into per-table COPYs and
+    rebuilds derived tables. Returns a context dict for the workload.
+    """
+    generator = Generator(seed, runs, games=games)
+
+    with psycopg.connect(conn_str, autocommit=True) as conn:
+        for game in generator.games:
+            conn.execute(
+                "INSERT INTO game (game_id, name, created_at) VALUES (%s, %s, %s)",
+                (game.game_id, game.game_id.title(), generator.start),
+            )
+            for index, stage_id in enumerate(game.stage_ids):
+                conn.execute(
+                    """
+                    INSERT INTO stage
+                    (stage_id, game_id, stage_index, name_norm, first_seen_at, last_seen_at)
+                    VALUES (%s, %s, %s, %s, %s, %s)
+                    """,
+                    (
+                        stage_id,
+                        game.game_id,
+                        index,
+                        f"stage-{index}",
+                        generator.start,
+                        generator.start + generator.span,
+                    ),
+                )
+            for boss in game.bosses:
+                conn.execute(
+                    "INSERT INTO boss (boss_name, game_id) VALUES (%s, %s)",
+                    (boss, game.game_id),
+                )
+        for name in EVENT_TYPES:
+            row = conn.execute(
+                "INSERT INTO event_type (name) VALUES (%s) RETURNING id", (name,)
+            ).fetchone()
+            generator.event_types[name] = row[0]
+        for table in ("event", "raw_capture"):
+            conn.execute(
+                "SELECT ensure_monthly_partitions(%s, %s, %s)",
+                (table, generator.start, generator.start + generator.span),
+            )
+
+    # One connection per table so every COPY can stay open for the whole
+    # pass. Replica mode skips foreign-key and rollup triggers; the rows are
+    # consistent by construction and derived tables are rebuilt below.
+    started = time.perf_counter()
+    counts = dict.fromkeys(COLUMNS, 0)
+    with ExitStack() as stack:
+        conns, copies = {}, {}
+        for table, columns in COLUMNS.items():
+            conn = conns[table] = stack.enter_context(psycopg.connect(conn_str))
+            conn.execute("SET session_replication_role = replica")
+            copies[table] = stack.enter_context(
+                conn.cursor().copy(f"COPY {table} ({', '.join(columns)}) FROM STDIN")
+            )
+
+        total = 0
+        for table, row in generator.rows():
+            copies[table].write_row(row)
+            counts[table] += 1
+            total += 1
+            if report_every and total % report_every == 0:
+                rate = total / (time.perf_counter() - started)
+                print(f"  {total:,} rows ({rate:,.0f} rows/s)")
+        # Closing the stack finishes each COPY, then commits its connection.
+
+    with psycopg.connect(conn_str, autocommit=True) as conn:
+        conn.execute(
+            "SELECT setval('event_event_id_seq', GREATEST(%s, 1), %s)",
+            (generator.event_id, generator.event_id > 0),
+        )
+        for statement in REBUILD_SQL:
+            conn.execute(statement)
+        conn.execute("ANALYZE")
+
+    game = generator.games[0]
+    return {
+        "game_id": game.game_id,
+        "versions": tuple(game.versions),
+        "run_ids": [
+            f"{game.game_id}-run-{i}" for i in range(0, runs, len(generator.games))
+        ][:10000],
+        "session_ids": [
+            f"{game.game_id}-session-{i}"
+            for i in range(
+                (runs - 1) // (generator.runs_per_session * len(generator.games)) + 1
+            )
+        ][:10000],
+        "event_ids": generator.free_event_ids,
+        "event_type_id": generator.event_types["room_enter"],
+        "span": (generator.start, generator.start + generator.span),
+        "bosses": tuple(game.bosses),
+        "upgrades": tuple(game.upgrades),
+        "counts": counts,
+        "load_seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conn", required=True, help="PostgreSQL connection string")
+    parser.add_argument("--runs", type=int, default=100000)
+    parser.add_argument("--games", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    ctx = load(args.conn, args.runs, seed=args.seed, games=args.games)
+    for table, count in ctx["counts"].items():
+        print(f"{table:<14}{count:>14,}")
+    print(f"Loaded in {ctx['load_seconds']}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+import time
+from pathlib import Path
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _binary(name):
+    path = shutil.which(name)
+    if path is None:
+        pg_bin = os.environ.get("PG_BIN")
+        if pg_bin and Path(pg_bin, name).exists():
+            return str(Path(pg_bin, name))
+        raise RuntimeError(
+            f"{name} not found; put the PostgreSQL binaries on PATH or set PG_BIN"
+        )
+    return path
+
+
+class LocalPostgres:
+    """
+    A throwaway PostgreSQL cluster in a temporary directory.
+
+    Usage:
+        with LocalPostgres() as pg:
+            pg.load_schema()
+            conn_str = pg.conn_str
+    """
+
+    def __init__(self, port=None, settings=None):
+        self.port = port or _free_port()
+        self.settings = {
+            "fsync": "off",
+            "synchronous_commit": "off",
+            "full_page_writes": "off",
+            "shared_buffers": "256MB",
+            "max_connections": "200",
+            **(settings or {}),
+        }
+        self.data_dir = None
+
+    @property
+    def conn_str(self):
+        return f"host=127.0.0.1 port={self.port} dbname=postgres user=postgres"
+
+    def __enter__(self):
+        self.data_dir = tempfile.mkdtemp(prefix="gamelens-bench-")
+        subprocess.run(
+            [_binary("initdb"), "-D", self.data_dir, "-U", "postgres", "-A", "trust"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        options = " ".join(f"-c {key}={value}" for key, value in self.settings.items())
+        subprocess.run(
+            [
+                _binary("pg_ctl"),
+                "-D",
+                self.data_dir,
+                "-l",
+                os.path.join(self.data_dir, "server.log"),
+                "-o",
+                f"-p {self.port} -k {self.data_dir} {options}",
+                "-w",
+                "start",
+            ],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run(
+            [_binary("pg_ctl"), "-D", self.data_dir, "-m", "immediate", "stop"],
+            stdout=subprocess.DEVNULL,
+        )
+        shutil.rmtree(self.data_dir, ignore_errors=True)
+
+    def load_schema(self):
+        from src.migrate import migrate
+
+        migrate(self.conn_str)
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port} after {timeout}s")
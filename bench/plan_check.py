@@ -0,0 +1,207 @@
+"""
+Fails when a dashboard query plans a sequential scan over a large table.
+
+    python -m bench.plan_check --runs 20000
+    python -m bench.plan_check --conn "$PGSQL_CONN"
+
+A database given with --conn is only read: it is neither migrated nor
+seeded unless --seed-existing is passed. Every GET dashboard route is called through the Flask test client while the
+statements it runs are recorded; each one is then re-run under
+EXPLAIN (FORMAT JSON) and its plan tree is searched for Seq Scan nodes.
+"""
+
+import argparse
+import os
+import sys
+from contextlib import nullcontext
+from datetime import timedelta
+from pathlib import Path
+
+import psycopg
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# (path, extra query or a function of the context returning it) --
+# game_id and game_version are always added
+ROUTES = (
+    ("/runs/overview", {}),
+    ("/runs/percentiles", {}),
+    (
+        "/runs/percentiles",
+        lambda ctx: {
+            "from": (ctx["span"][1] - timedelta(days=30)).date().isoformat(),
+            "to": ctx["span"][1].date().isoformat(),
+        },
+    ),
+    ("/rooms/rooms/progression", {}),
+    ("/events/choices", {}),
+    ("/events/choices/offers", {}),
+    ("/events/boss", {}),
+    ("/events/boss", {"limit": 50}),
+    ("/events/death", {}),
+    ("/events/death", {"view": "raw", "limit": 50}),
+    # Rollup for whole hours, raw events for sub-hour buckets.
+    ("/events/timeseries", lambda ctx: _window(ctx, "hour", days=7)),
+    ("/events/timeseries", lambda ctx: _window(ctx, "5m", days=1)),
+)
+
+
+def _window(ctx, bucket, days):
+    end = ctx["span"][1]
+    return {
+        "bucket": bucket,
+        "from": (end - timedelta(days=days)).isoformat(),
+        "to": end.isoformat(),
+    }
+
+
+def record_queries(conn_str, ctx):
+    """
+    Calls every route once and returns the (route, query, params) it ran.
+    """
+    os.environ["PGSQL_CONN"] = conn_str
+    os.environ["CACHE_BACKEND"] = "none"
+    os.environ["INGEST_BUFFER"] = "false"
+    sys.path.insert(0, str(ROOT))
+
+    from src.db import DatabaseConnection
+    from src.metrics import TimedCursor
+
+    recorded = []
+    current = {}
+
+    class RecordingCursor(TimedCursor):
+        def execute(self, query, params=None, **kwargs):
+            recorded.append((current["route"], query, params))
+            return super().execute(query, params, **kwargs)
+
+    def configure(conn):
+        conn.cursor_factory = RecordingCursor
+
+    DatabaseConnection._configure = staticmethod(configure)
+
+    from src.api import app
+
+    client = app.test_client()
+    for path, extra in ROUTES:
+        if callable(extra):
+            extra = extra(ctx)
+        query = {
+            "game_id": ctx["game_id"],
+            "game_version": ctx["versions"][0],
+            **extra,
+        }
+        current["route"] = path + "".join(f" {k}={v}" for k, v in extra.items())
+        response = client.get("/api/v1/dashboard" + path, query_string=query)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+    return recorded
+
+
+def seq_scans(plan):
+    if plan.get("Node Type") == "Seq Scan":
+        yield plan["Relation Name"]
+    for child in plan.get("Plans", ()):
+        yield from seq_scans(child)
+
+
+def check(conn_str, recorded, min_rows, allow):
+    failures = []
+    with psycopg.connect(conn_str, autocommit=True) as conn:
+        sizes = dict(
+            conn.execute(
+                """
+                SELECT relname, reltuples::bigint
+                FROM pg_class
+                WHERE relkind IN ('r', 'p') AND relnamespace = 'public'::regnamespace
+                """
+            ).fetchall()
+        )
+        for route, query, params in recorded:
+            plan = conn.execute(f"EXPLAIN (FORMAT JSON) {query}", params).fetchone()[0]
+            tables = sorted(set(seq_scans(plan[0]["Plan"])))
+            large = [
+                t for t in tables if sizes.get(t, 0) >= min_rows and t not in allow
+            ]
+            status = "FAIL" if large else "ok"
+            print(f"{status:<5}{route:<40}{', '.join(tables) or '-'}")
+            if large:
+                failures.append((route, large))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--conn", help="use an existing database instead of a local one"
+    )
+    parser.add_argument("--runs", type=int, default=20000, help="runs to seed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--skip-seed",
+        action="store_true",
+        help="use the data already there (always the case with --conn)",
+    )
+    parser.add_argument(
+        "--seed-existing",
+        action="store_true",
+        help="migrate and seed the --conn database; the seed disables its "
+        "triggers and rebuilds its rollup tables",
+    )
+    parser.add_argument(
+        "--min-rows",
+        type=int,
+        default=10000,
+        help="tables at least this large must not be sequentially scanned",
+    )
+    parser.add_argument(
+        "--allow", action="append", default=[], help="table allowed to be seq-scanned"
+    )
+    args = parser.parse_args()
+    if args.seed_existing and not args.conn:
+        parser.error("--seed-existing requires --conn")
+    if args.seed_existing and args.skip_seed:
+        parser.error("--seed-existing and --skip-seed are exclusive")
+
+    from bench.datagen import load
+    from bench.pg import LocalPostgres
+    from src.migrate import migrate
+
+    with nullcontext() if args.conn else LocalPostgres() as pg:
+        conn_str = args.conn or pg.conn_str
+        seed = args.seed_existing if args.conn else not args.skip_seed
+        if not args.conn or args.seed_existing:
+            migrate(conn_str)
+        if seed:
+            ctx = load(conn_str, args.runs, seed=args.seed)
+        else:
+            ctx = existing_context(conn_str)
+        failures = check(
+            conn_str, record_queries(conn_str, ctx), args.min_rows, set(args.allow)
+        )
+
+    if failures:
+        for route, tables in failures:
+            print(f"{route}: sequential scan on {', '.join(tables)}")
+        return 1
+    return 0
+
+
+def existing_context(conn_str):
+    with psycopg.connect(conn_str) as conn:
+        row = conn.execute(
+            """
+            SELECT game_id, game_version, MIN(started_at), MAX(started_at)
+            FROM run
+            GROUP BY game_id, game_version
+            ORDER BY COUNT(*) DESC
+            LIMIT 1
+            """
+        ).fetchone()
+    if row is None:
+        raise RuntimeError("No runs in the database to check")
+    return {"game_id": row[0], "versions": (row[1],), "span": (row[2], row[3])}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
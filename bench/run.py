@@ -0,0 +1,188 @@
+"""
+Benchmarks every route against a freshly seeded local PostgreSQL.
+
+    python -m bench.run --runs 5000 --duration 30 --out bench_results.json
+    python -m bench.run --compare before.json after.json
+
+`--modes gunicorn,asgi` puts the sync workers and the async app side by side
+under the same load.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from bench.datagen import load
+from bench.pg import LocalPostgres, wait_for_port
+from bench.workload import HttpClient, InProcessClient, run_workload
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def bench_inprocess(conn_str, ctx, args):
+    os.environ["PGSQL_CONN"] = conn_str
+    sys.path.insert(0, str(ROOT))
+    from src.api import app
+
+    return run_workload(
+        lambda: InProcessClient(app), ctx, args.duration, args.concurrency, args.seed
+    )
+
+
+def bench_gunicorn(conn_str, ctx, args):
+    return _bench_server(
+        ["gunicorn", "-c", "gunicorn.conf.py", "--workers", str(args.workers)],
+        conn_str,
+        ctx,
+        args,
+    )
+
+
+def bench_asgi(conn_str, ctx, args):
+    return _bench_server(
+        ["hypercorn", "--workers", str(args.workers), "src.asgi:app"],
+        conn_str,
+        ctx,
+        args,
+    )
+
+
+def _bench_server(command, conn_str, ctx, args):
+    port = args.port
+    server = subprocess.Popen(
+        [sys.executable, "-m", *command, "--bind", f"127.0.0.1:{port}"],
+        cwd=ROOT,
+        env={**os.environ, "PGSQL_CONN": conn_str},
+    )
+    try:
+        wait_for_port(port)
+        return run_workload(
+            lambda: HttpClient("127.0.0.1", port),
+            ctx,
+            args.duration,
+            args.concurrency,
+            args.seed,
+        )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+MODES = {
+    "inprocess": bench_inprocess,
+    "gunicorn": bench_gunicorn,
+    "asgi": bench_asgi,
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    if args.cache:
+        os.environ["CACHE_BACKEND"] = args.cache
+
+    results = {}
+    with LocalPostgres() as pg:
+        pg.load_schema()
+        started = time.perf_counter()
+        ctx = load(pg.conn_str, args.runs, seed=args.seed)
+        seed_seconds = round(time.perf_counter() - started, 2)
+
+        for mode in args.modes.split(","):
+            print(f"Benchmarking {mode} for {args.duration}s...")
+            results[mode] = MODES[mode](pg.conn_str, ctx, args)
+
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "seed_seconds": seed_seconds,
+            **{key: value for key, value in vars(args).items() if key != "compare"},
+        },
+        "results": results,
+    }
+    Path(args.out).write_text(json.dumps(report, indent=2))
+    print_report(results)
+    print(f"Saved {args.out}")
+
+
+def print_report(results):
+    for mode, routes in results.items():
+        print(f"\n[{mode}]")
+        print(
+            f"{'route':<24}{'reqs':>8}{'err':>6}{'rps':>10}{'p50':>10}{'p95':>10}{'p99':>10}"
+        )
+        for name, s in routes.items():
+            print(
+                f"{name:<24}{s['requests']:>8}{s['errors']:>6}{s['throughput_rps']:>10}"
+                f"{_ms(s['p50_ms']):>10}{_ms(s['p95_ms']):>10}{_ms(s['p99_ms']):>10}"
+            )
+
+
+def compare(before_path, after_path):
+    before = json.loads(Path(before_path).read_text())
+    after = json.loads(Path(after_path).read_text())
+    print(f"{before['meta']['revision']} -> {after['meta']['revision']}")
+    for mode, routes in after["results"].items():
+        print(f"\n[{mode}]")
+        print(f"{'route':<24}{'rps':>18}{'p50':>22}{'p99':>22}")
+        for name, new in routes.items():
+            old = before["results"].get(mode, {}).get(name)
+            if old is None:
+                continue
+            print(
+                f"{name:<24}"
+                f"{_delta(old['throughput_rps'], new['throughput_rps']):>18}"
+                f"{_delta(old['p50_ms'], new['p50_ms']):>22}"
+                f"{_delta(old['p99_ms'], new['p99_ms']):>22}"
+            )
+
+
+def _ms(value):
+    return "-" if value is None else f"{value:.1f}"
+
+
+def _delta(old, new):
+    if old is None or new is None:
+        return "-"
+    change = (new - old) / old * 100 if old else 0.0
+    return f"{old:.1f}->{new:.1f} ({change:+.0f}%)"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=2000, help="runs to seed")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--duration", type=float, default=20, help="seconds per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--modes", default="inprocess,gunicorn")
+    parser.add_argument("--workers", type=int, default=4, help="server workers")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--cache", choices=("none", "memory", "sqlite"))
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
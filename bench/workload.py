@@ -0,0 +1,336 @@
+import http.client
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+PREFIX = "/api/v1/dashboard"
+
+
+def _version_query(rng, ctx):
+    return {
+        "game_id": ctx["game_id"],
+        "game_version": rng.choice(ctx["versions"]),
+    }, None
+
+
+# bucket -> window the dashboard asks for with it
+TIMESERIES_WINDOWS = {
+    "5m": timedelta(hours=6),
+    "hour": timedelta(days=2),
+    "day": timedelta(days=30),
+}
+
+
+def _timeseries_query(rng, ctx):
+    bucket = rng.choice(tuple(TIMESERIES_WINDOWS))
+    start, end = ctx["span"]
+    window = TIMESERIES_WINDOWS[bucket]
+    since = start + (end - start - window) * rng.random()
+    return {
+        "game_id": ctx["game_id"],
+        "bucket": bucket,
+        "from": since.isoformat(),
+        "to": (since + window).isoformat(),
+    }, None
+
+
+def _event(rng, ctx):
+    now = datetime.now().isoformat()
+    return {
+        "game_id": ctx["game_id"],
+        "run_id": rng.choice(ctx["run_ids"]),
+        "occurred_at": now,
+        "ingested_at": now,
+        "event_type_id": ctx["event_type_id"],
+        "details": {"bench": True},
+    }
+
+
+def _insert_event(rng, ctx):
+    return None, _event(rng, ctx)
+
+
+def _insert_events_batch(rng, ctx):
+    return None, {"events": [_event(rng, ctx) for _ in range(50)]}
+
+
+def _insert_room(rng, ctx):
+    now = datetime.now().isoformat()
+    return None, {
+        "game_id": ctx["game_id"],
+        "run_id": rng.choice(ctx["run_ids"]),
+        "room_seq": rng.randint(100, 10000),
+        "room_index": rng.randint(0, 15),
+        "room_name_norm": f"room-{rng.randint(0, 15)}",
+        "entered_at": now,
+        "exited_at": now,
+        "completion_ms": rng.randint(5000, 60000),
+        "damage_taken_in_room": rng.randint(0, 100),
+        "updated_at": now,
+    }
+
+
+def _insert_boss_summary(rng, ctx):
+    now = datetime.now().isoformat()
+    return None, {
+        "game_id": ctx["game_id"],
+        "run_id": rng.choice(ctx["run_ids"]),
+        "boss_seq": rng.randint(100, 10000),
+        "boss_name": rng.choice(ctx["bosses"]),
+        "entered_at": now,
+        "duration_ms": rng.randint(30000, 300000),
+        "defeated": rng.random() < 0.6,
+        "updated_at": now,
+    }
+
+
+def _insert_choice(rng, ctx):
+    now = datetime.now().isoformat()
+    offered = rng.sample(ctx["upgrades"], 3)
+    return None, {
+        "game_id": ctx["game_id"],
+        "run_id": rng.choice(ctx["run_ids"]),
+        "event_id": rng.choice(ctx["event_ids"]),
+        "occurred_at": now,
+        "room_index": rng.randint(0, 15),
+        "selected_upgrade_id": offered[0],
+        "options_present": offered,
+        "updated_at": now,
+    }
+
+
+def _insert_death(rng, ctx):
+    # event_id is unique among deaths, so a repeated pick is rejected; the
+    # pool is large enough for that to stay rare.
+    now = datetime.now().isoformat()
+    return None, {
+        "game_id": ctx["game_id"],
+        "run_id": rng.choice(ctx["run_ids"]),
+        "event_id": rng.choice(ctx["event_ids"]),
+        "occurred_at": now,
+        "room_index": rng.randint(0, 15),
+        "hp": 0,
+        "max_hp": 100,
+        "updated_at": now,
+    }
+
+
+def _insert_boss(rng, ctx):
+    return None, {
+        "game_id": ctx["game_id"],
+        "boss_name": f"bench-boss-{rng.getrandbits(64):016x}",
+    }
+
+
+def _insert_stage(rng, ctx):
+    now = datetime.now().isoformat()
+    name = f"bench-stage-{rng.getrandbits(64):016x}"
+    return None, {
+        "game_id": ctx["game_id"],
+        "stage_id": name,
+        "name_norm": name,
+        "first_seen_at": now,
+        "last_seen_at": now,
+    }
+
+
+def _insert_run(rng, ctx):
+    return None, {
+        "game_id": ctx["game_id"],
+        "session_id": rng.choice(ctx["session_ids"]),
+        "started_at": datetime.now().isoformat(),
+        "game_version": rng.choice(ctx["versions"]),
+    }
+
+
+def _insert_run_summary(rng, ctx):
+    now = datetime.now().isoformat()
+    return None, {
+        "game_id": ctx["game_id"],
+        "run_id": rng.choice(ctx["run_ids"]),
+        "started_at": now,
+        "ended_at": now,
+        "duration_ms": rng.randint(60000, 3600000),
+        "result": "loss",
+        "total_damage_taken": rng.randint(0, 500),
+        "choice_count": rng.randint(0, 10),
+    }
+
+
+def _finalize_run(rng, ctx):
+    now = datetime.now().isoformat()
+    rooms = rng.randint(5, 30)
+    return None, {
+        "game_id": ctx["game_id"],
+        "session_id": rng.choice(ctx["session_ids"]),
+        "started_at": now,
+        "ended_at": now,
+        "end_reason": "loss",
+        "game_version": rng.choice(ctx["versions"]),
+        "summary": {"result": "loss", "duration_ms": rng.randint(60000, 3600000)},
+        "rooms": [
+            {
+                "room_seq": seq,
+                "room_name_norm": f"room-{rng.randint(0, 15)}",
+                "entered_at": now,
+                "completion_ms": rng.randint(5000, 60000),
+                "updated_at": now,
+            }
+            for seq in range(rooms)
+        ],
+        "bosses": [
+            {
+                "boss_seq": 0,
+                "boss_name": rng.choice(ctx["bosses"]),
+                "entered_at": now,
+                "defeated": False,
+                "updated_at": now,
+            }
+        ],
+        "choices": [
+            {
+                "event_id": rng.choice(ctx["event_ids"]),
+                "occurred_at": now,
+                "selected_upgrade_id": offered[0],
+                "options_present": offered,
+                "updated_at": now,
+            }
+            for offered in (rng.sample(ctx["upgrades"], 3) for _ in range(rooms // 5))
+        ],
+        "death": {
+            "event_id": rng.choice(ctx["event_ids"]),
+            "occurred_at": now,
+            "room_index": rooms - 1,
+            "updated_at": now,
+        },
+    }
+
+
+# (name, weight, method, path, builder) -- builder returns (query, json body)
+ROUTES = (
+    ("runs_overview", 15, "GET", "/runs/overview", _version_query),
+    ("run_percentiles", 5, "GET", "/runs/percentiles", _version_query),
+    ("rooms_progression", 10, "GET", "/rooms/rooms/progression", _version_query),
+    ("choices", 10, "GET", "/events/choices", _version_query),
+    ("choice_offers", 5, "GET", "/events/choices/offers", _version_query),
+    ("boss", 5, "GET", "/events/boss", _version_query),
+    ("death", 5, "GET", "/events/death", _version_query),
+    ("event_timeseries", 5, "GET", "/events/timeseries", _timeseries_query),
+    ("insert_event", 25, "POST", "/events/insert", _insert_event),
+    ("insert_events_batch", 5, "POST", "/events/batch/insert", _insert_events_batch),
+    ("insert_room", 15, "POST", "/rooms/insert", _insert_room),
+    (
+        "insert_boss_summary",
+        10,
+        "POST",
+        "/events/boss/summary/insert",
+        _insert_boss_summary,
+    ),
+    ("insert_choice", 5, "POST", "/events/choices/insert", _insert_choice),
+    ("insert_death", 2, "POST", "/events/death/insert", _insert_death),
+    ("insert_boss", 1, "POST", "/events/boss/insert", _insert_boss),
+    ("insert_stage", 1, "POST", "/stage/insert", _insert_stage),
+    ("insert_run", 2, "POST", "/runs/insert", _insert_run),
+    ("insert_run_summary", 2, "POST", "/runs/overview/insert", _insert_run_summary),
+    ("finalize_run", 2, "POST", "/runs/finalize", _finalize_run),
+)
+
+
+class InProcessClient:
+    """
+    Calls the Flask app directly through its test client.
+    """
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, method, path, query, body):
+        response = self.client.open(
+            PREFIX + path, method=method, query_string=query, json=body
+        )
+        response.get_data()
+        return response.status_code
+
+
+class HttpClient:
+    """
+    Calls a running server over one keep-alive HTTP connection.
+    """
+
+    def __init__(self, host, port):
+        self.conn = http.client.HTTPConnection(host, port, timeout=60)
+
+    def request(self, method, path, query, body):
+        url = PREFIX + path + ("?" + urlencode(query) if query else "")
+        headers = {}
+        payload = None
+        if body is not None:
+            payload = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        self.conn.request(method, url, body=payload, headers=headers)
+        response = self.conn.getresponse()
+        response.read()
+        return response.status
+
+
+def run_workload(client_factory, ctx, duration, concurrency, seed=0, routes=ROUTES):
+    """
+    Drives a weighted mix of routes from `concurrency` threads for
+    `duration` seconds and returns per-route latency summaries.
+    """
+    samples = {name: [] for name, *_ in routes}
+    errors = {name: 0 for name, *_ in routes}
+    lock = threading.Lock()
+    weights = [route[1] for route in routes]
+    deadline = time.perf_counter() + duration
+
+    def worker(index):
+        rng = random.Random(seed * 1000 + index)
+        client = client_factory()
+        local = []
+        while time.perf_counter() < deadline:
+            name, _, method, path, build = rng.choices(routes, weights)[0]
+            query, body = build(rng, ctx)
+            started = time.perf_counter()
+            try:
+                ok = client.request(method, path, query, body) < 400
+            except Exception:
+                ok = False
+            local.append((name, time.perf_counter() - started, ok))
+        with lock:
+            for name, elapsed, ok in local:
+                samples[name].append(elapsed)
+                if not ok:
+                    errors[name] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    return {name: summarize(samples[name], errors[name], elapsed) for name in samples}
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": _percentile(latencies, 0.50),
+        "p95_ms": _percentile(latencies, 0.95),
+        "p99_ms": _percentile(latencies, 0.99),
+    }
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return round(sorted_values[index] * 1000, 3)
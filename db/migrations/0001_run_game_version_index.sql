@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- Covering index for the runs overview aggregate (index-only scan per
+-- game_id/game_version).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "run_game_id_game_version_idx" ON "run" ("game_id","game_version") INCLUDE ("end_reason","started_at","ended_at");
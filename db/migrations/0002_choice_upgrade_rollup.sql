@@ -0,0 +1,125 @@
+CREATE TABLE IF NOT EXISTS "choice_upgrade_rollup" (
+	"game_id" varchar NOT NULL,
+	"game_version" text NOT NULL,
+	"selected_upgrade_id" varchar NOT NULL,
+	"picks" bigint DEFAULT 0 NOT NULL,
+	"wins" bigint DEFAULT 0 NOT NULL,
+	"duration_sec_sum" double precision DEFAULT 0 NOT NULL,
+	"duration_count" bigint DEFAULT 0 NOT NULL,
+	"updated_at" timestamp NOT NULL,
+	CONSTRAINT "choice_upgrade_rollup_pkey" PRIMARY KEY("game_id","game_version","selected_upgrade_id"),
+	CONSTRAINT "choice_upgrade_rollup_game_id_fkey" FOREIGN KEY ("game_id") REFERENCES "game"("game_id")
+);
+
+-- choice_upgrade_rollup is maintained incrementally: every choice_fact row
+-- contributes one pick to its run's (game_id, game_version) bucket, and the
+-- win / duration part of that contribution is moved whenever the run's
+-- outcome changes.
+CREATE OR REPLACE FUNCTION "choice_upgrade_rollup_apply"(
+	p_game_id varchar,
+	p_game_version text,
+	p_upgrade_id varchar,
+	p_picks bigint,
+	p_end_reason varchar,
+	p_started_at timestamp,
+	p_ended_at timestamp
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+	IF p_game_version IS NULL OR p_picks = 0 THEN
+		RETURN;
+	END IF;
+	INSERT INTO "choice_upgrade_rollup" AS cur
+		("game_id","game_version","selected_upgrade_id","picks","wins","duration_sec_sum","duration_count","updated_at")
+	VALUES (
+		p_game_id,
+		p_game_version,
+		p_upgrade_id,
+		p_picks,
+		CASE WHEN p_end_reason = 'win' THEN p_picks ELSE 0 END,
+		COALESCE(EXTRACT(EPOCH FROM (p_ended_at - p_started_at)), 0) * p_picks,
+		CASE WHEN p_ended_at IS NOT NULL THEN p_picks ELSE 0 END,
+		NOW()
+	)
+	ON CONFLICT ("game_id","game_version","selected_upgrade_id") DO UPDATE SET
+		"picks" = cur."picks" + EXCLUDED."picks",
+		"wins" = cur."wins" + EXCLUDED."wins",
+		"duration_sec_sum" = cur."duration_sec_sum" + EXCLUDED."duration_sec_sum",
+		"duration_count" = cur."duration_count" + EXCLUDED."duration_count",
+		"updated_at" = EXCLUDED."updated_at";
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION "choice_fact_rollup_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	r "run"%ROWTYPE;
+	c "choice_fact"%ROWTYPE;
+	delta bigint := 1;
+BEGIN
+	IF TG_OP = 'DELETE' THEN
+		c := OLD;
+		delta := -1;
+	ELSE
+		c := NEW;
+	END IF;
+	SELECT * INTO r FROM "run" WHERE "run_id" = c."run_id";
+	IF FOUND THEN
+		PERFORM "choice_upgrade_rollup_apply"(
+			r."game_id", r."game_version", c."selected_upgrade_id", delta,
+			r."end_reason", r."started_at", r."ended_at");
+	END IF;
+	RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION "run_choice_rollup_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	picked record;
+BEGIN
+	FOR picked IN
+		SELECT "selected_upgrade_id", COUNT(*) AS n
+		FROM "choice_fact"
+		WHERE "run_id" = NEW."run_id"
+		GROUP BY "selected_upgrade_id"
+	LOOP
+		PERFORM "choice_upgrade_rollup_apply"(
+			OLD."game_id", OLD."game_version", picked."selected_upgrade_id", -picked.n,
+			OLD."end_reason", OLD."started_at", OLD."ended_at");
+		PERFORM "choice_upgrade_rollup_apply"(
+			NEW."game_id", NEW."game_version", picked."selected_upgrade_id", picked.n,
+			NEW."end_reason", NEW."started_at", NEW."ended_at");
+	END LOOP;
+	RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "choice_fact_rollup" ON "choice_fact";
+CREATE TRIGGER "choice_fact_rollup" AFTER INSERT OR DELETE ON "choice_fact"
+	FOR EACH ROW EXECUTE FUNCTION "choice_fact_rollup_trg"();
+DROP TRIGGER IF EXISTS "run_choice_rollup" ON "run";
+CREATE TRIGGER "run_choice_rollup" AFTER UPDATE OF "end_reason","ended_at","started_at","game_version" ON "run"
+	FOR EACH ROW
+	WHEN (OLD."end_reason" IS DISTINCT FROM NEW."end_reason"
+		OR OLD."ended_at" IS DISTINCT FROM NEW."ended_at"
+		OR OLD."started_at" IS DISTINCT FROM NEW."started_at"
+		OR OLD."game_version" IS DISTINCT FROM NEW."game_version")
+	EXECUTE FUNCTION "run_choice_rollup_trg"();
+
+-- Backfill from existing history. The table lock keeps concurrent choice
+-- inserts from being counted twice.
+LOCK TABLE "choice_fact", "run" IN SHARE ROW EXCLUSIVE MODE;
+TRUNCATE "choice_upgrade_rollup";
+INSERT INTO "choice_upgrade_rollup"
+	("game_id","game_version","selected_upgrade_id","picks","wins","duration_sec_sum","duration_count","updated_at")
+SELECT
+	r."game_id",
+	r."game_version",
+	cf."selected_upgrade_id",
+	COUNT(*),
+	COUNT(*) FILTER (WHERE r."end_reason" = 'win'),
+	COALESCE(SUM(EXTRACT(EPOCH FROM (r."ended_at" - r."started_at"))), 0),
+	COUNT(r."ended_at"),
+	NOW()
+FROM "choice_fact" cf
+JOIN "run" r ON r."run_id" = cf."run_id"
+WHERE r."game_version" IS NOT NULL
+GROUP BY r."game_id", r."game_version", cf."selected_upgrade_id";
@@ -0,0 +1,3 @@
+-- migrate: no-transaction
+-- Keyset pagination of boss rows orders by (run_id, boss_seq).
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "boss_summary_run_id_boss_seq_idx" ON "boss_summary" ("run_id","boss_seq");
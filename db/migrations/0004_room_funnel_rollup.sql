@@ -0,0 +1,117 @@
+CREATE TABLE IF NOT EXISTS "room_funnel_rollup" (
+	"game_id" varchar NOT NULL,
+	"game_version" text NOT NULL,
+	"room_name_norm" varchar NOT NULL,
+	"runs_entered" bigint DEFAULT 0 NOT NULL,
+	"runs_ended_here" bigint DEFAULT 0 NOT NULL,
+	"completion_ms_sum" bigint DEFAULT 0 NOT NULL,
+	"completion_count" bigint DEFAULT 0 NOT NULL,
+	"updated_at" timestamp NOT NULL,
+	CONSTRAINT "room_funnel_rollup_pkey" PRIMARY KEY("game_id","game_version","room_name_norm"),
+	CONSTRAINT "room_funnel_rollup_game_id_fkey" FOREIGN KEY ("game_id") REFERENCES "game"("game_id")
+);
+
+-- room_funnel_rollup holds per-version room visits, the visits that ended
+-- the run (exited_at IS NULL) and completion time sums. Each room_summary
+-- row adds its contribution on insert, and moves it on update or delete.
+CREATE OR REPLACE FUNCTION "room_funnel_rollup_apply"(
+	p_game_id varchar,
+	p_game_version text,
+	p_room_name_norm varchar,
+	p_visits bigint,
+	p_ended_here bigint,
+	p_completion_ms bigint,
+	p_completions bigint
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+	IF p_game_version IS NULL OR p_room_name_norm IS NULL OR p_visits = 0 THEN
+		RETURN;
+	END IF;
+	INSERT INTO "room_funnel_rollup" AS cur
+		("game_id","game_version","room_name_norm","runs_entered","runs_ended_here","completion_ms_sum","completion_count","updated_at")
+	VALUES (p_game_id, p_game_version, p_room_name_norm, p_visits, p_ended_here, p_completion_ms, p_completions, NOW())
+	ON CONFLICT ("game_id","game_version","room_name_norm") DO UPDATE SET
+		"runs_entered" = cur."runs_entered" + EXCLUDED."runs_entered",
+		"runs_ended_here" = cur."runs_ended_here" + EXCLUDED."runs_ended_here",
+		"completion_ms_sum" = cur."completion_ms_sum" + EXCLUDED."completion_ms_sum",
+		"completion_count" = cur."completion_count" + EXCLUDED."completion_count",
+		"updated_at" = EXCLUDED."updated_at";
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION "room_summary_rollup_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	version text;
+BEGIN
+	IF TG_OP IN ('UPDATE', 'DELETE') THEN
+		SELECT "game_version" INTO version FROM "run" WHERE "run_id" = OLD."run_id";
+		PERFORM "room_funnel_rollup_apply"(
+			OLD."game_id", version, OLD."room_name_norm", -1,
+			CASE WHEN OLD."exited_at" IS NULL THEN -1 ELSE 0 END,
+			-COALESCE(OLD."completion_ms", 0),
+			CASE WHEN OLD."completion_ms" IS NOT NULL THEN -1 ELSE 0 END);
+	END IF;
+	IF TG_OP IN ('INSERT', 'UPDATE') THEN
+		SELECT "game_version" INTO version FROM "run" WHERE "run_id" = NEW."run_id";
+		PERFORM "room_funnel_rollup_apply"(
+			NEW."game_id", version, NEW."room_name_norm", 1,
+			CASE WHEN NEW."exited_at" IS NULL THEN 1 ELSE 0 END,
+			COALESCE(NEW."completion_ms", 0),
+			CASE WHEN NEW."completion_ms" IS NOT NULL THEN 1 ELSE 0 END);
+	END IF;
+	RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION "run_room_rollup_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	visited record;
+BEGIN
+	FOR visited IN
+		SELECT
+			"room_name_norm",
+			COUNT(*) AS visits,
+			COUNT(*) FILTER (WHERE "exited_at" IS NULL) AS ended_here,
+			COALESCE(SUM("completion_ms"), 0) AS completion_ms,
+			COUNT("completion_ms") AS completions
+		FROM "room_summary"
+		WHERE "run_id" = NEW."run_id"
+		GROUP BY "room_name_norm"
+	LOOP
+		PERFORM "room_funnel_rollup_apply"(
+			OLD."game_id", OLD."game_version", visited."room_name_norm",
+			-visited.visits, -visited.ended_here, -visited.completion_ms, -visited.completions);
+		PERFORM "room_funnel_rollup_apply"(
+			NEW."game_id", NEW."game_version", visited."room_name_norm",
+			visited.visits, visited.ended_here, visited.completion_ms, visited.completions);
+	END LOOP;
+	RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "room_summary_rollup" ON "room_summary";
+CREATE TRIGGER "room_summary_rollup" AFTER INSERT OR DELETE OR UPDATE OF "room_name_norm","exited_at","completion_ms","run_id","game_id" ON "room_summary"
+	FOR EACH ROW EXECUTE FUNCTION "room_summary_rollup_trg"();
+DROP TRIGGER IF EXISTS "run_room_rollup" ON "run";
+CREATE TRIGGER "run_room_rollup" AFTER UPDATE OF "game_version" ON "run"
+	FOR EACH ROW
+	WHEN (OLD."game_version" IS DISTINCT FROM NEW."game_version")
+	EXECUTE FUNCTION "run_room_rollup_trg"();
+
+LOCK TABLE "room_summary", "run" IN SHARE ROW EXCLUSIVE MODE;
+TRUNCATE "room_funnel_rollup";
+INSERT INTO "room_funnel_rollup"
+	("game_id","game_version","room_name_norm","runs_entered","runs_ended_here","completion_ms_sum","completion_count","updated_at")
+SELECT
+	r."game_id",
+	r."game_version",
+	rs."room_name_norm",
+	COUNT(*),
+	COUNT(*) FILTER (WHERE rs."exited_at" IS NULL),
+	COALESCE(SUM(rs."completion_ms"), 0),
+	COUNT(rs."completion_ms"),
+	NOW()
+FROM "room_summary" rs
+JOIN "run" r ON r."run_id" = rs."run_id"
+WHERE r."game_version" IS NOT NULL AND rs."room_name_norm" IS NOT NULL
+GROUP BY r."game_id", r."game_version", rs."room_name_norm";
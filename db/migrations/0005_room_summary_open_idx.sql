@@ -0,0 +1,4 @@
+-- migrate: no-transaction
+-- Rooms where the run ended (exited_at IS NULL) are a small slice of
+-- room_summary; a partial index keeps those lookups off the full table.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "room_summary_open_idx" ON "room_summary" ("game_id","run_id","room_name_norm") WHERE "exited_at" IS NULL;
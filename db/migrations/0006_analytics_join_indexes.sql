@@ -0,0 +1,6 @@
+-- migrate: no-transaction
+-- get_deaths matches each death to its room by (run_id, stage_index,
+-- room_index), latest visit first.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "room_summary_run_id_room_idx" ON "room_summary" ("run_id","stage_index","room_index","room_seq" DESC) INCLUDE ("damage_taken_in_room");
+-- The rollup triggers re-aggregate a run's choices by selected upgrade.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "choice_fact_run_id_selected_upgrade_id_idx" ON "choice_fact" ("run_id","selected_upgrade_id");
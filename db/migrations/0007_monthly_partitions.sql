@@ -0,0 +1,156 @@
+-- Range-partitions event by occurred_at and raw_capture by captured_at, one
+-- partition per month. Existing rows are not copied: each old table becomes a
+-- single <table>_legacy partition ending at the month after its newest row.
+-- Unique constraints on a partitioned table must include the partition key,
+-- so the foreign keys pointing at event.event_id and raw_capture.capture_id
+-- are dropped; both ids still come from a sequence / the capture pipeline.
+
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(
+    parent regclass,
+    from_ts timestamp,
+    to_ts timestamp
+) RETURNS integer AS $$
+DECLARE
+    month timestamp := date_trunc('month', from_ts);
+    partition_name text;
+    created integer := 0;
+BEGIN
+    WHILE month <= to_ts LOOP
+        partition_name := format('%s_p%s', parent, to_char(month, 'YYYYMM'));
+        IF to_regclass(partition_name) IS NULL THEN
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF %s FOR VALUES FROM (%L) TO (%L)',
+                    partition_name,
+                    parent,
+                    month,
+                    month + interval '1 month'
+                );
+                created := created + 1;
+            EXCEPTION
+                -- Covered by the legacy partition, or created concurrently.
+                WHEN invalid_object_definition OR duplicate_table THEN
+                    NULL;
+            END;
+        END IF;
+        month := month + interval '1 month';
+    END LOOP;
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+ALTER TABLE choice_fact DROP CONSTRAINT IF EXISTS choice_fact_event_id_fkey;
+ALTER TABLE death_fact DROP CONSTRAINT IF EXISTS death_fact_event_id_fkey;
+ALTER TABLE event DROP CONSTRAINT IF EXISTS event_source_capture_id_fkey;
+ALTER TABLE pipeline_job DROP CONSTRAINT IF EXISTS pipeline_job_capture_id_fkey;
+
+DO $$
+DECLARE
+    boundary timestamp;
+    last_id bigint;
+    id_called boolean;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'event'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    SELECT last_value, is_called INTO last_id, id_called FROM event_event_id_seq;
+
+    ALTER TABLE event RENAME TO event_legacy;
+    ALTER TABLE event_legacy DROP CONSTRAINT event_pkey;
+    ALTER TABLE event_legacy ALTER COLUMN event_id DROP IDENTITY;
+    ALTER INDEX event_event_type_id_occurred_at_idx
+        RENAME TO event_legacy_event_type_id_occurred_at_idx;
+    ALTER INDEX event_game_id_occurred_at_idx
+        RENAME TO event_legacy_game_id_occurred_at_idx;
+    ALTER INDEX event_run_id_occurred_at_idx
+        RENAME TO event_legacy_run_id_occurred_at_idx;
+
+    CREATE TABLE event (
+        "event_id" integer GENERATED BY DEFAULT AS IDENTITY (sequence name "event_event_id_seq" INCREMENT BY 1 MINVALUE 1 MAXVALUE 2147483647 START WITH 1 CACHE 1),
+        "game_id" varchar NOT NULL REFERENCES game (game_id),
+        "run_id" varchar NOT NULL REFERENCES run (run_id),
+        "occurred_at" timestamp NOT NULL,
+        "ingested_at" timestamp NOT NULL,
+        "event_type_id" bigint NOT NULL REFERENCES event_type (id),
+        "source_capture_id" varchar,
+        "confidence" double precision,
+        "pipeline_version" varchar,
+        "model_version" varchar,
+        "details" json NOT NULL,
+        PRIMARY KEY (event_id, occurred_at)
+    ) PARTITION BY RANGE (occurred_at);
+
+    CREATE INDEX event_event_type_id_occurred_at_idx ON event (event_type_id, occurred_at);
+    CREATE INDEX event_game_id_occurred_at_idx ON event (game_id, occurred_at);
+    CREATE INDEX event_run_id_occurred_at_idx ON event (run_id, occurred_at);
+
+    boundary := date_trunc(
+        'month', COALESCE((SELECT max(occurred_at) FROM event_legacy), now())
+    ) + interval '1 month';
+    EXECUTE format(
+        'ALTER TABLE event ATTACH PARTITION event_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+        boundary
+    );
+    PERFORM setval('event_event_id_seq', last_id, id_called);
+END;
+$$;
+
+DO $$
+DECLARE
+    boundary timestamp;
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'raw_capture'::regclass) = 'p' THEN
+        RETURN;
+    END IF;
+
+    ALTER TABLE raw_capture RENAME TO raw_capture_legacy;
+    ALTER TABLE raw_capture_legacy DROP CONSTRAINT raw_capture_pkey;
+    ALTER INDEX raw_capture_game_id_session_id_captured_at_idx
+        RENAME TO raw_capture_legacy_game_id_session_id_captured_at_idx;
+    ALTER INDEX raw_capture_run_id_captured_at_idx
+        RENAME TO raw_capture_legacy_run_id_captured_at_idx;
+    ALTER INDEX raw_capture_status_received_at_idx
+        RENAME TO raw_capture_legacy_status_received_at_idx;
+
+    CREATE TABLE raw_capture (
+        "capture_id" varchar NOT NULL,
+        "game_id" varchar NOT NULL REFERENCES game (game_id),
+        "session_id" varchar NOT NULL REFERENCES session (session_id),
+        "run_id" varchar REFERENCES run (run_id),
+        "captured_at" timestamp NOT NULL,
+        "received_at" timestamp NOT NULL,
+        "input_device" varchar,
+        "input_code" varchar,
+        "mouse_x" integer,
+        "mouse_y" integer,
+        "screenshot_ref" varchar,
+        "screenshot_hash" varchar,
+        "image_width" integer,
+        "image_height" integer,
+        "status" varchar,
+        "process_attempts" integer,
+        "last_error" varchar,
+        "game_version" varchar,
+        "extra" json,
+        "image_data" bytea,
+        PRIMARY KEY (capture_id, captured_at)
+    ) PARTITION BY RANGE (captured_at);
+
+    CREATE INDEX raw_capture_game_id_session_id_captured_at_idx
+        ON raw_capture (game_id, session_id, captured_at);
+    CREATE INDEX raw_capture_run_id_captured_at_idx ON raw_capture (run_id, captured_at);
+    CREATE INDEX raw_capture_status_received_at_idx ON raw_capture (status, received_at);
+
+    boundary := date_trunc(
+        'month', COALESCE((SELECT max(captured_at) FROM raw_capture_legacy), now())
+    ) + interval '1 month';
+    EXECUTE format(
+        'ALTER TABLE raw_capture ATTACH PARTITION raw_capture_legacy FOR VALUES FROM (MINVALUE) TO (%L)',
+        boundary
+    );
+END;
+$$;
+
+SELECT ensure_monthly_partitions('event', now()::timestamp, now()::timestamp + interval '3 months');
+SELECT ensure_monthly_partitions('raw_capture', now()::timestamp, now()::timestamp + interval '3 months');
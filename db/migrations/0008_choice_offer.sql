@@ -0,0 +1,50 @@
+CREATE TABLE IF NOT EXISTS "upgrade" (
+	"upgrade_id" integer PRIMARY KEY GENERATED BY DEFAULT AS IDENTITY,
+	"game_id" varchar NOT NULL,
+	"name" varchar NOT NULL,
+	CONSTRAINT "upgrade_game_id_name_key" UNIQUE ("game_id","name"),
+	CONSTRAINT "upgrade_game_id_fkey" FOREIGN KEY ("game_id") REFERENCES "game"("game_id")
+);
+
+-- One row per option shown in a choice, so offer and pick counts can be
+-- aggregated over integer keys instead of re-parsing options_present.
+CREATE TABLE IF NOT EXISTS "choice_offer" (
+	"choice_fact_id" integer NOT NULL,
+	"position" smallint NOT NULL,
+	"option_id" integer NOT NULL,
+	"picked" boolean NOT NULL,
+	CONSTRAINT "choice_offer_pkey" PRIMARY KEY ("choice_fact_id","position"),
+	CONSTRAINT "choice_offer_choice_fact_id_fkey" FOREIGN KEY ("choice_fact_id") REFERENCES "choice_fact"("choice_fact_id") ON DELETE CASCADE,
+	CONSTRAINT "choice_offer_option_id_fkey" FOREIGN KEY ("option_id") REFERENCES "upgrade"("upgrade_id")
+);
+CREATE INDEX IF NOT EXISTS "choice_offer_option_id_idx" ON "choice_offer" ("option_id") INCLUDE ("picked");
+
+-- options_present is either a list of upgrade ids or {"options": [...]}.
+CREATE OR REPLACE FUNCTION "choice_option_names"(options json)
+RETURNS TABLE ("position" integer, "name" text) LANGUAGE sql IMMUTABLE AS $$
+	SELECT (o.ordinality - 1)::integer, o.value
+	FROM (
+		SELECT CASE json_typeof(options)
+			WHEN 'array' THEN options
+			WHEN 'object' THEN options -> 'options'
+		END AS arr
+	) a
+	CROSS JOIN LATERAL json_array_elements_text(
+		CASE WHEN json_typeof(a.arr) = 'array' THEN a.arr ELSE '[]'::json END
+	) WITH ORDINALITY AS o(value, ordinality)
+$$;
+
+-- Backfill from existing choices; the lock holds off inserts that would not
+-- yet write their offers.
+LOCK TABLE "choice_fact" IN SHARE MODE;
+INSERT INTO "upgrade" ("game_id","name")
+SELECT DISTINCT cf."game_id", o."name"
+FROM "choice_fact" cf
+CROSS JOIN LATERAL "choice_option_names"(cf."options_present") o
+ON CONFLICT DO NOTHING;
+INSERT INTO "choice_offer" ("choice_fact_id","position","option_id","picked")
+SELECT cf."choice_fact_id", o."position", u."upgrade_id", o."name" = cf."selected_upgrade_id"
+FROM "choice_fact" cf
+CROSS JOIN LATERAL "choice_option_names"(cf."options_present") o
+JOIN "upgrade" u ON u."game_id" = cf."game_id" AND u."name" = o."name"
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,69 @@
+-- Per-(game_id, game_version) write counter behind the analytics ETags.
+-- Each backend bumps its own shard (pid % 16), so concurrent writers to the
+-- same version do not queue on one row; readers sum the shards.
+CREATE TABLE IF NOT EXISTS "data_watermark" (
+	"game_id" varchar NOT NULL,
+	"game_version" text NOT NULL,
+	"shard" smallint NOT NULL,
+	"changes" bigint DEFAULT 0 NOT NULL,
+	CONSTRAINT "data_watermark_pkey" PRIMARY KEY ("game_id","game_version","shard")
+);
+
+-- Statement-level: one upsert per statement and version, however many rows
+-- it wrote. Child tables take the version from their run.
+CREATE OR REPLACE FUNCTION "data_watermark_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+	IF TG_TABLE_NAME = 'run' THEN
+		INSERT INTO "data_watermark" AS w ("game_id","game_version","shard","changes")
+		SELECT c."game_id", c."game_version", pg_backend_pid() % 16, COUNT(*)
+		FROM changed_rows c
+		WHERE c."game_version" IS NOT NULL
+		GROUP BY c."game_id", c."game_version"
+		ORDER BY 1, 2
+		ON CONFLICT ("game_id","game_version","shard") DO UPDATE SET
+			"changes" = w."changes" + EXCLUDED."changes";
+	ELSE
+		INSERT INTO "data_watermark" AS w ("game_id","game_version","shard","changes")
+		SELECT r."game_id", r."game_version", pg_backend_pid() % 16, COUNT(*)
+		FROM changed_rows c
+		JOIN "run" r ON r."run_id" = c."run_id"
+		WHERE r."game_version" IS NOT NULL
+		GROUP BY r."game_id", r."game_version"
+		ORDER BY 1, 2
+		ON CONFLICT ("game_id","game_version","shard") DO UPDATE SET
+			"changes" = w."changes" + EXCLUDED."changes";
+	END IF;
+	RETURN NULL;
+END;
+$$;
+
+-- A trigger with transition tables may only fire on one event, hence one per
+-- event and table. Updates bump both the old and the new version of a row.
+DO $$
+DECLARE
+	t text;
+BEGIN
+	FOREACH t IN ARRAY ARRAY['run','choice_fact','room_summary','boss_summary','death_fact','run_summary'] LOOP
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_watermark_ins', t);
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_watermark_upd_new', t);
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_watermark_upd_old', t);
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_watermark_del', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+			'FOR EACH STATEMENT EXECUTE FUNCTION "data_watermark_trg"()',
+			t || '_watermark_ins', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows '
+			'FOR EACH STATEMENT EXECUTE FUNCTION "data_watermark_trg"()',
+			t || '_watermark_upd_new', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS changed_rows '
+			'FOR EACH STATEMENT EXECUTE FUNCTION "data_watermark_trg"()',
+			t || '_watermark_upd_old', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+			'FOR EACH STATEMENT EXECUTE FUNCTION "data_watermark_trg"()',
+			t || '_watermark_del', t);
+	END LOOP;
+END;
+$$;
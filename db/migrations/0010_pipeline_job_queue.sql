@@ -0,0 +1,15 @@
+-- Work-queue state for pipeline_job: when a pending job may next be claimed
+-- (retry backoff), when a running job's lease runs out, and why it last
+-- failed. pipeline_job_event links a finished job to the events it produced.
+ALTER TABLE "pipeline_job" ADD COLUMN IF NOT EXISTS "available_at" timestamp DEFAULT now() NOT NULL;
+ALTER TABLE "pipeline_job" ADD COLUMN IF NOT EXISTS "lease_expires_at" timestamp;
+ALTER TABLE "pipeline_job" ADD COLUMN IF NOT EXISTS "last_error" varchar;
+ALTER TABLE "pipeline_job" ADD COLUMN IF NOT EXISTS "completed_at" timestamp;
+
+CREATE TABLE IF NOT EXISTS "pipeline_job_event" (
+	"job_id" varchar NOT NULL,
+	"event_id" integer NOT NULL,
+	CONSTRAINT "pipeline_job_event_pkey" PRIMARY KEY ("job_id","event_id"),
+	CONSTRAINT "pipeline_job_event_job_id_fkey" FOREIGN KEY ("job_id") REFERENCES "pipeline_job"("job_id") ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS "pipeline_job_event_event_id_idx" ON "pipeline_job_event" ("event_id");
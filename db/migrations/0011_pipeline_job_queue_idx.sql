@@ -0,0 +1,5 @@
+-- migrate: no-transaction
+-- Claims read only claimable jobs, oldest first; reclaims only running jobs
+-- by lease end. Both stay small however many jobs are done.
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "pipeline_job_claim_idx" ON "pipeline_job" ("available_at") WHERE "status" = 'pending';
+CREATE INDEX CONCURRENTLY IF NOT EXISTS "pipeline_job_lease_idx" ON "pipeline_job" ("lease_expires_at") WHERE "status" = 'running';
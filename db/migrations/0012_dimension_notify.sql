@@ -0,0 +1,27 @@
+-- Tells the service workers that a dimension table changed, so their name
+-- caches reload. The payload is "<table>:<game_id>" ("event_type:" for the
+-- global event types); identical payloads in one transaction are delivered
+-- once, at commit.
+CREATE OR REPLACE FUNCTION "dimension_notify_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+	PERFORM pg_notify(
+		'dimension_change',
+		TG_TABLE_NAME || ':' || COALESCE(to_jsonb(COALESCE(NEW, OLD)) ->> 'game_id', '')
+	);
+	RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+	t text;
+BEGIN
+	FOREACH t IN ARRAY ARRAY['event_type','stage','boss'] LOOP
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_dimension_notify', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER INSERT OR UPDATE OR DELETE ON %I '
+			'FOR EACH ROW EXECUTE FUNCTION "dimension_notify_trg"()',
+			t || '_dimension_notify', t);
+	END LOOP;
+END;
+$$;
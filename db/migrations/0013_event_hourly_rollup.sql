@@ -0,0 +1,57 @@
+-- Event counts per game, hour and event type behind the time-series
+-- endpoint. As with data_watermark, each backend adds to its own shard
+-- (pid % 16) so concurrent writers in the current hour do not queue on one
+-- row; readers sum the shards. Counts stay when old event partitions are
+-- dropped, so charts keep their history.
+CREATE TABLE IF NOT EXISTS "event_hourly_rollup" (
+	"game_id" varchar NOT NULL,
+	"bucket" timestamp NOT NULL,
+	"event_type_id" bigint NOT NULL,
+	"shard" smallint NOT NULL,
+	"events" bigint DEFAULT 0 NOT NULL,
+	CONSTRAINT "event_hourly_rollup_pkey" PRIMARY KEY ("game_id","bucket","event_type_id","shard")
+);
+
+-- Statement-level, so a COPY of thousands of events is one upsert per hour
+-- and type. TG_ARGV[0] is +1 for new rows and -1 for removed ones.
+CREATE OR REPLACE FUNCTION "event_hourly_rollup_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+	INSERT INTO "event_hourly_rollup" AS r ("game_id","bucket","event_type_id","shard","events")
+	SELECT c."game_id", date_trunc('hour', c."occurred_at"), c."event_type_id",
+		pg_backend_pid() % 16, COUNT(*) * TG_ARGV[0]::integer
+	FROM changed_rows c
+	GROUP BY 1, 2, 3
+	ORDER BY 1, 2, 3
+	ON CONFLICT ("game_id","bucket","event_type_id","shard") DO UPDATE SET
+		"events" = r."events" + EXCLUDED."events";
+	RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "event_rollup_ins" ON "event";
+DROP TRIGGER IF EXISTS "event_rollup_upd_new" ON "event";
+DROP TRIGGER IF EXISTS "event_rollup_upd_old" ON "event";
+DROP TRIGGER IF EXISTS "event_rollup_del" ON "event";
+CREATE TRIGGER "event_rollup_ins" AFTER INSERT ON "event" REFERENCING NEW TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION "event_hourly_rollup_trg"('1');
+CREATE TRIGGER "event_rollup_upd_new" AFTER UPDATE ON "event" REFERENCING NEW TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION "event_hourly_rollup_trg"('1');
+CREATE TRIGGER "event_rollup_upd_old" AFTER UPDATE ON "event" REFERENCING OLD TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION "event_hourly_rollup_trg"('-1');
+CREATE TRIGGER "event_rollup_del" AFTER DELETE ON "event" REFERENCING OLD TABLE AS changed_rows
+	FOR EACH STATEMENT EXECUTE FUNCTION "event_hourly_rollup_trg"('-1');
+
+-- The triggers' lock keeps writers out until this commits, so the backfill
+-- sees every event written before them and none after.
+INSERT INTO "event_hourly_rollup" ("game_id","bucket","event_type_id","shard","events")
+SELECT "game_id", date_trunc('hour', "occurred_at"), "event_type_id", 0, COUNT(*)
+FROM "event"
+WHERE NOT EXISTS (SELECT 1 FROM "event_hourly_rollup")
+GROUP BY 1, 2, 3;
+
+-- event is append-only and arrives roughly in occurred_at order, so a BRIN
+-- index (a min/max per 32 pages) covers time-window scans at a fraction of
+-- a btree's size. New monthly partitions inherit it. Indexes on a
+-- partitioned table cannot be built CONCURRENTLY; a BRIN build is one
+-- sequential pass.
+CREATE INDEX IF NOT EXISTS "event_occurred_at_brin_idx" ON "event" USING brin ("occurred_at") WITH (pages_per_range = 32);
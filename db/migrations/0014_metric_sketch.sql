@@ -0,0 +1,268 @@
+-- Percentile sketches (DDSketch, 1% relative error) for run duration, room
+-- completion time, boss fight duration and damage taken, per game version
+-- and day. A value v >= 1 falls in bin ceil(log_gamma(v)), gamma =
+-- (1 + 0.01) / (1 - 0.01); smaller values (0 damage) in bin -1. A sketch is
+-- its bins' counts, so sketches merge by adding counts: a percentile over any
+-- window sums a few hundred bins instead of sorting every row. key splits a
+-- metric further ('' when unused; the picked upgrade for choice metrics).
+-- As with data_watermark, each backend adds to its own shard.
+CREATE TABLE IF NOT EXISTS "metric_sketch" (
+	"game_id" varchar NOT NULL,
+	"game_version" text NOT NULL,
+	"metric" text NOT NULL,
+	"key" varchar DEFAULT '' NOT NULL,
+	"day" date NOT NULL,
+	"bin" integer NOT NULL,
+	"shard" smallint NOT NULL,
+	"count" bigint DEFAULT 0 NOT NULL,
+	CONSTRAINT "metric_sketch_pkey" PRIMARY KEY ("game_id","game_version","metric","key","day","bin","shard")
+);
+
+CREATE OR REPLACE FUNCTION "metric_sketch_bin"(value double precision) RETURNS integer
+LANGUAGE sql IMMUTABLE AS $$
+	SELECT CASE WHEN value < 1 THEN -1 ELSE ceil(ln(value) / ln(1.01::double precision / 0.99))::integer END;
+$$;
+
+-- Midpoint of a bin, within 1% of every value in it.
+CREATE OR REPLACE FUNCTION "metric_sketch_value"(bin integer) RETURNS double precision
+LANGUAGE sql IMMUTABLE AS $$
+	SELECT CASE WHEN bin < 0 THEN 0 ELSE 2 * power(1.01::double precision / 0.99, bin) / (1.01::double precision / 0.99 + 1) END;
+$$;
+
+-- Quantiles qs of the merged sketch of days [p_from, p_to) (NULL for
+-- unbounded), or NULLs when it is empty.
+CREATE OR REPLACE FUNCTION "metric_sketch_quantiles"(
+	p_game_id varchar,
+	p_game_version text,
+	p_metric text,
+	p_key varchar,
+	p_from date,
+	p_to date,
+	p_qs double precision[]
+) RETURNS double precision[] LANGUAGE sql STABLE AS $$
+	WITH bins AS (
+		SELECT "bin", SUM("count") AS n
+		FROM "metric_sketch"
+		WHERE "game_id" = p_game_id
+		  AND "game_version" = p_game_version
+		  AND "metric" = p_metric
+		  AND "key" = p_key
+		  AND (p_from IS NULL OR "day" >= p_from)
+		  AND (p_to IS NULL OR "day" < p_to)
+		GROUP BY "bin"
+		HAVING SUM("count") > 0
+	),
+	cdf AS (
+		SELECT "bin", SUM(n) OVER (ORDER BY "bin") AS below, SUM(n) OVER () AS total
+		FROM bins
+	)
+	SELECT array_agg(
+		(SELECT "metric_sketch_value"(cdf."bin") FROM cdf WHERE cdf.below > q * (cdf.total - 1) ORDER BY cdf."bin" LIMIT 1)
+		ORDER BY ord)
+	FROM unnest(p_qs) WITH ORDINALITY AS u(q, ord);
+$$;
+
+-- Statement-level, one trigger per event as in 0009. TG_ARGV[0] is +1 for
+-- new rows and -1 for removed ones. Child tables take the version from
+-- their run.
+CREATE OR REPLACE FUNCTION "metric_sketch_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	samples text;
+BEGIN
+	IF TG_TABLE_NAME = 'run' THEN
+		samples := $q$
+			SELECT c."game_id", c."game_version", 'run_duration_ms' AS metric,
+				c."started_at"::date AS day,
+				EXTRACT(EPOCH FROM (c."ended_at" - c."started_at")) * 1000 AS value
+			FROM changed_rows c
+		$q$;
+	ELSIF TG_TABLE_NAME = 'room_summary' THEN
+		samples := $q$
+			SELECT r."game_id", r."game_version", m.metric, c."entered_at"::date AS day, m.value
+			FROM changed_rows c
+			JOIN "run" r ON r."run_id" = c."run_id"
+			CROSS JOIN LATERAL (VALUES
+				('room_completion_ms', c."completion_ms"::double precision),
+				('room_damage_taken', c."damage_taken_in_room"::double precision)
+			) AS m(metric, value)
+		$q$;
+	ELSIF TG_TABLE_NAME = 'boss_summary' THEN
+		samples := $q$
+			SELECT r."game_id", r."game_version", m.metric, c."entered_at"::date AS day, m.value
+			FROM changed_rows c
+			JOIN "run" r ON r."run_id" = c."run_id"
+			CROSS JOIN LATERAL (VALUES
+				('boss_duration_ms', c."duration_ms"::double precision),
+				('boss_damage_taken', c."damage_taken_in_boss"::double precision)
+			) AS m(metric, value)
+		$q$;
+	ELSE
+		samples := $q$
+			SELECT r."game_id", r."game_version", 'run_damage_taken' AS metric,
+				c."started_at"::date AS day, c."total_damage_taken"::double precision AS value
+			FROM changed_rows c
+			JOIN "run" r ON r."run_id" = c."run_id"
+		$q$;
+	END IF;
+
+	-- changed_rows is visible to dynamic SQL run from the trigger.
+	EXECUTE format($q$
+		INSERT INTO "metric_sketch" AS s ("game_id","game_version","metric","key","day","bin","shard","count")
+		SELECT "game_id", "game_version", metric, '', day, "metric_sketch_bin"(value),
+			pg_backend_pid() %% 16, COUNT(*) * $1
+		FROM (%s) samples
+		WHERE "game_version" IS NOT NULL AND value IS NOT NULL AND day IS NOT NULL
+		GROUP BY 1, 2, 3, 5, 6
+		ORDER BY 1, 2, 3, 5, 6
+		ON CONFLICT ("game_id","game_version","metric","key","day","bin","shard") DO UPDATE SET
+			"count" = s."count" + EXCLUDED."count"
+	$q$, samples) USING TG_ARGV[0]::integer;
+	RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+	t text;
+BEGIN
+	FOREACH t IN ARRAY ARRAY['run','room_summary','boss_summary','run_summary'] LOOP
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_sketch_ins', t);
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_sketch_upd_new', t);
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_sketch_upd_old', t);
+		EXECUTE format('DROP TRIGGER IF EXISTS %I ON %I', t || '_sketch_del', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER INSERT ON %I REFERENCING NEW TABLE AS changed_rows '
+			'FOR EACH STATEMENT EXECUTE FUNCTION "metric_sketch_trg"(''1'')',
+			t || '_sketch_ins', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING NEW TABLE AS changed_rows '
+			'FOR EACH STATEMENT EXECUTE FUNCTION "metric_sketch_trg"(''1'')',
+			t || '_sketch_upd_new', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER UPDATE ON %I REFERENCING OLD TABLE AS changed_rows '
+			'FOR EACH STATEMENT EXECUTE FUNCTION "metric_sketch_trg"(''-1'')',
+			t || '_sketch_upd_old', t);
+		EXECUTE format(
+			'CREATE TRIGGER %I AFTER DELETE ON %I REFERENCING OLD TABLE AS changed_rows '
+			'FOR EACH STATEMENT EXECUTE FUNCTION "metric_sketch_trg"(''-1'')',
+			t || '_sketch_del', t);
+	END LOOP;
+END;
+$$;
+
+-- Run duration per picked upgrade, behind the choices percentiles. Kept
+-- like choice_upgrade_rollup: each choice adds its run's duration, and a
+-- change to the run moves the contribution of all its choices.
+CREATE OR REPLACE FUNCTION "metric_sketch_add"(
+	p_game_id varchar,
+	p_game_version text,
+	p_metric text,
+	p_key varchar,
+	p_day date,
+	p_value double precision,
+	p_delta bigint
+) RETURNS void LANGUAGE plpgsql AS $$
+BEGIN
+	IF p_game_version IS NULL OR p_key IS NULL OR p_day IS NULL OR p_value IS NULL OR p_delta = 0 THEN
+		RETURN;
+	END IF;
+	INSERT INTO "metric_sketch" AS s ("game_id","game_version","metric","key","day","bin","shard","count")
+	VALUES (p_game_id, p_game_version, p_metric, p_key, p_day, "metric_sketch_bin"(p_value),
+		pg_backend_pid() % 16, p_delta)
+	ON CONFLICT ("game_id","game_version","metric","key","day","bin","shard") DO UPDATE SET
+		"count" = s."count" + EXCLUDED."count";
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION "choice_fact_sketch_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	r "run"%ROWTYPE;
+	c "choice_fact"%ROWTYPE;
+	delta bigint := 1;
+BEGIN
+	IF TG_OP = 'DELETE' THEN
+		c := OLD;
+		delta := -1;
+	ELSE
+		c := NEW;
+	END IF;
+	SELECT * INTO r FROM "run" WHERE "run_id" = c."run_id";
+	IF FOUND THEN
+		PERFORM "metric_sketch_add"(
+			r."game_id", r."game_version", 'choice_run_duration_ms', c."selected_upgrade_id",
+			r."started_at"::date, EXTRACT(EPOCH FROM (r."ended_at" - r."started_at")) * 1000, delta);
+	END IF;
+	RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION "run_choice_sketch_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	picked record;
+BEGIN
+	FOR picked IN
+		SELECT "selected_upgrade_id", COUNT(*) AS n
+		FROM "choice_fact"
+		WHERE "run_id" = NEW."run_id"
+		GROUP BY "selected_upgrade_id"
+	LOOP
+		PERFORM "metric_sketch_add"(
+			OLD."game_id", OLD."game_version", 'choice_run_duration_ms', picked."selected_upgrade_id",
+			OLD."started_at"::date, EXTRACT(EPOCH FROM (OLD."ended_at" - OLD."started_at")) * 1000, -picked.n);
+		PERFORM "metric_sketch_add"(
+			NEW."game_id", NEW."game_version", 'choice_run_duration_ms', picked."selected_upgrade_id",
+			NEW."started_at"::date, EXTRACT(EPOCH FROM (NEW."ended_at" - NEW."started_at")) * 1000, picked.n);
+	END LOOP;
+	RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "choice_fact_sketch" ON "choice_fact";
+CREATE TRIGGER "choice_fact_sketch" AFTER INSERT OR DELETE ON "choice_fact"
+	FOR EACH ROW EXECUTE FUNCTION "choice_fact_sketch_trg"();
+DROP TRIGGER IF EXISTS "run_choice_sketch" ON "run";
+CREATE TRIGGER "run_choice_sketch" AFTER UPDATE OF "ended_at","started_at","game_version" ON "run"
+	FOR EACH ROW
+	WHEN (OLD."ended_at" IS DISTINCT FROM NEW."ended_at"
+		OR OLD."started_at" IS DISTINCT FROM NEW."started_at"
+		OR OLD."game_version" IS DISTINCT FROM NEW."game_version")
+	EXECUTE FUNCTION "run_choice_sketch_trg"();
+
+-- Backfill from existing history. The table lock keeps concurrent writes
+-- from being counted twice.
+LOCK TABLE "run", "room_summary", "boss_summary", "run_summary", "choice_fact" IN SHARE ROW EXCLUSIVE MODE;
+TRUNCATE "metric_sketch";
+INSERT INTO "metric_sketch" ("game_id","game_version","metric","key","day","bin","shard","count")
+SELECT "game_id", "game_version", "metric", "key", "day", "metric_sketch_bin"("value"), 0, COUNT(*)
+FROM (
+	SELECT r."game_id", r."game_version", 'run_duration_ms' AS metric, '' AS key,
+		r."started_at"::date AS day, EXTRACT(EPOCH FROM (r."ended_at" - r."started_at")) * 1000 AS value
+	FROM "run" r
+	UNION ALL
+	SELECT r."game_id", r."game_version", m.metric, '', c."entered_at"::date, m.value
+	FROM "room_summary" c
+	JOIN "run" r ON r."run_id" = c."run_id"
+	CROSS JOIN LATERAL (VALUES
+		('room_completion_ms', c."completion_ms"::double precision),
+		('room_damage_taken', c."damage_taken_in_room"::double precision)
+	) AS m(metric, value)
+	UNION ALL
+	SELECT r."game_id", r."game_version", m.metric, '', c."entered_at"::date, m.value
+	FROM "boss_summary" c
+	JOIN "run" r ON r."run_id" = c."run_id"
+	CROSS JOIN LATERAL (VALUES
+		('boss_duration_ms', c."duration_ms"::double precision),
+		('boss_damage_taken', c."damage_taken_in_boss"::double precision)
+	) AS m(metric, value)
+	UNION ALL
+	SELECT r."game_id", r."game_version", 'run_damage_taken', '', c."started_at"::date, c."total_damage_taken"
+	FROM "run_summary" c
+	JOIN "run" r ON r."run_id" = c."run_id"
+	UNION ALL
+	SELECT r."game_id", r."game_version", 'choice_run_duration_ms', cf."selected_upgrade_id",
+		r."started_at"::date, EXTRACT(EPOCH FROM (r."ended_at" - r."started_at")) * 1000
+	FROM "choice_fact" cf
+	JOIN "run" r ON r."run_id" = cf."run_id"
+) samples
+WHERE "game_version" IS NOT NULL AND "value" IS NOT NULL AND "day" IS NOT NULL AND "key" IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5, 6;
@@ -0,0 +1,57 @@
+-- choice_fact_rollup_trg read its run without a lock. A choice inserted while
+-- another transaction changed the run's outcome was counted with the old
+-- outcome, and run_choice_rollup_trg, which cannot see the uncommitted
+-- choice, never moved it. FOR SHARE closes the gap: it waits for a pending
+-- update of the run and reads the updated row, and an update that comes
+-- later waits for the choice to commit, so its trigger counts it.
+--
+-- Updates of choice_fact now move the pick between runs and upgrades too.
+CREATE OR REPLACE FUNCTION "choice_fact_rollup_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	r "run"%ROWTYPE;
+BEGIN
+	IF TG_OP IN ('DELETE', 'UPDATE') THEN
+		SELECT * INTO r FROM "run" WHERE "run_id" = OLD."run_id" FOR SHARE;
+		IF FOUND THEN
+			PERFORM "choice_upgrade_rollup_apply"(
+				r."game_id", r."game_version", OLD."selected_upgrade_id", -1,
+				r."end_reason", r."started_at", r."ended_at");
+		END IF;
+	END IF;
+	IF TG_OP IN ('INSERT', 'UPDATE') THEN
+		SELECT * INTO r FROM "run" WHERE "run_id" = NEW."run_id" FOR SHARE;
+		IF FOUND THEN
+			PERFORM "choice_upgrade_rollup_apply"(
+				r."game_id", r."game_version", NEW."selected_upgrade_id", 1,
+				r."end_reason", r."started_at", r."ended_at");
+		END IF;
+	END IF;
+	RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "choice_fact_rollup_update" ON "choice_fact";
+CREATE TRIGGER "choice_fact_rollup_update" AFTER UPDATE OF "run_id","selected_upgrade_id" ON "choice_fact"
+	FOR EACH ROW
+	WHEN (OLD."run_id" IS DISTINCT FROM NEW."run_id"
+		OR OLD."selected_upgrade_id" IS DISTINCT FROM NEW."selected_upgrade_id")
+	EXECUTE FUNCTION "choice_fact_rollup_trg"();
+
+-- Rebuild, dropping any drift the race left behind.
+LOCK TABLE "choice_fact", "run" IN SHARE ROW EXCLUSIVE MODE;
+TRUNCATE "choice_upgrade_rollup";
+INSERT INTO "choice_upgrade_rollup"
+	("game_id","game_version","selected_upgrade_id","picks","wins","duration_sec_sum","duration_count","updated_at")
+SELECT
+	r."game_id",
+	r."game_version",
+	cf."selected_upgrade_id",
+	COUNT(*),
+	COUNT(*) FILTER (WHERE r."end_reason" = 'win'),
+	COALESCE(SUM(EXTRACT(EPOCH FROM (r."ended_at" - r."started_at"))), 0),
+	COUNT(r."ended_at"),
+	NOW()
+FROM "choice_fact" cf
+JOIN "run" r ON r."run_id" = cf."run_id"
+WHERE r."game_version" IS NOT NULL
+GROUP BY r."game_id", r."game_version", cf."selected_upgrade_id";
@@ -0,0 +1,46 @@
+-- choice_fact_sketch_trg read its run without a lock, like the choice rollup
+-- trigger fixed in 0015: a choice inserted while another transaction changed
+-- the run's times or version kept the old run duration in its sketch, as
+-- run_choice_sketch_trg cannot see the uncommitted choice. FOR SHARE makes
+-- the two wait for each other. Updates of choice_fact now move the sample.
+CREATE OR REPLACE FUNCTION "choice_fact_sketch_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	r "run"%ROWTYPE;
+BEGIN
+	IF TG_OP IN ('DELETE', 'UPDATE') THEN
+		SELECT * INTO r FROM "run" WHERE "run_id" = OLD."run_id" FOR SHARE;
+		IF FOUND THEN
+			PERFORM "metric_sketch_add"(
+				r."game_id", r."game_version", 'choice_run_duration_ms', OLD."selected_upgrade_id",
+				r."started_at"::date, EXTRACT(EPOCH FROM (r."ended_at" - r."started_at")) * 1000, -1);
+		END IF;
+	END IF;
+	IF TG_OP IN ('INSERT', 'UPDATE') THEN
+		SELECT * INTO r FROM "run" WHERE "run_id" = NEW."run_id" FOR SHARE;
+		IF FOUND THEN
+			PERFORM "metric_sketch_add"(
+				r."game_id", r."game_version", 'choice_run_duration_ms', NEW."selected_upgrade_id",
+				r."started_at"::date, EXTRACT(EPOCH FROM (r."ended_at" - r."started_at")) * 1000, 1);
+		END IF;
+	END IF;
+	RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "choice_fact_sketch_update" ON "choice_fact";
+CREATE TRIGGER "choice_fact_sketch_update" AFTER UPDATE OF "run_id","selected_upgrade_id" ON "choice_fact"
+	FOR EACH ROW
+	WHEN (OLD."run_id" IS DISTINCT FROM NEW."run_id"
+		OR OLD."selected_upgrade_id" IS DISTINCT FROM NEW."selected_upgrade_id")
+	EXECUTE FUNCTION "choice_fact_sketch_trg"();
+
+-- Rebuild the choice sketches, dropping any drift the race left behind.
+LOCK TABLE "choice_fact", "run" IN SHARE ROW EXCLUSIVE MODE;
+DELETE FROM "metric_sketch" WHERE "metric" = 'choice_run_duration_ms';
+INSERT INTO "metric_sketch" ("game_id","game_version","metric","key","day","bin","shard","count")
+SELECT r."game_id", r."game_version", 'choice_run_duration_ms', cf."selected_upgrade_id", r."started_at"::date,
+	"metric_sketch_bin"(EXTRACT(EPOCH FROM (r."ended_at" - r."started_at")) * 1000), 0, COUNT(*)
+FROM "choice_fact" cf
+JOIN "run" r ON r."run_id" = cf."run_id"
+WHERE r."game_version" IS NOT NULL AND r."ended_at" IS NOT NULL AND r."started_at" IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5, 6;
@@ -0,0 +1,48 @@
+-- room_summary_rollup_trg read its run's game_version without a lock, the
+-- race 0015 fixed for choices: a room inserted while a finalize set the
+-- run's version was counted under the old (NULL) version, and
+-- run_room_rollup_trg, which cannot see the uncommitted room, never moved
+-- it. FOR SHARE makes the room wait for a pending run update and read the
+-- new version, and a later update wait for the room to commit.
+CREATE OR REPLACE FUNCTION "room_summary_rollup_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	version text;
+BEGIN
+	IF TG_OP IN ('UPDATE', 'DELETE') THEN
+		SELECT "game_version" INTO version FROM "run" WHERE "run_id" = OLD."run_id" FOR SHARE;
+		PERFORM "room_funnel_rollup_apply"(
+			OLD."game_id", version, OLD."room_name_norm", -1,
+			CASE WHEN OLD."exited_at" IS NULL THEN -1 ELSE 0 END,
+			-COALESCE(OLD."completion_ms", 0),
+			CASE WHEN OLD."completion_ms" IS NOT NULL THEN -1 ELSE 0 END);
+	END IF;
+	IF TG_OP IN ('INSERT', 'UPDATE') THEN
+		SELECT "game_version" INTO version FROM "run" WHERE "run_id" = NEW."run_id" FOR SHARE;
+		PERFORM "room_funnel_rollup_apply"(
+			NEW."game_id", version, NEW."room_name_norm", 1,
+			CASE WHEN NEW."exited_at" IS NULL THEN 1 ELSE 0 END,
+			COALESCE(NEW."completion_ms", 0),
+			CASE WHEN NEW."completion_ms" IS NOT NULL THEN 1 ELSE 0 END);
+	END IF;
+	RETURN NULL;
+END;
+$$;
+
+-- Rebuild, dropping any drift the race left behind.
+LOCK TABLE "room_summary", "run" IN SHARE ROW EXCLUSIVE MODE;
+TRUNCATE "room_funnel_rollup";
+INSERT INTO "room_funnel_rollup"
+	("game_id","game_version","room_name_norm","runs_entered","runs_ended_here","completion_ms_sum","completion_count","updated_at")
+SELECT
+	r."game_id",
+	r."game_version",
+	rs."room_name_norm",
+	COUNT(*),
+	COUNT(*) FILTER (WHERE rs."exited_at" IS NULL),
+	COALESCE(SUM(rs."completion_ms"), 0),
+	COUNT(rs."completion_ms"),
+	NOW()
+FROM "room_summary" rs
+JOIN "run" r ON r."run_id" = rs."run_id"
+WHERE r."game_version" IS NOT NULL AND rs."room_name_norm" IS NOT NULL
+GROUP BY r."game_id", r."game_version", rs."room_name_norm";
@@ -0,0 +1,151 @@
+-- metric_sketch_trg read the run of room_summary, boss_summary and
+-- run_summary rows without a lock, the race 0016 fixed for choices, and
+-- nothing moved those samples when the run's version changed afterwards: a
+-- finalize that set the version of a run whose rooms were already stored
+-- left them under the old (NULL) version. The child branches now read the
+-- run FOR SHARE, and a row trigger on run moves its children's samples from
+-- the old game and version to the new ones.
+CREATE OR REPLACE FUNCTION "metric_sketch_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+DECLARE
+	samples text;
+BEGIN
+	IF TG_TABLE_NAME = 'run' THEN
+		samples := $q$
+			SELECT c."game_id", c."game_version", 'run_duration_ms' AS metric,
+				c."started_at"::date AS day,
+				EXTRACT(EPOCH FROM (c."ended_at" - c."started_at")) * 1000 AS value
+			FROM changed_rows c
+		$q$;
+	ELSIF TG_TABLE_NAME = 'room_summary' THEN
+		samples := $q$
+			SELECT r."game_id", r."game_version", m.metric, c."entered_at"::date AS day, m.value
+			FROM changed_rows c
+			JOIN "run" r ON r."run_id" = c."run_id"
+			CROSS JOIN LATERAL (VALUES
+				('room_completion_ms', c."completion_ms"::double precision),
+				('room_damage_taken', c."damage_taken_in_room"::double precision)
+			) AS m(metric, value)
+			FOR SHARE OF r
+		$q$;
+	ELSIF TG_TABLE_NAME = 'boss_summary' THEN
+		samples := $q$
+			SELECT r."game_id", r."game_version", m.metric, c."entered_at"::date AS day, m.value
+			FROM changed_rows c
+			JOIN "run" r ON r."run_id" = c."run_id"
+			CROSS JOIN LATERAL (VALUES
+				('boss_duration_ms', c."duration_ms"::double precision),
+				('boss_damage_taken', c."damage_taken_in_boss"::double precision)
+			) AS m(metric, value)
+			FOR SHARE OF r
+		$q$;
+	ELSE
+		samples := $q$
+			SELECT r."game_id", r."game_version", 'run_damage_taken' AS metric,
+				c."started_at"::date AS day, c."total_damage_taken"::double precision AS value
+			FROM changed_rows c
+			JOIN "run" r ON r."run_id" = c."run_id"
+			FOR SHARE OF r
+		$q$;
+	END IF;
+
+	-- changed_rows is visible to dynamic SQL run from the trigger.
+	EXECUTE format($q$
+		INSERT INTO "metric_sketch" AS s ("game_id","game_version","metric","key","day","bin","shard","count")
+		SELECT "game_id", "game_version", metric, '', day, "metric_sketch_bin"(value),
+			pg_backend_pid() %% 16, COUNT(*) * $1
+		FROM (%s) samples
+		WHERE "game_version" IS NOT NULL AND value IS NOT NULL AND day IS NOT NULL
+		GROUP BY 1, 2, 3, 5, 6
+		ORDER BY 1, 2, 3, 5, 6
+		ON CONFLICT ("game_id","game_version","metric","key","day","bin","shard") DO UPDATE SET
+			"count" = s."count" + EXCLUDED."count"
+	$q$, samples) USING TG_ARGV[0]::integer;
+	RETURN NULL;
+END;
+$$;
+
+-- The run's own run_duration_ms sample moves through metric_sketch_trg;
+-- this moves the samples of its rooms, bosses and summary.
+CREATE OR REPLACE FUNCTION "run_child_sketch_trg"() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+	INSERT INTO "metric_sketch" AS s ("game_id","game_version","metric","key","day","bin","shard","count")
+	SELECT k."game_id", k."game_version", c.metric, '', c.day, "metric_sketch_bin"(c.value),
+		pg_backend_pid() % 16, SUM(k.delta)
+	FROM (
+		SELECT m.metric, rs."entered_at"::date AS day, m.value
+		FROM "room_summary" rs
+		CROSS JOIN LATERAL (VALUES
+			('room_completion_ms', rs."completion_ms"::double precision),
+			('room_damage_taken', rs."damage_taken_in_room"::double precision)
+		) AS m(metric, value)
+		WHERE rs."run_id" = NEW."run_id"
+		UNION ALL
+		SELECT m.metric, bs."entered_at"::date, m.value
+		FROM "boss_summary" bs
+		CROSS JOIN LATERAL (VALUES
+			('boss_duration_ms', bs."duration_ms"::double precision),
+			('boss_damage_taken', bs."damage_taken_in_boss"::double precision)
+		) AS m(metric, value)
+		WHERE bs."run_id" = NEW."run_id"
+		UNION ALL
+		SELECT 'run_damage_taken', su."started_at"::date, su."total_damage_taken"::double precision
+		FROM "run_summary" su
+		WHERE su."run_id" = NEW."run_id"
+	) c
+	CROSS JOIN (VALUES
+		(OLD."game_id", OLD."game_version", -1),
+		(NEW."game_id", NEW."game_version", 1)
+	) AS k("game_id", "game_version", delta)
+	WHERE k."game_version" IS NOT NULL AND c.value IS NOT NULL AND c.day IS NOT NULL
+	GROUP BY 1, 2, 3, 5, 6
+	ORDER BY 1, 2, 3, 5, 6
+	ON CONFLICT ("game_id","game_version","metric","key","day","bin","shard") DO UPDATE SET
+		"count" = s."count" + EXCLUDED."count";
+	RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS "run_child_sketch" ON "run";
+CREATE TRIGGER "run_child_sketch" AFTER UPDATE OF "game_id","game_version" ON "run"
+	FOR EACH ROW
+	WHEN (OLD."game_id" IS DISTINCT FROM NEW."game_id"
+		OR OLD."game_version" IS DISTINCT FROM NEW."game_version")
+	EXECUTE FUNCTION "run_child_sketch_trg"();
+
+-- Rebuild, dropping the samples left under old versions.
+LOCK TABLE "run", "room_summary", "boss_summary", "run_summary", "choice_fact" IN SHARE ROW EXCLUSIVE MODE;
+TRUNCATE "metric_sketch";
+INSERT INTO "metric_sketch" ("game_id","game_version","metric","key","day","bin","shard","count")
+SELECT "game_id", "game_version", "metric", "key", "day", "metric_sketch_bin"("value"), 0, COUNT(*)
+FROM (
+	SELECT r."game_id", r."game_version", 'run_duration_ms' AS metric, '' AS key,
+		r."started_at"::date AS day, EXTRACT(EPOCH FROM (r."ended_at" - r."started_at")) * 1000 AS value
+	FROM "run" r
+	UNION ALL
+	SELECT r."game_id", r."game_version", m.metric, '', c."entered_at"::date, m.value
+	FROM "room_summary" c
+	JOIN "run" r ON r."run_id" = c."run_id"
+	CROSS JOIN LATERAL (VALUES
+		('room_completion_ms', c."completion_ms"::double precision),
+		('room_damage_taken', c."damage_taken_in_room"::double precision)
+	) AS m(metric, value)
+	UNION ALL
+	SELECT r."game_id", r."game_version", m.metric, '', c."entered_at"::date, m.value
+	FROM "boss_summary" c
+	JOIN "run" r ON r."run_id" = c."run_id"
+	CROSS JOIN LATERAL (VALUES
+		('boss_duration_ms', c."duration_ms"::double precision),
+		('boss_damage_taken', c."damage_taken_in_boss"::double precision)
+	) AS m(metric, value)
+	UNION ALL
+	SELECT r."game_id", r."game_version", 'run_damage_taken', '', c."started_at"::date, c."total_damage_taken"
+	FROM "run_summary" c
+	JOIN "run" r ON r."run_id" = c."run_id"
+	UNION ALL
+	SELECT r."game_id", r."game_version", 'choice_run_duration_ms', cf."selected_upgrade_id",
+		r."started_at"::date, EXTRACT(EPOCH FROM (r."ended_at" - r."started_at")) * 1000
+	FROM "choice_fact" cf
+	JOIN "run" r ON r."run_id" = cf."run_id"
+) samples
+WHERE "game_version" IS NOT NULL AND "value" IS NOT NULL AND "day" IS NOT NULL AND "key" IS NOT NULL
+GROUP BY 1, 2, 3, 4, 5, 6;
@@ -0,0 +1,13 @@
+import os
+
+wsgi_app = "src.api:app"
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", 4))
+# Safe with preload: DatabaseConnection opens its pool lazily per process.
+preload_app = True
+
+
+def worker_exit(server, worker):
+    from src.api import shutdown
+
+    shutdown()
@@ -1,26 +1,131 @@
+import atexit
 import os
 
 from dotenv import load_dotenv
 
 load_dotenv()
 
-from flasgger import Swagger
-from flask import Flask
+from flasgger import Swagger, swag_from
+from flask import Flask, jsonify
 
-from src.db import DatabaseConnection
+from src import json_provider, metrics
+from src.buffer import IngestBuffer
+from src.cache import ResponseCache
+from src.db import AsyncDatabaseConnection, DatabaseConnection
+from src.dimensions import Dimensions
+from src.endpoints.captures import Captures
 from src.endpoints.events import Events
+from src.endpoints.jobs import JobQueue, Jobs
 from src.endpoints.rooms import Rooms
 from src.endpoints.runs import Runs
 from src.endpoints.stage import Stage
+from src.http_cache import Compression
+from src.queries import Queries
+from src.screenshots import ScreenshotStore
 
 app = Flask(__name__)
+json_provider.init_app(app)
 swagger = Swagger(app)
 app.register_blueprint(Runs, url_prefix="/api/v1/dashboard/runs")
 app.register_blueprint(Rooms, url_prefix="/api/v1/dashboard/rooms")
 app.register_blueprint(Stage, url_prefix="/api/v1/dashboard/stage")
 app.register_blueprint(Events, url_prefix="/api/v1/dashboard/events")
+app.register_blueprint(Captures, url_prefix="/api/v1/dashboard/captures")
+app.register_blueprint(Jobs, url_prefix="/api/v1/dashboard/jobs")
 conn_str = os.environ.get("PGSQL_CONN")
 if not conn_str:
     raise ValueError("PGSQL_CONN environment variable is not set")
 
 DatabaseConnection.initialize(conn_str)
+ResponseCache.initialize()
+IngestBuffer.initialize()
+ScreenshotStore.initialize()
+JobQueue.initialize()
+Dimensions.initialize()
+
+
+def shutdown():
+    """
+    Flushes buffered inserts, then closes this process's pool.
+    """
+    IngestBuffer.drain()
+    DatabaseConnection.close()
+
+
+atexit.register(shutdown)
+
+
+# Monotonic totals among the component stats, exported as counters.
+COUNTER_STATS = {
+    # psycopg_pool's statistics since the pool started
+    "requests_num",
+    "requests_queued",
+    "requests_wait_ms",
+    "requests_errors",
+    "usage_ms",
+    "returns_bad",
+    "connections_num",
+    "connections_ms",
+    "connections_errors",
+    "connections_lost",
+    # IngestBuffer
+    "accepted",
+    "rejected",
+    "flushed",
+    "failed",
+    "batches",
+    "flush_seconds",
+    # Dimensions
+    "hits",
+    "misses",
+    "loads",
+    "notifications",
+}
+
+
+def _add_samples(samples, prefix, stats):
+    for key, value in stats.items():
+        # Flags are exported as 0/1: "False" is not a valid sample value.
+        if isinstance(value, bool):
+            value = int(value)
+        elif not isinstance(value, (int, float)):
+            continue
+        if key in COUNTER_STATS:
+            samples[f"{prefix}_{key}_total"] = ("counter", value)
+        else:
+            samples[f"{prefix}_{key}"] = ("gauge", value)
+
+
+def _component_samples():
+    samples = {}
+    _add_samples(samples, "gamelens_pool", DatabaseConnection.get_stats())
+    if AsyncDatabaseConnection._pool is not None:
+        _add_samples(
+            samples, "gamelens_async_pool", AsyncDatabaseConnection.get_stats()
+        )
+    _add_samples(samples, "gamelens_ingest_buffer", IngestBuffer.stats())
+    _add_samples(samples, "gamelens_dimension_cache", Dimensions.stats())
+    return samples
+
+
+metrics.init_app(app, _component_samples)
+# Registered after metrics so response sizes are recorded as sent.
+Compression.init_app(app)
+
+
+@app.route("/api/v1/dashboard/ingest/buffer/stats", methods=["GET"])
+@swag_from("endpoints/docs/get_ingest_buffer_stats.yml")
+def get_ingest_buffer_stats():
+    return jsonify(IngestBuffer.stats()), 200
+
+
+@app.route("/api/v1/dashboard/db/pool/stats", methods=["GET"])
+@swag_from("endpoints/docs/get_pool_stats.yml")
+def get_pool_stats():
+    return jsonify(DatabaseConnection.get_stats()), 200
+
+
+@app.route("/api/v1/dashboard/db/queries/stats", methods=["GET"])
+@swag_from("endpoints/docs/get_query_stats.yml")
+def get_query_stats():
+    return jsonify(Queries.stats()), 200
@@ -0,0 +1,311 @@
+"""
+ASGI entry point: the analytics GET routes run as coroutines on an async
+psycopg pool, every other route is the Flask app run in a thread pool.
+
+    hypercorn --workers 4 --bind 0.0.0.0:8000 src.asgi:app
+
+The async routes share their SQL and response shapes with the Flask views
+through the *_report builders, so both serving modes answer identically.
+"""
+
+import asyncio
+import os
+import time
+from functools import wraps
+
+from hypercorn.middleware import AsyncioWSGIMiddleware
+from quart import Blueprint, Quart, Response, g, jsonify, make_response, request
+from quart.wrappers.response import DataBody
+from werkzeug.exceptions import MethodNotAllowed, NotFound
+
+from src import json_provider, metrics
+from src.api import app as flask_app
+from src.cache import ResponseCache, SQLiteBackend
+from src.db import AsyncDatabaseConnection
+from src.endpoints.events import (
+    bosses_report,
+    choice_offer_stats_report,
+    choices_stats_report,
+    deaths_report,
+    event_timeseries_report,
+)
+from src.endpoints.rooms import rooms_progression_report
+from src.endpoints.runs import (
+    OVERVIEW_PARAMS_ERROR,
+    run_overview_report,
+    run_percentiles_report,
+)
+from src.http_cache import WATERMARK_QUERY, Compression, etag
+from src.queries import Queries
+
+quart_app = Quart(__name__)
+json_provider.init_app(quart_app)
+
+_fill_locks = [asyncio.Lock() for _ in range(64)]
+
+
+async def run_report(report):
+    """
+    Executes a Report on the async pool and returns the Quart response.
+    """
+    if report.stream_key:
+        return _stream_json_rows(report)
+
+    try:
+        async with AsyncDatabaseConnection.get_connection() as conn:
+            async with conn.cursor() as cur:
+                await Queries.execute_async(cur, report.query, report.params)
+                rows = await cur.fetchall()
+
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    return jsonify(report.shape(rows)), 200
+
+
+def _stream_json_rows(report, itersize=2000):
+    dumps = quart_app.json.dumps
+
+    async def generate():
+        async with AsyncDatabaseConnection.get_connection() as conn:
+            async with conn.cursor(name=f"stream_{report.stream_key}") as cur:
+                cur.itersize = itersize
+                await cur.execute(report.query.sql, report.params)
+                yield f'{{"{report.stream_key}":['.encode()
+                separator = ""
+                async for row in cur:
+                    yield (separator + dumps(report.to_dict(row))).encode()
+                    separator = ","
+                yield b"]}"
+            await conn.commit()
+
+    return Response(generate(), mimetype="application/json")
+
+
+def cached(name, ttl):
+    """
+    ResponseCache.cached for coroutine views. Misses for the same key wait
+    on an asyncio lock instead of a thread lock.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            backend = ResponseCache._backend
+            if backend is None:
+                return await view(*args, **kwargs)
+
+            key = await _off_loop(
+                backend,
+                ResponseCache.key,
+                name,
+                request.args,
+                g.get("data_watermark"),
+            )
+            body = await _off_loop(backend, backend.get, key)
+            if body is not None:
+                return _cached_response(body)
+
+            async with _fill_locks[hash(key) % len(_fill_locks)]:
+                body = await _off_loop(backend, backend.get, key)
+                if body is not None:
+                    return _cached_response(body)
+
+                response = await make_response(await view(*args, **kwargs))
+                # Streamed bodies are never buffered into the cache.
+                if response.status_code == 200 and isinstance(
+                    response.response, DataBody
+                ):
+                    body = await response.get_data()
+                    await _off_loop(backend, backend.set, key, body, ttl)
+                response.headers["X-Cache"] = "MISS"
+                return response
+
+        return wrapper
+
+    return decorator
+
+
+async def _off_loop(backend, func, *args):
+    # SQLite calls block on file locks shared with the other workers, so they
+    # run in a thread; the memory backend only takes a short in-process lock.
+    if isinstance(backend, SQLiteBackend):
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+def _cached_response(body):
+    response = Response(bytes(body), mimetype="application/json")
+    response.headers["X-Cache"] = "HIT"
+    return response
+
+
+def conditional(name):
+    """
+    http_cache.conditional for coroutine views.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            game_id = request.args.get("game_id")
+            game_version = request.args.get("game_version")
+            if not game_id or not game_version:
+                return await view(*args, **kwargs)
+
+            try:
+                async with AsyncDatabaseConnection.get_connection() as conn:
+                    async with conn.cursor() as cur:
+                        await Queries.execute_async(
+                            cur, WATERMARK_QUERY, (game_id, game_version)
+                        )
+                        watermark = (await cur.fetchone())[0]
+            except Exception:
+                return await view(*args, **kwargs)
+
+            g.data_watermark = watermark
+            digest = etag(name, watermark, request.args)
+            if request.if_none_match.contains_weak(digest):
+                response = Response(b"", status=304)
+            else:
+                response = await make_response(await view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(digest, weak=True)
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+Events = Blueprint("events", __name__)
+Rooms = Blueprint("rooms", __name__)
+Runs = Blueprint("runs", __name__)
+
+
+@Events.route("/choices", methods=["GET"])
+@conditional("choices")
+@cached("choices", ttl=60)
+async def get_choices_stats():
+    return await run_report(choices_stats_report(request.args))
+
+
+@Events.route("/choices/offers", methods=["GET"])
+@conditional("choice_offers")
+@cached("choice_offers", ttl=60)
+async def get_choice_offer_stats():
+    return await run_report(choice_offer_stats_report(request.args))
+
+
+@Events.route("/boss", methods=["GET"])
+@conditional("boss")
+@cached("boss", ttl=30)
+async def get_bosses():
+    return await run_report(bosses_report(request.args))
+
+
+@Events.route("/death", methods=["GET"])
+@conditional("death")
+@cached("death", ttl=30)
+async def get_deaths():
+    return await run_report(deaths_report(request.args))
+
+
+@Events.route("/timeseries", methods=["GET"])
+@cached("event_timeseries", ttl=30)
+async def get_event_timeseries():
+    return await run_report(event_timeseries_report(request.args))
+
+
+@Rooms.route("/rooms/progression", methods=["GET"])
+@conditional("rooms_progression")
+@cached("rooms_progression", ttl=60)
+async def get_rooms_progression():
+    return await run_report(rooms_progression_report(request.args))
+
+
+@Runs.route("/overview", methods=["GET"])
+@conditional("runs_overview")
+@cached("runs_overview", ttl=30)
+async def get_run_overview():
+    report = run_overview_report(request.args)
+    if report is None:
+        return jsonify(OVERVIEW_PARAMS_ERROR), 400
+    return await run_report(report)
+
+
+@Runs.route("/percentiles", methods=["GET"])
+@conditional("run_percentiles")
+@cached("run_percentiles", ttl=60)
+async def get_run_percentiles():
+    return await run_report(run_percentiles_report(request.args))
+
+
+quart_app.register_blueprint(Runs, url_prefix="/api/v1/dashboard/runs")
+quart_app.register_blueprint(Rooms, url_prefix="/api/v1/dashboard/rooms")
+quart_app.register_blueprint(Events, url_prefix="/api/v1/dashboard/events")
+
+
+@quart_app.before_request
+async def _start_timer():
+    g.metrics_started = time.perf_counter()
+    metrics.async_labels.set((request.endpoint or "", request.args.get("game_id", "")))
+
+
+@quart_app.after_request
+async def _record(response):
+    labels = metrics.request_labels()
+    metrics.REQUEST_SECONDS.observe(
+        time.perf_counter() - g.metrics_started, *labels, str(response.status_code)
+    )
+    if not isinstance(response.response, DataBody):
+        return response
+
+    data = await response.get_data()
+    if (
+        Compression.min_size > 0
+        and response.status_code == 200
+        and "Content-Encoding" not in response.headers
+        and response.mimetype == "application/json"
+    ):
+        response.vary.add("Accept-Encoding")
+        if len(data) >= Compression.min_size:
+            encoding, data = Compression.encode(data, request.accept_encodings)
+            if encoding is not None:
+                response.set_data(data)
+                response.headers["Content-Encoding"] = encoding
+    # Recorded as sent, after compression.
+    metrics.RESPONSE_BYTES.observe(len(data), *labels)
+    return response
+
+
+@quart_app.before_serving
+async def _open_pool():
+    await AsyncDatabaseConnection.open()
+
+
+@quart_app.after_serving
+async def _close_pool():
+    await AsyncDatabaseConnection.close()
+
+
+_wsgi = AsyncioWSGIMiddleware(
+    flask_app, max_body_size=int(os.environ.get("ASGI_MAX_BODY_BYTES", 16 * 2**20))
+)
+_routes = quart_app.url_map.bind("")
+
+
+async def app(scope, receive, send):
+    """
+    Sends the async routes to Quart and everything else to Flask.
+    """
+    if scope["type"] == "http":
+        try:
+            _routes.match(scope["path"], method=scope["method"])
+        except (NotFound, MethodNotAllowed):
+            return await _wsgi(scope, receive, send)
+    return await quart_app(scope, receive, send)
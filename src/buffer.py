@@ -0,0 +1,210 @@
+import os
+import threading
+import time
+from collections import deque
+
+from flask import jsonify
+
+from src.cache import invalidate
+from src.db import DatabaseConnection
+
+
+class _TableBuffer:
+    def __init__(self, sql):
+        self.sql = sql
+        self.rows = deque()
+        self.oldest = None
+
+
+class IngestBuffer:
+    """
+    Opt-in write-behind buffer for the single-row insert endpoints.
+
+    Accepted rows are queued per table and a background thread writes them
+    with one executemany (pipelined by psycopg) and one commit per batch.
+    """
+
+    enabled = False
+    max_rows = 10000
+    batch_size = 500
+    flush_interval = 0.2
+
+    _tables = {}
+    _queued = 0
+    _cond = threading.Condition()
+    _thread = None
+    _pid = None
+    _stopping = False
+    _stats = {
+        "accepted": 0,
+        "rejected": 0,
+        "flushed": 0,
+        "failed": 0,
+        "batches": 0,
+        "flush_seconds": 0.0,
+    }
+
+    @classmethod
+    def initialize(cls):
+        cls.enabled = os.environ.get("INGEST_BUFFER", "false").lower() == "true"
+        cls.max_rows = int(os.environ.get("INGEST_BUFFER_MAX_ROWS", cls.max_rows))
+        cls.batch_size = int(os.environ.get("INGEST_BUFFER_BATCH_SIZE", cls.batch_size))
+        cls.flush_interval = (
+            int(os.environ.get("INGEST_BUFFER_FLUSH_MS", cls.flush_interval * 1000))
+            / 1000
+        )
+
+    @classmethod
+    def submit(cls, table, sql, params, game_id):
+        """
+        Queues one row. Returns False when the buffer is full.
+        """
+        with cls._cond:
+            cls._ensure_flusher()
+            if cls._queued >= cls.max_rows:
+                cls._stats["rejected"] += 1
+                return False
+
+            buffer = cls._tables.get(table)
+            if buffer is None:
+                buffer = cls._tables[table] = _TableBuffer(sql)
+            if not buffer.rows:
+                buffer.oldest = time.monotonic()
+            buffer.rows.append((params, game_id))
+            cls._queued += 1
+            cls._stats["accepted"] += 1
+
+            if len(buffer.rows) >= cls.batch_size:
+                cls._cond.notify()
+        return True
+
+    @classmethod
+    def _ensure_flusher(cls):
+        # Threads do not survive a fork, so each worker starts its own.
+        if cls._pid == os.getpid() and cls._thread.is_alive():
+            return
+        cls._pid = os.getpid()
+        cls._stopping = False
+        cls._thread = threading.Thread(
+            target=cls._run, name="ingest-buffer", daemon=True
+        )
+        cls._thread.start()
+
+    @classmethod
+    def _run(cls):
+        while True:
+            with cls._cond:
+                cls._cond.wait(cls.flush_interval)
+                if cls._stopping:
+                    return
+                batches = cls._take(force=False)
+            for table, sql, rows in batches:
+                cls._write(table, sql, rows)
+
+    @classmethod
+    def _take(cls, force):
+        """
+        Pops every batch that is full, older than flush_interval, or any
+        batch at all when forced. Must be called with _cond held.
+        """
+        now = time.monotonic()
+        batches = []
+        for table, buffer in cls._tables.items():
+            while buffer.rows and (
+                force
+                or len(buffer.rows) >= cls.batch_size
+                or now - buffer.oldest >= cls.flush_interval
+            ):
+                count = min(cls.batch_size, len(buffer.rows))
+                rows = [buffer.rows.popleft() for _ in range(count)]
+                cls._queued -= count
+                batches.append((table, buffer.sql, rows))
+                buffer.oldest = now
+        return batches
+
+    @classmethod
+    def _write(cls, table, sql, rows):
+        started = time.perf_counter()
+        flushed, failed = 0, 0
+        try:
+            with DatabaseConnection.get_connection() as conn:
+                try:
+                    with conn.cursor() as cur:
+                        cur.executemany(sql, [params for params, _ in rows])
+                    conn.commit()
+                    flushed = len(rows)
+                except Exception:
+                    conn.rollback()
+                    # Isolate the bad rows so one of them does not drop the
+                    # whole batch.
+                    for params, _ in rows:
+                        try:
+                            with conn.cursor() as cur:
+                                cur.execute(sql, params)
+                            conn.commit()
+                            flushed += 1
+                        except Exception as e:
+                            conn.rollback()
+                            failed += 1
+                            print(f"Ingest buffer dropped a {table} row: {e}")
+        except Exception as e:
+            failed = len(rows) - flushed
+            print(f"Ingest buffer failed to flush {failed} {table} rows: {e}")
+
+        invalidate(*(game_id for _, game_id in rows))
+        with cls._cond:
+            cls._stats["flushed"] += flushed
+            cls._stats["failed"] += failed
+            cls._stats["batches"] += 1
+            cls._stats["flush_seconds"] += time.perf_counter() - started
+
+    @classmethod
+    def drain(cls):
+        """
+        Stops the flusher and writes everything still queued.
+        """
+        with cls._cond:
+            cls._stopping = True
+            cls._cond.notify_all()
+            thread = cls._thread if cls._pid == os.getpid() else None
+        if thread is not None:
+            thread.join()
+
+        with cls._cond:
+            batches = cls._take(force=True)
+        for table, sql, rows in batches:
+            cls._write(table, sql, rows)
+
+    @classmethod
+    def stats(cls):
+        with cls._cond:
+            return {
+                **cls._stats,
+                "enabled": cls.enabled,
+                "queued": cls._queued,
+                "max_rows": cls.max_rows,
+                "queued_by_table": {
+                    table: len(buffer.rows) for table, buffer in cls._tables.items()
+                },
+            }
+
+
+def buffered_insert(table, sql, params, game_id):
+    """
+    Response for a buffered insert endpoint: 202 when queued, 429 when the
+    buffer is full.
+    """
+    if not IngestBuffer.submit(table, sql, params, game_id):
+        return (
+            jsonify(
+                {
+                    "error": "Too Many Requests",
+                    "message": "Ingest buffer is full, retry later.",
+                    "type": "BufferFull",
+                }
+            ),
+            429,
+            {"Retry-After": "1"},
+        )
+
+    return jsonify({"message": "Accepted for buffered insert"}), 202
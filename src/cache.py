@@ -0,0 +1,262 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, g, make_response, request
+
+
+class MemoryBackend:
+    """
+    A bounded, per-process LRU store with per-entry expiry.
+    """
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def generation(self, name):
+        return self._generations.get(name, 0)
+
+    def incr(self, name):
+        with self._lock:
+            self._generations[name] = self._generations.get(name, 0) + 1
+            return self._generations[name]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteBackend:
+    """
+    An LRU store in a local SQLite file, shared by every worker process on
+    the host (point it at /dev/shm to keep it in memory).
+    """
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connection() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value BLOB,
+                    expires_at REAL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS generation (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                )
+                """
+            )
+
+    def _connection(self):
+        # Connections must not cross a fork, so they are keyed by pid.
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA synchronous=OFF")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        conn = self._connection()
+        now = time.time()
+        row = conn.execute(
+            "SELECT value, expires_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at < now:
+            conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        now = time.time()
+        conn.execute(
+            """
+            INSERT INTO cache (key, value, expires_at, accessed_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT (key) DO UPDATE SET
+                value = excluded.value,
+                expires_at = excluded.expires_at,
+                accessed_at = excluded.accessed_at
+            """,
+            (key, value, now + ttl if ttl else None, now),
+        )
+        conn.execute(
+            """
+            DELETE FROM cache WHERE key IN (
+                SELECT key FROM cache
+                ORDER BY accessed_at
+                LIMIT max((SELECT COUNT(*) FROM cache) - ?, 0)
+            )
+            """,
+            (self.max_entries,),
+        )
+
+    def generation(self, name):
+        row = (
+            self._connection()
+            .execute("SELECT value FROM generation WHERE name = ?", (name,))
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def incr(self, name):
+        row = (
+            self._connection()
+            .execute(
+                """
+                INSERT INTO generation (name, value) VALUES (?, 1)
+                ON CONFLICT (name) DO UPDATE SET value = value + 1
+                RETURNING value
+                """,
+                (name,),
+            )
+            .fetchone()
+        )
+        return row[0]
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+
+class ResponseCache:
+    """
+    Caches successful GET responses per game_id.
+
+    Every key embeds a per-game generation number; writes for a game bump
+    it, which invalidates all of that game's cached responses at once. Under
+    http_cache.conditional the key also embeds the data_watermark its ETag
+    was built from, so a body is only ever served with the ETag of the data
+    it was computed from, whichever worker wrote that data.
+    """
+
+    _backend = None
+    _fill_locks = [threading.Lock() for _ in range(64)]
+
+    @classmethod
+    def initialize(cls, backend=None, path=None, max_entries=None):
+        backend = backend or os.environ.get("CACHE_BACKEND", "memory")
+        max_entries = max_entries or int(os.environ.get("CACHE_MAX_ENTRIES", 1024))
+
+        if backend == "memory":
+            cls._backend = MemoryBackend(max_entries)
+        elif backend == "sqlite":
+            path = path or os.environ.get("CACHE_PATH", "/dev/shm/gamelens-cache.db")
+            cls._backend = SQLiteBackend(path, max_entries)
+        elif backend == "none":
+            cls._backend = None
+        else:
+            raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+    @classmethod
+    def invalidate(cls, *game_ids):
+        """
+        Drops every cached response for the given games.
+        """
+        if cls._backend is None:
+            return
+        for game_id in set(game_ids):
+            cls._backend.incr(str(game_id))
+
+    @classmethod
+    def cached(cls, name, ttl):
+        """
+        Caches a GET view's 200 responses for `ttl` seconds, keyed by the
+        view name and its query string.
+        """
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if cls._backend is None:
+                    return view(*args, **kwargs)
+
+                key = cls.key(name, request.args, g.get("data_watermark"))
+                body = cls._backend.get(key)
+                if body is not None:
+                    return cls._response(body, "HIT")
+
+                # Concurrent misses for the same key within a worker wait for
+                # the first one instead of each running the query.
+                with cls._fill_locks[hash(key) % len(cls._fill_locks)]:
+                    body = cls._backend.get(key)
+                    if body is not None:
+                        return cls._response(body, "HIT")
+
+                    response = make_response(view(*args, **kwargs))
+                    # Streamed bodies are never buffered into the cache.
+                    if response.status_code == 200 and not response.is_streamed:
+                        cls._backend.set(key, response.get_data(), ttl)
+                    response.headers["X-Cache"] = "MISS"
+                    return response
+
+            return wrapper
+
+        return decorator
+
+    @classmethod
+    def key(cls, name, args, watermark=None):
+        """
+        Cache key of a view's response for the given query args, under the
+        game's current generation and, when known, its data watermark.
+        """
+        game_id = args.get("game_id")
+        # Encoded, so no two different queries produce the same string.
+        query = urlencode(sorted(args.items(multi=True)))
+        generation = cls._backend.generation(str(game_id))
+        return f"{name}:{game_id}:{generation}:{watermark}:{query}"
+
+    @staticmethod
+    def _response(body, status):
+        response = Response(bytes(body), mimetype="application/json")
+        response.headers["X-Cache"] = status
+        return response
+
+
+cached = ResponseCache.cached
+invalidate = ResponseCache.invalidate
@@ -1,37 +1,176 @@
-from psycopg_pool import ConnectionPool
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from psycopg_pool import AsyncConnectionPool, ConnectionPool
+
+from src.metrics import (
+    POOL_WAIT_SECONDS,
+    TimedAsyncCursor,
+    TimedCursor,
+    request_labels,
+)
 
 
 class DatabaseConnection:
     """
     A Singleton wrapper around a Connection Pool.
+
+    The pool is created lazily in the process that first uses it, so a
+    gunicorn master that imports the app with --preload never hands open
+    connections to its forked workers.
     """
 
     _pool = None
+    _pid = None
+    _conn_string = None
+    _pool_kwargs = {}
+    _lock = threading.Lock()
 
     @classmethod
-    def initialize(cls, conn_string):
-        if cls._pool is None:
-            print("Initializing Connection Pool...")
-            cls._pool = ConnectionPool(conn_string, min_size=1, max_size=10)
+    def initialize(cls, conn_string, **pool_kwargs):
+        """
+        Stores the pool settings. Values not passed in are read from the
+        PG_POOL_* environment variables.
+        """
+        cls._conn_string = conn_string
+        cls._pool_kwargs = {
+            "min_size": int(os.environ.get("PG_POOL_MIN_SIZE", 1)),
+            "max_size": int(os.environ.get("PG_POOL_MAX_SIZE", 10)),
+            "timeout": float(os.environ.get("PG_POOL_TIMEOUT", 30)),
+            "max_waiting": int(os.environ.get("PG_POOL_MAX_WAITING", 0)),
+            "max_lifetime": float(os.environ.get("PG_POOL_MAX_LIFETIME", 3600)),
+            "max_idle": float(os.environ.get("PG_POOL_MAX_IDLE", 600)),
+            **pool_kwargs,
+        }
 
     @classmethod
+    def _get_pool(cls):
+        if cls._pid == os.getpid():
+            return cls._pool
+
+        with cls._lock:
+            if cls._pid != os.getpid():
+                if cls._conn_string is None:
+                    raise Exception(
+                        "Database not initialized. Call Database.initialize() first."
+                    )
+                print(f"Initializing Connection Pool in process {os.getpid()}...")
+                # A pool inherited across fork is abandoned, not closed: its
+                # sockets still belong to the parent.
+                cls._pool = ConnectionPool(
+                    cls._conn_string,
+                    open=True,
+                    configure=cls._configure,
+                    **cls._pool_kwargs,
+                )
+                cls._pid = os.getpid()
+        return cls._pool
+
+    @staticmethod
+    def _configure(conn):
+        conn.cursor_factory = TimedCursor
+
+    @classmethod
+    @contextmanager
     def get_connection(cls):
         """
         Returns a context manager that yields a connection from the pool.
         """
-        if cls._pool is None:
-            raise Exception(
-                "Database not initialized. Call Database.initialize() first."
-            )
-
         # Usage: with Database.get_connection() as conn: ...
-        return cls._pool.connection()
+        started = time.perf_counter()
+        with cls._get_pool().connection() as conn:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started, *request_labels())
+            yield conn
+
+    @classmethod
+    def get_stats(cls):
+        """
+        Pool counters for sizing: waiting requests, total wait time and
+        connections in use, plus psycopg_pool's own statistics.
+        """
+        if cls._pool is None or cls._pid != os.getpid():
+            return {"initialized": False, **cls._pool_kwargs}
+
+        stats = cls._pool.get_stats()
+        return {
+            "initialized": True,
+            **cls._pool_kwargs,
+            **stats,
+            "connections_in_use": stats.get("pool_size", 0)
+            - stats.get("pool_available", 0),
+        }
 
     @classmethod
     def close(cls):
         """
         Clean up the pool on app shutdown.
         """
-        if cls._pool:
+        if cls._pool and cls._pid == os.getpid():
             cls._pool.close()
             print("Connection Pool closed.")
+        cls._pool = None
+        cls._pid = None
+
+
+class AsyncDatabaseConnection:
+    """
+    The asyncio counterpart of DatabaseConnection, used by the ASGI app.
+
+    The pool takes the same settings as the sync one; it is opened when the
+    event loop starts serving and closed when it stops.
+    """
+
+    _pool = None
+
+    @classmethod
+    async def open(cls):
+        if DatabaseConnection._conn_string is None:
+            raise Exception(
+                "Database not initialized. Call Database.initialize() first."
+            )
+        print(f"Initializing async Connection Pool in process {os.getpid()}...")
+        cls._pool = AsyncConnectionPool(
+            DatabaseConnection._conn_string,
+            open=False,
+            configure=cls._configure,
+            **DatabaseConnection._pool_kwargs,
+        )
+        await cls._pool.open()
+
+    @staticmethod
+    async def _configure(conn):
+        conn.cursor_factory = TimedAsyncCursor
+
+    @classmethod
+    @asynccontextmanager
+    async def get_connection(cls):
+        """
+        Async context manager that yields a connection from the pool.
+        """
+        started = time.perf_counter()
+        async with cls._pool.connection() as conn:
+            POOL_WAIT_SECONDS.observe(time.perf_counter() - started, *request_labels())
+            yield conn
+
+    @classmethod
+    def get_stats(cls):
+        if cls._pool is None:
+            return {"initialized": False, **DatabaseConnection._pool_kwargs}
+
+        stats = cls._pool.get_stats()
+        return {
+            "initialized": True,
+            **DatabaseConnection._pool_kwargs,
+            **stats,
+            "connections_in_use": stats.get("pool_size", 0)
+            - stats.get("pool_available", 0),
+        }
+
+    @classmethod
+    async def close(cls):
+        if cls._pool is not None:
+            await cls._pool.close()
+            print("Async Connection Pool closed.")
+        cls._pool = None
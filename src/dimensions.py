@@ -0,0 +1,236 @@
+import os
+import re
+import threading
+import time
+
+import psycopg
+from werkzeug.exceptions import BadRequest, ServiceUnavailable
+
+from src.db import DatabaseConnection
+from src.queries import Queries, register
+
+CHANNEL = "dimension_change"
+
+# Name field a client may send -> (dimension, key field it fills in).
+NAME_FIELDS = {
+    "event_type": ("event_type", "event_type_id"),
+    "stage_name": ("stage", "stage_id"),
+    "final_stage_name": ("stage", "final_stage_id"),
+    "boss_name": ("boss", "boss_name"),
+}
+
+LOAD_QUERIES = {
+    "event_type": register(
+        "load_event_types",
+        """
+        SELECT name, id FROM event_type WHERE name IS NOT NULL;
+        """,
+    ),
+    "stage": register(
+        "load_stages",
+        """
+        SELECT canonical_name, stage_id FROM stage
+        WHERE game_id = %s AND canonical_name IS NOT NULL
+        UNION ALL
+        SELECT name_norm, stage_id FROM stage WHERE game_id = %s;
+        """,
+    ),
+    "boss": register(
+        "load_bosses",
+        """
+        SELECT boss_name, boss_name FROM boss WHERE game_id = %s;
+        """,
+    ),
+}
+
+
+def normalize(name):
+    """
+    Lower case, with runs of spaces, dashes and underscores as one "_".
+    """
+    return re.sub(r"[\s_-]+", "_", str(name).strip().lower())
+
+
+class Dimensions:
+    """
+    Per-worker cache of the small dimension tables, so ingest routes can
+    take names (event_type, stage_name, boss_name) and resolve them to keys
+    without a query.
+
+    Each (table, game_id) is loaded on first use and tagged with a version.
+    invalidate() bumps the version, and the next lookup reloads. The write
+    routes invalidate their own worker. Triggers on the tables NOTIFY
+    dimension_change, and a listener thread per worker invalidates on it
+    (DIMENSION_LISTEN=false turns it off). An unknown name reloads its
+    table, at most once per reload_interval, before it is rejected.
+    """
+
+    listen = True
+    reload_interval = 1.0
+
+    # (table, game_id) -> version, and -> (version, loaded_at, {name: key}).
+    _versions = {}
+    _entries = {}
+    _lock = threading.Lock()
+    _thread = None
+    _pid = None
+    _stats = {"hits": 0, "misses": 0, "loads": 0, "notifications": 0}
+
+    @classmethod
+    def initialize(cls):
+        cls.listen = os.environ.get("DIMENSION_LISTEN", "true").lower() == "true"
+        cls.reload_interval = float(
+            os.environ.get("DIMENSION_RELOAD_SECONDS", cls.reload_interval)
+        )
+
+    @classmethod
+    def invalidate(cls, table, game_id=None):
+        """
+        Drops a table's cached names: one game's, or every game's when
+        game_id is None.
+        """
+        with cls._lock:
+            for key in cls._versions:
+                if key[0] == table and (game_id is None or key[1] == game_id):
+                    cls._versions[key] += 1
+
+    @classmethod
+    def invalidate_all(cls):
+        with cls._lock:
+            for key in cls._versions:
+                cls._versions[key] += 1
+
+    @classmethod
+    def lookup(cls, table, game_id, name, cur=None):
+        """
+        Key of `name` in `table`, or None when it does not exist. `cur` is
+        used for a reload when given, otherwise a pooled connection.
+        """
+        cls._ensure_listener()
+        if table == "event_type":
+            game_id = None
+        key = (table, game_id)
+        name = normalize(name)
+
+        with cls._lock:
+            entry = cls._entries.get(key)
+            current = entry is not None and entry[0] == cls._versions.get(key, 0)
+            if current and name in entry[2]:
+                cls._stats["hits"] += 1
+                return entry[2][name]
+            cls._stats["misses"] += 1
+            if current and time.monotonic() - entry[1] < cls.reload_interval:
+                return None
+
+        return cls._load(key, cur).get(name)
+
+    @classmethod
+    def _load(cls, key, cur):
+        table, game_id = key
+        with cls._lock:
+            version = cls._versions.setdefault(key, 0)
+
+        if table == "event_type":
+            params = ()
+        elif table == "stage":
+            params = (game_id, game_id)
+        else:
+            params = (game_id,)
+
+        if cur is None:
+            with DatabaseConnection.get_connection() as conn:
+                with conn.cursor() as cur:
+                    Queries.execute(cur, LOAD_QUERIES[table], params)
+                    rows = cur.fetchall()
+        else:
+            Queries.execute(cur, LOAD_QUERIES[table], params)
+            rows = cur.fetchall()
+
+        # Later rows win, so a stage's name_norm beats another stage's
+        # canonical_name.
+        names = {normalize(name): value for name, value in rows}
+        with cls._lock:
+            cls._stats["loads"] += 1
+            # Tagged with the version read before the query: a change that
+            # lands while it runs makes the next lookup load again.
+            cls._entries[key] = (version, time.monotonic(), names)
+        return names
+
+    @classmethod
+    def resolve(cls, items, game_id=None, cur=None):
+        """
+        Fills in key fields from the name fields of each dict in `items`,
+        using its own game_id or the given one. Raises BadRequest on an
+        unknown name, except for fields that already are the key, which are
+        left as sent; errors point at the item's index for batches.
+        ServiceUnavailable when a table cannot be loaded.
+        """
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                continue
+            for field, (table, key_field) in NAME_FIELDS.items():
+                name = item.get(field)
+                if name is None or (field != key_field and key_field in item):
+                    continue
+                item_game_id = item.get("game_id", game_id)
+                # Without a game the name cannot be looked up; validation
+                # reports the missing game_id.
+                if table != "event_type" and item_game_id is None:
+                    continue
+                try:
+                    value = cls.lookup(table, item_game_id, name, cur)
+                except psycopg.Error as e:
+                    raise ServiceUnavailable(f"Could not load {table} names: {e}")
+                if value is None:
+                    # A key sent as is may be newer than the cached names;
+                    # its foreign key decides instead.
+                    if field == key_field:
+                        continue
+                    prefix = f"Item {index}: " if len(items) > 1 else ""
+                    raise BadRequest(f"{prefix}Unknown {field}: {name}")
+                item[key_field] = value
+
+    @classmethod
+    def _ensure_listener(cls):
+        # Threads do not survive a fork, so each worker starts its own.
+        if not cls.listen or (cls._pid == os.getpid() and cls._thread.is_alive()):
+            return
+        with cls._lock:
+            if cls._pid == os.getpid() and cls._thread.is_alive():
+                return
+            cls._pid = os.getpid()
+            cls._thread = threading.Thread(
+                target=cls._listen, name="dimension-listener", daemon=True
+            )
+            cls._thread.start()
+
+    @classmethod
+    def _listen(cls):
+        while True:
+            try:
+                with psycopg.connect(
+                    DatabaseConnection._conn_string, autocommit=True
+                ) as conn:
+                    conn.execute(f"LISTEN {CHANNEL}")
+                    # Changes made while not listening were missed.
+                    cls.invalidate_all()
+                    for notify in conn.notifies():
+                        table, _, game_id = notify.payload.partition(":")
+                        with cls._lock:
+                            cls._stats["notifications"] += 1
+                        cls.invalidate(table, game_id or None)
+            except Exception as e:
+                print(f"Dimension listener disconnected: {e}")
+            time.sleep(5)
+
+    @classmethod
+    def stats(cls):
+        with cls._lock:
+            return {
+                **cls._stats,
+                "listening": cls._pid == os.getpid() and cls._thread.is_alive(),
+                "cached": sorted(
+                    f"{table}:{game_id}" if game_id else table
+                    for table, game_id in cls._entries
+                ),
+            }
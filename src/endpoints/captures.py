@@ -0,0 +1,182 @@
+import json
+import uuid
+
+from flasgger import swag_from
+from flask import Blueprint, jsonify, request, send_file
+from psycopg.types.json import Json
+from werkzeug.exceptions import BadRequest, NotFound
+
+from src.util import validate_data
+
+from ..db import DatabaseConnection
+from ..partitions import Partitions
+from ..queries import Queries, register
+from ..screenshots import ScreenshotStore
+
+Captures = Blueprint("captures", __name__)
+
+INSERT_CAPTURE_QUERY = register(
+    "insert_capture",
+    """
+    INSERT INTO raw_capture
+    (
+        capture_id,
+        game_id,
+        session_id,
+        run_id,
+        captured_at,
+        received_at,
+        input_device,
+        input_code,
+        mouse_x,
+        mouse_y,
+        screenshot_ref,
+        screenshot_hash,
+        image_width,
+        image_height,
+        status,
+        process_attempts,
+        game_version,
+        extra
+    )
+    VALUES
+    (
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        NOW(),
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        0,
+        %s,
+        %s
+    );
+    """,
+)
+
+
+@Captures.route("/insert", methods=["POST"])
+@swag_from("docs/insert_capture.yml")
+def insert_capture():
+    # The frame comes either as the "screenshot" part of a multipart body,
+    # next to the metadata in the "capture" part, or was uploaded first and
+    # is referenced by screenshot_hash.
+    if request.mimetype == "multipart/form-data":
+        try:
+            data = json.loads(request.form.get("capture") or "{}")
+        except ValueError as e:
+            raise BadRequest(f"Invalid capture JSON: {e}")
+        upload = request.files.get("screenshot")
+    else:
+        data = request.get_json(silent=True) or {}
+        upload = None
+
+    if not isinstance(data, dict):
+        raise BadRequest("Expected a JSON object")
+
+    # Required Params
+    game_id = data.get("game_id")
+    session_id = data.get("session_id")
+    captured_at = data.get("captured_at")
+
+    validate_data(["game_id", "session_id", "captured_at"], data)
+
+    # Optional Params
+    capture_id = data.get("capture_id") or str(uuid.uuid4())
+    screenshot_hash = data.get("screenshot_hash")
+
+    stored = False
+    if upload is not None:
+        screenshot_hash, _, stored = ScreenshotStore.put(upload.stream)
+    elif screenshot_hash is not None and not ScreenshotStore.exists(screenshot_hash):
+        raise BadRequest("Unknown screenshot_hash; upload the screenshot first")
+    screenshot_ref = (
+        ScreenshotStore.ref(screenshot_hash) if screenshot_hash is not None else None
+    )
+
+    try:
+        Partitions.ensure("raw_capture", [captured_at])
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor() as cur:
+                Queries.execute(
+                    cur,
+                    INSERT_CAPTURE_QUERY,
+                    (
+                        capture_id,
+                        game_id,
+                        session_id,
+                        data.get("run_id"),
+                        captured_at,
+                        data.get("input_device"),
+                        data.get("input_code"),
+                        data.get("mouse_x"),
+                        data.get("mouse_y"),
+                        screenshot_ref,
+                        screenshot_hash,
+                        data.get("image_width"),
+                        data.get("image_height"),
+                        data.get("status", "received"),
+                        data.get("game_version"),
+                        Json(data.get("extra")),
+                    ),
+                )
+                conn.commit()
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    return jsonify(
+        {
+            "message": "Capture inserted successfully",
+            "capture_id": capture_id,
+            "screenshot_hash": screenshot_hash,
+            "screenshot_ref": screenshot_ref,
+            "deduplicated": upload is not None and not stored,
+        }
+    ), 200
+
+
+@Captures.route("/screenshots", methods=["PUT"])
+@swag_from("docs/put_screenshot.yml")
+def put_screenshot():
+    # Read from the socket in chunks; the body is never held in memory.
+    screenshot_hash, size, stored = ScreenshotStore.put(request.stream)
+    return jsonify(
+        {
+            "screenshot_hash": screenshot_hash,
+            "screenshot_ref": ScreenshotStore.ref(screenshot_hash),
+            "bytes": size,
+            "deduplicated": not stored,
+        }
+    ), (201 if stored else 200)
+
+
+@Captures.route("/screenshots/<screenshot_hash>", methods=["GET"])
+@swag_from("docs/get_screenshot.yml")
+def get_screenshot(screenshot_hash):
+    path = ScreenshotStore.path(screenshot_hash)
+    if path is None or not ScreenshotStore.exists(screenshot_hash):
+        raise NotFound()
+
+    # send_file hands the open file to the server, which sends it with
+    # sendfile(2) where it can (gunicorn does).
+    response = send_file(
+        path,
+        mimetype=ScreenshotStore.mimetype(path),
+        conditional=True,
+        etag=screenshot_hash,
+        max_age=31536000,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -1,17 +1,129 @@
+from datetime import datetime, timedelta, timezone
+
 from flasgger import swag_from
 from flask import Blueprint, jsonify, request
 from psycopg.types.json import Json
+from werkzeug.exceptions import BadRequest
 
+from src.buffer import IngestBuffer, buffered_insert
+from src.cache import cached, invalidate
 from src.db import DatabaseConnection
-from src.util import validate_data
+from src.dimensions import Dimensions
+from src.http_cache import conditional
+from src.partitions import Partitions
+from src.queries import Queries, register
+from src.util import (
+    PERCENTILES_SQL,
+    Report,
+    decode_cursor,
+    encode_cursor,
+    parse_batch,
+    parse_format,
+    parse_limit,
+    parse_timestamp,
+    percentile_fields,
+    run_report,
+    shape_records,
+    validate_batch,
+    validate_data,
+)
 
 Events = Blueprint("events", __name__)
 
+MAX_EVENT_BATCH = 10000
+
+CHOICE_STATS_FIELDS = (
+    "choice_name",
+    "total_picks",
+    "total_wins",
+    "win_rate_percentage",
+    "avg_duration_sec",
+    "p50_duration_sec",
+    "p90_duration_sec",
+    "p99_duration_sec",
+)
+
+OFFER_STATS_FIELDS = (
+    "upgrade",
+    "offers",
+    "picks",
+    "pick_rate_percentage",
+    "wins_when_picked",
+    "win_rate_when_picked_percentage",
+)
+
+BOSS_EVENT_FIELDS = ("boss_name", "duration_ms", "damage_taked_in_boss", "defeated")
+
+DEATH_STATS_FIELDS = (
+    "level_index",
+    "room_index",
+    "deaths",
+    "avg_damage_taken_in_room",
+    "max_damage_taken_in_room",
+)
+
+DEATH_EVENT_FIELDS = (
+    "death_fact_id",
+    "level_index",
+    "room_index",
+    "damage_taken_in_room",
+    "upgrade_snapshot",
+)
+
+EVENT_COLUMNS = (
+    "event_id",
+    "game_id",
+    "run_id",
+    "occurred_at",
+    "ingested_at",
+    "event_type_id",
+    "source_capture_id",
+    "confidence",
+    "pipeline_version",
+    "model_version",
+    "details",
+)
+
+
+INSERT_EVENT_QUERY = register(
+    "insert_event",
+    """
+    INSERT INTO event
+    (
+        game_id,
+        run_id,
+        occurred_at,
+        ingested_at,
+        event_type_id,
+        source_capture_id,
+        confidence,
+        pipeline_version,
+        model_version,
+        details
+    )
+    VALUES
+    (
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s
+    )
+    RETURNING event_id;
+    """,
+)
+
 
 @Events.route("/insert", methods=["POST"])
 @swag_from("docs/insert_events.yml")
 def insert_event():
     data = request.get_json() or {}
+    Dimensions.resolve([data])
 
     # Required Params
     game_id = data.get("game_id")
@@ -40,38 +152,12 @@ def insert_event():
     model_version = data.get("model_version")
 
     try:
+        Partitions.ensure("event", [occurred_at])
         with DatabaseConnection.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO event
-                    (
-                        game_id,
-                        run_id,
-                        occurred_at,
-                        ingested_at,
-                        event_type_id,
-                        source_capture_id,
-                        confidence,
-                        pipeline_version,
-                        model_version,
-                        details
-                    )
-                    VALUES
-                    (
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s
-                    )
-                    RETURNING event_id;
-                    """,
+                Queries.execute(
+                    cur,
+                    INSERT_EVENT_QUERY,
                     (
                         game_id,
                         run_id,
@@ -92,13 +178,157 @@ def insert_event():
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    invalidate(game_id)
     return jsonify({"message": "Event inserted successfully", "event_id": event_id})
 
 
+RESERVE_EVENT_IDS_QUERY = register(
+    "reserve_event_ids",
+    """
+    SELECT nextval('event_event_id_seq')
+    FROM generate_series(1, %s)
+    ORDER BY 1;
+    """,
+)
+
+
+@Events.route("/batch/insert", methods=["POST"])
+@swag_from("docs/insert_events_batch.yml")
+def insert_events_batch():
+    events = parse_batch(request, "events")
+    Dimensions.resolve(events)
+
+    validate_batch(
+        [
+            "game_id",
+            "run_id",
+            "occurred_at",
+            "ingested_at",
+            "event_type_id",
+            "details",
+        ],
+        events,
+        MAX_EVENT_BATCH,
+    )
+
+    try:
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor() as cur:
+                event_ids = copy_events(cur, events)
+                conn.commit()
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    invalidate(*(event["game_id"] for event in events))
+    return jsonify(
+        {
+            "message": "Events inserted successfully",
+            "inserted": len(event_ids),
+            "event_ids": event_ids,
+        }
+    ), 200
+
+
+def copy_events(cur, events):
+    """
+    Writes validated event dicts with COPY and returns their ids, in input
+    order. Missing partitions are created first, so call it before the
+    transaction writes to event.
+    """
+    Partitions.ensure("event", (e["occurred_at"] for e in events))
+
+    # Reserve the ids up front so COPY can write them explicitly
+    # and the response keeps the input order.
+    Queries.execute(cur, RESERVE_EVENT_IDS_QUERY, (len(events),))
+    event_ids = [int(row[0]) for row in cur.fetchall()]
+
+    with cur.copy(f"COPY event ({', '.join(EVENT_COLUMNS)}) FROM STDIN") as copy:
+        for event_id, event in zip(event_ids, events):
+            copy.write_row(
+                (
+                    event_id,
+                    event["game_id"],
+                    event["run_id"],
+                    event["occurred_at"],
+                    event["ingested_at"],
+                    event["event_type_id"],
+                    event.get("source_capture_id"),
+                    event.get("confidence"),
+                    event.get("pipeline_version"),
+                    event.get("model_version"),
+                    Json(event["details"]),
+                )
+            )
+    return event_ids
+
+
+UPSERT_UPGRADES_SQL = """
+    INSERT INTO upgrade (game_id, name)
+    SELECT %s, unnest(%s::varchar[])
+    ON CONFLICT DO NOTHING;
+    """
+
+# One statement per choice, so a batch of choices needs no round trip for
+# the generated choice_fact_id. The upgrades must already exist.
+INSERT_CHOICE_WITH_OFFERS_SQL = """
+    WITH cf AS (
+        INSERT INTO choice_fact
+        (
+            game_id,
+            run_id,
+            event_id,
+            occurred_at,
+            stage_index,
+            stage_id,
+            room_index,
+            choice_context,
+            selected_upgrade_id,
+            options_present,
+            updated_at
+        )
+        VALUES
+        (
+            %s,
+            %s,
+            %s,
+            %s,
+            %s,
+            %s,
+            %s,
+            %s,
+            %s,
+            %s,
+            %s
+        )
+        RETURNING choice_fact_id, game_id, selected_upgrade_id
+    ),
+    offers AS (
+        INSERT INTO choice_offer (choice_fact_id, position, option_id, picked)
+        SELECT
+            cf.choice_fact_id,
+            o.position - 1,
+            u.upgrade_id,
+            o.name = cf.selected_upgrade_id
+        FROM cf
+        CROSS JOIN unnest(%s::varchar[]) WITH ORDINALITY AS o(name, position)
+        JOIN upgrade u ON u.game_id = cf.game_id AND u.name = o.name
+    )
+    SELECT choice_fact_id FROM cf;
+    """
+
+UPSERT_UPGRADES_QUERY = register("upsert_upgrades", UPSERT_UPGRADES_SQL)
+INSERT_CHOICE_WITH_OFFERS_QUERY = register(
+    "insert_choice_with_offers", INSERT_CHOICE_WITH_OFFERS_SQL
+)
+
+
 @Events.route("/choices/insert", methods=["POST"])
 @swag_from("docs/insert_choice.yml")
 def insert_choice():
     data = request.get_json() or {}
+    Dimensions.resolve([data])
 
     # Required Params
     game_id = data.get("game_id")
@@ -126,130 +356,188 @@ def insert_choice():
     choice_context = data.get("choice_context")
     options_present = data.get("options_present")
 
+    options = _offered_options(options_present)
+    statements = [
+        (
+            INSERT_CHOICE_WITH_OFFERS_QUERY,
+            (
+                game_id,
+                run_id,
+                event_id,
+                occurred_at,
+                stage_index,
+                stage_id,
+                room_index,
+                choice_context,
+                selected_upgrade_id,
+                Json(options_present),
+                updated_at,
+                options,
+            ),
+        )
+    ]
+    if options:
+        statements.insert(0, (UPSERT_UPGRADES_QUERY, (game_id, options)))
+
     try:
         with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO choice_fact
-                    (
-                        game_id,
-                        run_id,
-                        event_id,
-                        occurred_at,
-                        stage_index,
-                        stage_id,
-                        room_index,
-                        choice_context,
-                        selected_upgrade_id,
-                        options_present,
-                        updated_at
-                    )
-                    VALUES
-                    (
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s
-                    )
-                    RETURNING choice_fact_id;
-                    ;
-                    """,
-                    (
-                        game_id,
-                        run_id,
-                        event_id,
-                        occurred_at,
-                        stage_index,
-                        stage_id,
-                        room_index,
-                        choice_context,
-                        selected_upgrade_id,
-                        Json(options_present),
-                        updated_at,
-                    ),
-                )
-                choice_fact_id = int(cur.fetchone()[0])
-                conn.commit()
+            # The upgrade upsert and the choice go out in one round trip.
+            rows = Queries.pipeline(conn, statements)[-1]
+            choice_fact_id = int(rows[0][0])
+            conn.commit()
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    invalidate(game_id)
     return jsonify(
         {"message": "Choice inserted successfully", "choice_fact_id": choice_fact_id}
     )
 
 
+def _offered_options(options_present):
+    """
+    Returns the upgrade ids in options_present, which is either a list or
+    {"options": [...]}.
+    """
+    if isinstance(options_present, dict):
+        options_present = options_present.get("options")
+    if not isinstance(options_present, list):
+        return []
+    return [
+        option if isinstance(option, str) else str(option)
+        for option in options_present
+        if option is not None
+    ]
+
+
 @Events.route("/choices", methods=["GET"])
+@conditional("choices")
+@cached("choices", ttl=60)
 @swag_from("docs/get_choices.yml")
 def get_choices_stats():
-    args = request.args
+    return run_report(choices_stats_report(request.args))
+
+
+CHOICES_STATS_QUERY = register(
+    "choices_stats",
+    f"""
+    SELECT
+        selected_upgrade_id AS choice_name,
+        picks AS total_picks,
+        wins AS total_wins,
+        ROUND(wins * 100.0 / picks, 2) AS win_rate_percentage,
+        ROUND(
+            (duration_sec_sum / NULLIF(duration_count, 0))::numeric,
+            2
+        ) AS avg_duration_sec,
+        metric_sketch_quantiles(
+            game_id, game_version, 'choice_run_duration_ms', selected_upgrade_id,
+            NULL, NULL, {PERCENTILES_SQL}
+        ) AS duration_ms_percentiles
+    FROM
+        choice_upgrade_rollup
+    WHERE
+        game_id = %s AND game_version = %s AND picks > 0
+    ORDER BY
+        selected_upgrade_id;
+    """,
+)
+
+
+def choices_stats_report(args):
     # Required Params
-    game_id = args.get("game_id")
-    game_version = args.get("game_version")
     validate_data(["game_id", "game_version"], args)
-    try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT
-                        cf.selected_upgrade_id as choice_name,
-                        cf.options_present::jsonb AS items,
-                        COUNT(*) AS total_picks,
-                        SUM(CASE WHEN r.end_reason = 'win' THEN 1 ELSE 0 END) AS total_wins,
-                        ROUND(
-                            SUM(CASE WHEN r.end_reason = 'win' THEN 1 ELSE 0 END) * 100.0 / COUNT(*),
-                            2
-                        ) AS win_rate_percentage,
-                        ROUND(
-                            AVG(EXTRACT(EPOCH FROM (r.ended_at - r.started_at)))::numeric,
-                            2
-                        ) AS avg_duration_sec
-                    FROM
-                        choice_fact cf
-                    JOIN
-                        run r
-                    ON
-                        cf.game_id = r.game_id AND r.run_id = cf.run_id
-                    WHERE
-                        r.game_id = %s AND r.game_version = %s
-                    GROUP BY
-                        cf.selected_upgrade_id,
-                        cf.options_present::jsonb
-                    ORDER BY
-                        cf.selected_upgrade_id,
-                        total_picks DESC;
-                    """,
-                    (game_id, game_version),
-                )
-                rows = cur.fetchall()
-                choices_stats = [
-                    {
-                        "choice_name": row[0],
-                        "items": row[1],
-                        "total_picks": int(row[2]),
-                        "total_wins": int(row[3]),
-                        "win_rate_percentage": float(row[4]),
-                        "avg_duration_sec": float(row[5]),
-                    }
-                    for row in rows
-                ]
+    columnar = parse_format(args)
+
+    def shape(rows):
+        choices_stats = [
+            {
+                "choice_name": row[0],
+                "total_picks": int(row[1]),
+                "total_wins": int(row[2]),
+                "win_rate_percentage": float(row[3]),
+                "avg_duration_sec": float(row[4]) if row[4] is not None else None,
+                **percentile_fields("duration_sec", row[5], scale=1000),
+            }
+            for row in rows
+        ]
+        return {
+            "choices_stats": shape_records(choices_stats, CHOICE_STATS_FIELDS, columnar)
+        }
+
+    return Report(
+        CHOICES_STATS_QUERY,
+        (args.get("game_id"), args.get("game_version")),
+        shape,
+    )
 
-    except Exception as e:
-        return jsonify(
-            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
-        ), 400
 
-    return jsonify({"choices_stats": choices_stats}), 200
+@Events.route("/choices/offers", methods=["GET"])
+@conditional("choice_offers")
+@cached("choice_offers", ttl=60)
+@swag_from("docs/get_choice_offers.yml")
+def get_choice_offer_stats():
+    return run_report(choice_offer_stats_report(request.args))
+
+
+CHOICE_OFFER_STATS_QUERY = register(
+    "choice_offer_stats",
+    """
+    SELECT
+        u.name,
+        s.offers,
+        s.picks,
+        ROUND(s.picks * 100.0 / s.offers, 2),
+        s.wins,
+        ROUND(s.wins * 100.0 / NULLIF(s.picks, 0), 2)
+    FROM (
+        SELECT
+            o.option_id,
+            COUNT(*) AS offers,
+            COUNT(*) FILTER (WHERE o.picked) AS picks,
+            COUNT(*) FILTER (
+                WHERE o.picked AND r.end_reason = 'win'
+            ) AS wins
+        FROM run r
+        JOIN choice_fact cf ON cf.run_id = r.run_id
+        JOIN choice_offer o ON o.choice_fact_id = cf.choice_fact_id
+        WHERE r.game_id = %s AND r.game_version = %s
+        GROUP BY o.option_id
+    ) s
+    JOIN upgrade u ON u.upgrade_id = s.option_id
+    ORDER BY u.name;
+    """,
+)
+
+
+def choice_offer_stats_report(args):
+    # Required Params
+    validate_data(["game_id", "game_version"], args)
+    columnar = parse_format(args)
+
+    def shape(rows):
+        offer_stats = [
+            {
+                "upgrade": row[0],
+                "offers": int(row[1]),
+                "picks": int(row[2]),
+                "pick_rate_percentage": float(row[3]),
+                "wins_when_picked": int(row[4]),
+                "win_rate_when_picked_percentage": (
+                    float(row[5]) if row[5] is not None else None
+                ),
+            }
+            for row in rows
+        ]
+        return {"offer_stats": shape_records(offer_stats, OFFER_STATS_FIELDS, columnar)}
+
+    return Report(
+        CHOICE_OFFER_STATS_QUERY,
+        (args.get("game_id"), args.get("game_version")),
+        shape,
+    )
 
 
 @Events.route("/boss/insert", methods=["POST"])
@@ -285,13 +573,51 @@ def insert_boss():
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    Dimensions.invalidate("boss", game_id)
     return jsonify({"message": "Boss inserted successfully"}), 200
 
 
+INSERT_BOSS_SUMMARY_SQL = """
+    INSERT INTO boss_summary
+    (
+        game_id,
+        run_id,
+        boss_seq,
+        stage_index,
+        stage_id,
+        boss_name,
+        entered_at,
+        defeated_at,
+        duration_ms,
+        defeated,
+        damage_taken_in_boss,
+        updated_at
+    )
+    VALUES
+    (
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s
+    );
+    """
+
+INSERT_BOSS_SUMMARY_QUERY = register("insert_boss_summary", INSERT_BOSS_SUMMARY_SQL)
+
+
 @Events.route("/boss/summary/insert", methods=["POST"])
 @swag_from("docs/insert_boss_summary.yml")
 def insert_boss_summary():
     data = request.get_json() or {}
+    Dimensions.resolve([data])
 
     # Required params
     game_id = data.get("game_id")
@@ -314,167 +640,336 @@ def insert_boss_summary():
         data,
     )
 
+    params = (
+        game_id,
+        run_id,
+        boss_seq,
+        stage_index,
+        stage_id,
+        boss_name,
+        entered_at,
+        defeated_at,
+        duration_ms,
+        defeated,
+        damage_taken_in_boss,
+        updated_at,
+    )
+
+    if IngestBuffer.enabled:
+        return buffered_insert("boss_summary", INSERT_BOSS_SUMMARY_SQL, params, game_id)
+
     try:
         with DatabaseConnection.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO boss_summary
-                    (
-                        game_id,
-                        run_id,
-                        boss_seq,
-                        stage_index,
-                        stage_id,
-                        boss_name,
-                        entered_at,
-                        defeated_at,
-                        duration_ms,
-                        defeated,
-                        damage_taken_in_boss,
-                        updated_at
-                    )
-                    VALUES
-                    (
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s
-                    );
-                    """,
-                    (
-                        game_id,
-                        run_id,
-                        boss_seq,
-                        stage_index,
-                        stage_id,
-                        boss_name,
-                        entered_at,
-                        defeated_at,
-                        duration_ms,
-                        defeated,
-                        damage_taken_in_boss,
-                        updated_at,
-                    ),
-                )
+                Queries.execute(cur, INSERT_BOSS_SUMMARY_QUERY, params)
                 conn.commit()
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    invalidate(game_id)
     return jsonify({"message": "Boss summary inserted successfully"}), 200
 
 
 @Events.route("/boss", methods=["GET"])
+@conditional("boss")
+@cached("boss", ttl=30)
 @swag_from("docs/get_boss.yml")
 def get_bosses():
-    args = request.args
+    return run_report(bosses_report(request.args))
+
 
+_BOSS_EVENTS_SQL = """
+    SELECT
+        bs.run_id,bs.boss_seq,boss_name,duration_ms,damage_taken_in_boss,defeated
+    FROM
+        boss_summary bs
+    JOIN
+      run r
+    ON
+      r.game_id = bs.game_id AND r.run_id = bs.run_id
+    WHERE
+        r.game_id = %s and r.game_version = %s
+    """
+
+BOSS_EVENTS_QUERY = register("boss_events", _BOSS_EVENTS_SQL)
+BOSS_EVENTS_PAGE_QUERY = register(
+    "boss_events_page",
+    _BOSS_EVENTS_SQL
+    + """
+    AND (bs.run_id, bs.boss_seq) > (%s, %s)
+    ORDER BY bs.run_id, bs.boss_seq
+    LIMIT %s;
+    """,
+)
+
+
+def bosses_report(args):
     game_id = args.get("game_id")
     game_version = args.get("game_version")
 
     validate_data(["game_id", "game_version"], args)
+    columnar = parse_format(args)
 
-    try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT
-                        boss_name,duration_ms,damage_taken_in_boss,defeated
-                    FROM
-                        boss_summary bs
-                    JOIN
-                      run r
-                    ON
-                      r.game_id = bs.game_id AND r.run_id = bs.run_id
-                    WHERE
-                        r.game_id = %s and r.game_version = %s;
-                    """,
-                    (game_id, game_version),
+    if args.get("stream") == "true":
+        if columnar:
+            raise BadRequest("format=columns cannot be streamed")
+        return Report(
+            BOSS_EVENTS_QUERY,
+            (game_id, game_version),
+            None,
+            stream_key="boss_events",
+            to_dict=_boss_event,
+        )
+
+    if "limit" not in args and "after" not in args:
+        return Report(
+            BOSS_EVENTS_QUERY,
+            (game_id, game_version),
+            lambda rows: {
+                "boss_events": shape_records(
+                    [_boss_event(row) for row in rows], BOSS_EVENT_FIELDS, columnar
                 )
-                rows = cur.fetchall()
+            },
+        )
 
-    except Exception as e:
-        return jsonify(
-            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
-        ), 400
+    limit = parse_limit(args)
+    after_run_id, after_boss_seq = decode_cursor(args.get("after"), ["", -1])
 
-    return jsonify(
-        {
-            "boss_events": [
-                {
-                    "boss_name": row[0],
-                    "duration_ms": row[1],
-                    "damage_taked_in_boss": row[2],
-                    "defeated": row[3],
-                }
-                for row in rows
-            ]
+    def shape(rows):
+        return {
+            "boss_events": shape_records(
+                [_boss_event(row) for row in rows], BOSS_EVENT_FIELDS, columnar
+            ),
+            "next_after": encode_cursor(rows[-1][:2]) if len(rows) == limit else None,
         }
-    ), 200
+
+    return Report(
+        BOSS_EVENTS_PAGE_QUERY,
+        (game_id, game_version, after_run_id, after_boss_seq, limit),
+        shape,
+    )
+
+
+def _boss_event(row):
+    return {
+        "boss_name": row[2],
+        "duration_ms": row[3],
+        "damage_taked_in_boss": row[4],
+        "defeated": row[5],
+    }
 
 
 @Events.route("/death", methods=["GET"])
+@conditional("death")
+@cached("death", ttl=30)
 @swag_from("docs/get_death.yml")
 def get_deaths():
-    args = request.args
+    return run_report(deaths_report(request.args))
+
 
+def deaths_report(args):
     game_id = args.get("game_id")
     game_version = args.get("game_version")
 
     validate_data(["game_id", "game_version"], args)
 
-    try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT
-                      df.level_index,df.room_index,rs.damage_taken_in_room,df.upgrades_snapshot
-                    FROM
-                      death_fact df
-                    JOIN
-                      room_summary rs
-                    ON
-                      df.game_id = rs.game_id AND df.run_id = rs.run_id
-                    JOIN
-                      run r
-                    ON
-                      r.game_id = df.game_id AND r.run_id = df.run_id
-                    WHERE rs.game_id = %s AND r.game_version = %s;
-                    """,
-                    (game_id, game_version),
-                )
-                rows = cur.fetchall()
+    # Optional params
+    view = args.get("view", "stats")
+    if view not in ("stats", "raw"):
+        raise BadRequest("view must be 'stats' or 'raw'")
+    columnar = parse_format(args)
 
-    except Exception as e:
-        return jsonify(
-            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
-        ), 400
+    if view == "stats":
+        return _death_stats(game_id, game_version, columnar)
 
-    return jsonify(
-        {
-            "death_events": [
-                {
-                    "level_index": row[0],
-                    "room_index": row[1],
-                    "damage_taken_in_boss": row[2],
-                    "upgrade_snapshot": row[3],
-                }
-                for row in rows
-            ]
+    if args.get("stream") == "true":
+        if columnar:
+            raise BadRequest("format=columns cannot be streamed")
+        return Report(
+            DEATH_EVENTS_QUERY,
+            (game_id, game_version),
+            None,
+            stream_key="death_events",
+            to_dict=_death_event,
+        )
+
+    return _death_events(game_id, game_version, args, columnar)
+
+
+DEATH_STATS_QUERY = register(
+    "death_stats",
+    """
+    SELECT
+      df.level_index,
+      df.room_index,
+      COUNT(*) AS deaths,
+      ROUND(AVG(rs.damage_taken_in_room), 2) AS avg_damage_taken_in_room,
+      MAX(rs.damage_taken_in_room) AS max_damage_taken_in_room
+    FROM
+      death_fact df
+    JOIN
+      run r
+    ON
+      r.game_id = df.game_id AND r.run_id = df.run_id
+    LEFT JOIN LATERAL
+      (
+        SELECT damage_taken_in_room
+        FROM room_summary
+        WHERE
+          game_id = df.game_id
+          AND run_id = df.run_id
+          AND stage_index IS NOT DISTINCT FROM df.level_index
+          AND room_index IS NOT DISTINCT FROM df.room_index
+        ORDER BY room_seq DESC
+        LIMIT 1
+      ) rs ON TRUE
+    WHERE r.game_id = %s AND r.game_version = %s
+    GROUP BY
+      df.level_index,
+      df.room_index
+    ORDER BY
+      deaths DESC,
+      df.level_index,
+      df.room_index;
+    """,
+)
+
+
+def _death_stats(game_id, game_version, columnar):
+    """
+    One row per (level_index, room_index) with the deaths that happened
+    there, joined only to the room the run actually died in.
+    """
+
+    def shape(rows):
+        death_stats = [
+            {
+                "level_index": row[0],
+                "room_index": row[1],
+                "deaths": int(row[2]),
+                "avg_damage_taken_in_room": (
+                    float(row[3]) if row[3] is not None else None
+                ),
+                "max_damage_taken_in_room": row[4],
+            }
+            for row in rows
+        ]
+        return {"death_stats": shape_records(death_stats, DEATH_STATS_FIELDS, columnar)}
+
+    return Report(
+        DEATH_STATS_QUERY,
+        (game_id, game_version),
+        shape,
+    )
+
+
+_DEATH_EVENTS_SQL = """
+    SELECT
+      df.death_fact_id,
+      df.level_index,
+      df.room_index,
+      rs.damage_taken_in_room,
+      df.upgrades_snapshot
+    FROM
+      death_fact df
+    JOIN
+      run r
+    ON
+      r.game_id = df.game_id AND r.run_id = df.run_id
+    LEFT JOIN LATERAL
+      (
+        SELECT damage_taken_in_room
+        FROM room_summary
+        WHERE
+          game_id = df.game_id
+          AND run_id = df.run_id
+          AND stage_index IS NOT DISTINCT FROM df.level_index
+          AND room_index IS NOT DISTINCT FROM df.room_index
+        ORDER BY room_seq DESC
+        LIMIT 1
+      ) rs ON TRUE
+    WHERE r.game_id = %s AND r.game_version = %s
+    """
+
+DEATH_EVENTS_QUERY = register("death_events", _DEATH_EVENTS_SQL)
+DEATH_EVENTS_PAGE_QUERY = register(
+    "death_events_page",
+    _DEATH_EVENTS_SQL
+    + """
+    AND df.death_fact_id > %s
+    ORDER BY df.death_fact_id
+    LIMIT %s;
+    """,
+)
+
+
+def _death_events(game_id, game_version, args, columnar):
+    """
+    Raw death rows, one page at a time, ordered by death_fact_id.
+    """
+    limit = parse_limit(args)
+    (after,) = decode_cursor(args.get("after"), [0])
+
+    def shape(rows):
+        return {
+            "death_events": shape_records(
+                [_death_event(row) for row in rows], DEATH_EVENT_FIELDS, columnar
+            ),
+            "next_after": encode_cursor(rows[-1][:1]) if len(rows) == limit else None,
         }
-    ), 200
+
+    return Report(
+        DEATH_EVENTS_PAGE_QUERY,
+        (game_id, game_version, after, limit),
+        shape,
+    )
+
+
+def _death_event(row):
+    return {
+        "death_fact_id": row[0],
+        "level_index": row[1],
+        "room_index": row[2],
+        "damage_taken_in_room": row[3],
+        "upgrade_snapshot": row[4],
+    }
+
+
+INSERT_DEATH_SQL = """
+    INSERT INTO death_fact
+    (
+        game_id,
+        run_id,
+        occurred_at,
+        level_index,
+        level_name,
+        room_index,
+        hp,
+        max_hp,
+        upgrades_snapshot,
+        updated_at,
+        event_id
+    )
+    VALUES
+    (
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s
+    )
+    RETURNING death_fact_id;
+    """
+
+INSERT_DEATH_QUERY = register("insert_death", INSERT_DEATH_SQL)
 
 
 @Events.route("/death/insert", methods=["POST"])
@@ -502,55 +997,27 @@ def insert_death():
     max_hp = data.get("max_hp")
     upgrades_snapshot = data.get("upgrades_snapshot")
 
+    params = (
+        game_id,
+        run_id,
+        occurred_at,
+        level_index,
+        level_name,
+        room_index,
+        hp,
+        max_hp,
+        Json(upgrades_snapshot),
+        updated_at,
+        event_id,
+    )
+
+    if IngestBuffer.enabled:
+        return buffered_insert("death_fact", INSERT_DEATH_SQL, params, game_id)
+
     try:
         with DatabaseConnection.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO death_fact
-                    (
-                        game_id,
-                        run_id,
-                        occurred_at,
-                        level_index,
-                        level_name,
-                        room_index,
-                        hp,
-                        max_hp,
-                        upgrades_snapshot,
-                        updated_at,
-                        event_id
-                    )
-                    VALUES
-                    (
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s
-                    )
-                    RETURNING death_fact_id;
-                    """,
-                    (
-                        game_id,
-                        run_id,
-                        occurred_at,
-                        level_index,
-                        level_name,
-                        room_index,
-                        hp,
-                        max_hp,
-                        Json(upgrades_snapshot),
-                        updated_at,
-                        event_id,
-                    ),
-                )
+                Queries.execute(cur, INSERT_DEATH_QUERY, params)
                 death_fact_id = int(cur.fetchone()[0])
                 conn.commit()
     except Exception as e:
@@ -558,6 +1025,172 @@ def insert_death():
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    invalidate(game_id)
     return jsonify(
         {"message": "Death inserted successfully", "death_fact_id": death_fact_id}
     ), 200
+
+
+@Events.route("/timeseries", methods=["GET"])
+@cached("event_timeseries", ttl=30)
+@swag_from("docs/get_event_timeseries.yml")
+def get_event_timeseries():
+    return run_report(event_timeseries_report(request.args))
+
+
+# Buckets are aligned to this Monday midnight, so "1d" buckets are calendar
+# days and "7d" buckets are ISO weeks.
+TIMESERIES_ORIGIN = datetime(2000, 1, 3)
+TIMESERIES_UNITS = {"m": 60, "h": 3600, "d": 86400}
+TIMESERIES_ALIASES = {"minute": "1m", "hour": "1h", "day": "1d", "week": "7d"}
+MAX_TIMESERIES_BUCKETS = 5000
+MAX_TIMESERIES_STEP = timedelta(days=366)
+HOUR = timedelta(hours=1)
+
+_TIMESERIES_SQL = """
+    SELECT s.bucket, s.event_type_id, et.name, s.events
+    FROM ({source}) s
+    LEFT JOIN event_type et ON et.id = s.event_type_id
+    ORDER BY s.bucket, s.event_type_id;
+"""
+
+# Any bucket size. Reads raw events, which is cheap for the short windows
+# that minute buckets are limited to by MAX_TIMESERIES_BUCKETS.
+EVENT_TIMESERIES_RAW_QUERY = register(
+    "event_timeseries_raw",
+    _TIMESERIES_SQL.format(
+        source="""
+        SELECT
+            date_bin(%s::interval, occurred_at, %s::timestamp) AS bucket,
+            event_type_id,
+            COUNT(*) AS events
+        FROM event
+        WHERE game_id = %s
+          AND occurred_at >= %s
+          AND occurred_at < %s
+          AND (%s::bigint[] IS NULL OR event_type_id = ANY(%s::bigint[]))
+        GROUP BY 1, 2
+        """
+    ),
+)
+
+# Whole-hour buckets: the whole hours of the window come from
+# event_hourly_rollup, only the partial hours at its edges from event.
+EVENT_TIMESERIES_ROLLUP_QUERY = register(
+    "event_timeseries_rollup",
+    _TIMESERIES_SQL.format(
+        source="""
+        SELECT
+            date_bin(%s::interval, t.hour, %s::timestamp) AS bucket,
+            t.event_type_id,
+            SUM(t.events)::bigint AS events
+        FROM (
+            SELECT bucket AS hour, event_type_id, events
+            FROM event_hourly_rollup
+            WHERE game_id = %s
+              AND bucket >= %s
+              AND bucket < %s
+              AND (%s::bigint[] IS NULL OR event_type_id = ANY(%s::bigint[]))
+            UNION ALL
+            SELECT occurred_at, event_type_id, 1
+            FROM event
+            WHERE game_id = %s
+              AND (
+                (occurred_at >= %s AND occurred_at < %s)
+                OR (occurred_at >= %s AND occurred_at < %s)
+              )
+              AND (%s::bigint[] IS NULL OR event_type_id = ANY(%s::bigint[]))
+        ) t
+        GROUP BY 1, 2
+        """
+    ),
+)
+
+
+def _parse_bucket(raw):
+    raw = TIMESERIES_ALIASES.get(raw, raw)
+    count, unit = raw[:-1], raw[-1:]
+    if unit not in TIMESERIES_UNITS or not (count.isascii() and count.isdigit()):
+        raise BadRequest("bucket must be minute, hour, day, week or <n>m, <n>h, <n>d")
+    seconds = int(count) * TIMESERIES_UNITS[unit]
+    if not 1 <= seconds <= MAX_TIMESERIES_STEP.total_seconds():
+        raise BadRequest(
+            f"bucket must be at least 1m and at most {MAX_TIMESERIES_STEP.days}d"
+        )
+    return raw, timedelta(seconds=seconds)
+
+
+def _parse_event_type_ids(raw):
+    if raw is None:
+        return None
+    try:
+        return [int(value) for value in raw.split(",")]
+    except ValueError:
+        raise BadRequest("event_type_id must be a comma-separated list of ids")
+
+
+def event_timeseries_report(args):
+    """
+    Events per type per bucket for a game, gap-filled with zeros. Windows
+    default to the last 24 hours.
+    """
+    game_id = args.get("game_id")
+
+    validate_data(["game_id"], args)
+    bucket, step = _parse_bucket(args.get("bucket", "hour"))
+    end = parse_timestamp(args, "to", datetime.now(timezone.utc).replace(tzinfo=None))
+    start = parse_timestamp(args, "from", end - timedelta(days=1))
+    event_type_ids = _parse_event_type_ids(args.get("event_type_id"))
+
+    if start >= end:
+        raise BadRequest("from must be before to")
+
+    try:
+        first = TIMESERIES_ORIGIN + (start - TIMESERIES_ORIGIN) // step * step
+    except OverflowError:
+        raise BadRequest("from is out of range")
+    buckets = -(-(end - first) // step)
+    if buckets > MAX_TIMESERIES_BUCKETS:
+        raise BadRequest(
+            f"{buckets} buckets requested; use a larger bucket or a shorter window "
+            f"(at most {MAX_TIMESERIES_BUCKETS})"
+        )
+
+    # Whole hours inside the window; empty when it spans no full hour.
+    hours_start = start + (-(start - TIMESERIES_ORIGIN) % HOUR)
+    hours_end = max(
+        TIMESERIES_ORIGIN + (end - TIMESERIES_ORIGIN) // HOUR * HOUR, hours_start
+    )
+    if step % HOUR or hours_start == hours_end:
+        source = "raw"
+        query = EVENT_TIMESERIES_RAW_QUERY
+        params = (step, TIMESERIES_ORIGIN, game_id, start, end)
+        params += (event_type_ids, event_type_ids)
+    else:
+        source = "rollup"
+        query = EVENT_TIMESERIES_ROLLUP_QUERY
+        params = (step, TIMESERIES_ORIGIN, game_id, hours_start, hours_end)
+        params += (event_type_ids, event_type_ids)
+        params += (game_id, start, hours_start, hours_end, end)
+        params += (event_type_ids, event_type_ids)
+
+    def shape(rows):
+        series = {}
+        for row_bucket, event_type_id, name, events in rows:
+            if event_type_id not in series:
+                series[event_type_id] = {
+                    "event_type_id": event_type_id,
+                    "event_type": name,
+                    "counts": [0] * buckets,
+                }
+            series[event_type_id]["counts"][(row_bucket - first) // step] += events
+        return {
+            "bucket": bucket,
+            "source": source,
+            "from": start,
+            "to": end,
+            "buckets": [first + i * step for i in range(buckets)],
+            "series": list(series.values()),
+        }
+
+    return Report(query, params, shape)
@@ -0,0 +1,437 @@
+import os
+
+from flasgger import swag_from
+from flask import Blueprint, jsonify, request
+from werkzeug.exceptions import BadRequest, Conflict
+
+from src.util import validate_batch, validate_data
+
+from ..cache import invalidate
+from ..db import DatabaseConnection
+from ..dimensions import Dimensions
+from ..queries import Queries, register
+from .events import MAX_EVENT_BATCH, copy_events
+
+Jobs = Blueprint("jobs", __name__)
+
+
+class JobQueue:
+    """
+    pipeline_job as a work queue for the vision workers.
+
+    Workers claim batches with FOR UPDATE SKIP LOCKED, so concurrent claims
+    never wait on each other or hand out the same job. A claim is a lease:
+    a job whose worker stops heartbeating goes back to pending once the
+    lease runs out. Failed attempts are retried after an exponential
+    backoff until max_attempts is reached.
+    """
+
+    max_attempts = 5
+    lease_seconds = 300
+    backoff_seconds = 30
+    backoff_max_seconds = 3600
+    max_claim = 100
+
+    @classmethod
+    def initialize(cls):
+        cls.max_attempts = int(os.environ.get("JOB_MAX_ATTEMPTS", cls.max_attempts))
+        cls.lease_seconds = int(os.environ.get("JOB_LEASE_SECONDS", cls.lease_seconds))
+        cls.backoff_seconds = int(
+            os.environ.get("JOB_BACKOFF_SECONDS", cls.backoff_seconds)
+        )
+        cls.backoff_max_seconds = int(
+            os.environ.get("JOB_BACKOFF_MAX_SECONDS", cls.backoff_max_seconds)
+        )
+        cls.max_claim = int(os.environ.get("JOB_MAX_CLAIM", cls.max_claim))
+
+
+# Seconds to wait before the next attempt: backoff * 2^(attempts - 1),
+# capped. Takes (backoff_seconds, backoff_max_seconds).
+_BACKOFF_SQL = (
+    "least(%s * power(2, greatest(attempts - 1, 0)), %s) * interval '1 second'"
+)
+
+RECLAIM_JOBS_QUERY = register(
+    "reclaim_jobs",
+    f"""
+    UPDATE pipeline_job
+    SET
+        status = CASE WHEN attempts >= %s THEN 'failed' ELSE 'pending' END,
+        locked_by = NULL,
+        locked_at = NULL,
+        lease_expires_at = NULL,
+        available_at = now() + {_BACKOFF_SQL},
+        last_error = 'lease expired'
+    WHERE job_id IN (
+        SELECT job_id
+        FROM pipeline_job
+        WHERE status = 'running' AND lease_expires_at < now()
+        ORDER BY lease_expires_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    );
+    """,
+)
+
+CLAIM_JOBS_QUERY = register(
+    "claim_jobs",
+    """
+    WITH claimable AS (
+        SELECT job_id
+        FROM pipeline_job
+        WHERE status = 'pending'
+          AND available_at <= now()
+          AND (%s::varchar IS NULL OR game_id = %s)
+        ORDER BY available_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    ),
+    claimed AS (
+        UPDATE pipeline_job j
+        SET
+            status = 'running',
+            locked_by = %s,
+            locked_at = now(),
+            lease_expires_at = now() + %s * interval '1 second',
+            attempts = j.attempts + 1
+        FROM claimable c
+        WHERE j.job_id = c.job_id
+        RETURNING
+            j.job_id,
+            j.game_id,
+            j.capture_id,
+            j.run_id,
+            j.attempts,
+            j.lease_expires_at,
+            j.pipeline_version,
+            j.model_version
+    )
+    SELECT
+        claimed.job_id,
+        claimed.game_id,
+        claimed.capture_id,
+        claimed.run_id,
+        claimed.attempts,
+        claimed.lease_expires_at,
+        claimed.pipeline_version,
+        claimed.model_version,
+        rc.captured_at,
+        rc.screenshot_hash,
+        rc.screenshot_ref
+    FROM claimed
+    LEFT JOIN raw_capture rc ON rc.capture_id = claimed.capture_id
+    ORDER BY claimed.job_id;
+    """,
+)
+
+HEARTBEAT_JOB_QUERY = register(
+    "heartbeat_job",
+    """
+    UPDATE pipeline_job
+    SET lease_expires_at = now() + %s * interval '1 second'
+    WHERE job_id = %s AND locked_by = %s AND status = 'running'
+    RETURNING lease_expires_at;
+    """,
+)
+
+COMPLETE_JOB_QUERY = register(
+    "complete_job",
+    """
+    UPDATE pipeline_job
+    SET
+        status = 'done',
+        completed_at = now(),
+        lease_expires_at = NULL,
+        last_error = NULL
+    WHERE job_id = %s AND locked_by = %s AND status = 'running'
+    RETURNING game_id, run_id, capture_id, pipeline_version, model_version;
+    """,
+)
+
+LINK_JOB_EVENTS_QUERY = register(
+    "link_job_events",
+    """
+    INSERT INTO pipeline_job_event (job_id, event_id)
+    SELECT %s, unnest(%s::integer[])
+    ON CONFLICT DO NOTHING;
+    """,
+)
+
+FAIL_JOB_QUERY = register(
+    "fail_job",
+    f"""
+    UPDATE pipeline_job
+    SET
+        status = CASE WHEN %s AND attempts < %s THEN 'pending' ELSE 'failed' END,
+        locked_by = NULL,
+        locked_at = NULL,
+        lease_expires_at = NULL,
+        available_at = now() + {_BACKOFF_SQL},
+        last_error = %s
+    WHERE job_id = %s AND locked_by = %s AND status = 'running'
+    RETURNING status, attempts, available_at;
+    """,
+)
+
+JOB_STATS_QUERY = register(
+    "job_stats",
+    """
+    SELECT
+        status,
+        COUNT(*) AS jobs,
+        COUNT(*) FILTER (WHERE status = 'pending' AND available_at <= now()) AS ready,
+        MIN(available_at) FILTER (WHERE status = 'pending') AS oldest_available_at
+    FROM pipeline_job
+    WHERE (%s::varchar IS NULL OR game_id = %s)
+    GROUP BY status
+    ORDER BY status;
+    """,
+)
+
+CLAIM_FIELDS = (
+    "job_id",
+    "game_id",
+    "capture_id",
+    "run_id",
+    "attempts",
+    "lease_expires_at",
+    "pipeline_version",
+    "model_version",
+    "captured_at",
+    "screenshot_hash",
+    "screenshot_ref",
+)
+
+
+def _positive_int(data, key, default, maximum):
+    value = data.get(key, default)
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise BadRequest(f"{key} must be an integer")
+    if not 1 <= value <= maximum:
+        raise BadRequest(f"{key} must be between 1 and {maximum}")
+    return value
+
+
+def _body():
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        raise BadRequest("Expected a JSON object")
+    return data
+
+
+@Jobs.route("/claim", methods=["POST"])
+@swag_from("docs/claim_jobs.yml")
+def claim_jobs():
+    data = _body()
+
+    # Required Params
+    validate_data(["worker_id"], data)
+    worker_id = data.get("worker_id")
+
+    # Optional Params
+    limit = _positive_int(data, "limit", 1, JobQueue.max_claim)
+    lease_seconds = _positive_int(
+        data, "lease_seconds", JobQueue.lease_seconds, 24 * 3600
+    )
+    game_id = data.get("game_id")
+
+    try:
+        with DatabaseConnection.get_connection() as conn:
+            # Expired leases are released in the same round trip, so no
+            # separate sweeper is needed to recover a crashed worker's jobs.
+            _, rows = Queries.pipeline(
+                conn,
+                [
+                    (
+                        RECLAIM_JOBS_QUERY,
+                        (
+                            JobQueue.max_attempts,
+                            JobQueue.backoff_seconds,
+                            JobQueue.backoff_max_seconds,
+                            JobQueue.max_claim,
+                        ),
+                    ),
+                    (
+                        CLAIM_JOBS_QUERY,
+                        (game_id, game_id, limit, worker_id, lease_seconds),
+                    ),
+                ],
+            )
+            conn.commit()
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    return jsonify({"jobs": [dict(zip(CLAIM_FIELDS, row)) for row in rows]}), 200
+
+
+@Jobs.route("/<job_id>/heartbeat", methods=["POST"])
+@swag_from("docs/heartbeat_job.yml")
+def heartbeat_job(job_id):
+    data = _body()
+
+    # Required Params
+    validate_data(["worker_id"], data)
+    worker_id = data.get("worker_id")
+
+    # Optional Params
+    lease_seconds = _positive_int(
+        data, "lease_seconds", JobQueue.lease_seconds, 24 * 3600
+    )
+
+    try:
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor() as cur:
+                Queries.execute(
+                    cur, HEARTBEAT_JOB_QUERY, (lease_seconds, job_id, worker_id)
+                )
+                row = cur.fetchone()
+                conn.commit()
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    if row is None:
+        raise Conflict(f"Job {job_id} is not leased to {worker_id}")
+    return jsonify({"job_id": job_id, "lease_expires_at": row[0]}), 200
+
+
+@Jobs.route("/<job_id>/complete", methods=["POST"])
+@swag_from("docs/complete_job.yml")
+def complete_job(job_id):
+    data = _body()
+
+    # Required Params
+    validate_data(["worker_id"], data)
+    worker_id = data.get("worker_id")
+
+    # Optional Params
+    events = data.get("events") or []
+    if not isinstance(events, list):
+        raise BadRequest("events must be an array")
+    Dimensions.resolve(events)
+    validate_batch(["occurred_at", "event_type_id", "details"], events, MAX_EVENT_BATCH)
+
+    event_ids = []
+    try:
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor() as cur:
+                # Marking the job done locks its row, so the lease cannot be
+                # reclaimed while its events are written.
+                Queries.execute(cur, COMPLETE_JOB_QUERY, (job_id, worker_id))
+                job = cur.fetchone()
+                if job is not None and events:
+                    game_id, run_id, capture_id, pipeline_version, model_version = job
+                    for index, event in enumerate(events):
+                        event.setdefault("game_id", game_id)
+                        event.setdefault("run_id", run_id)
+                        event.setdefault("source_capture_id", capture_id)
+                        event.setdefault("pipeline_version", pipeline_version)
+                        event.setdefault("model_version", model_version)
+                        if event.get("ingested_at") is None:
+                            # Read by the server as the transaction start.
+                            event["ingested_at"] = "now"
+                        if event["run_id"] is None:
+                            raise BadRequest(
+                                f"Item {index}: Missing parameter(s): run_id"
+                            )
+                    event_ids = copy_events(cur, events)
+                    Queries.execute(cur, LINK_JOB_EVENTS_QUERY, (job_id, event_ids))
+                conn.commit()
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    if job is None:
+        raise Conflict(f"Job {job_id} is not leased to {worker_id}")
+
+    if event_ids:
+        invalidate(*(event["game_id"] for event in events))
+    return jsonify(
+        {
+            "message": "Job completed successfully",
+            "job_id": job_id,
+            "inserted": len(event_ids),
+            "event_ids": event_ids,
+        }
+    ), 200
+
+
+@Jobs.route("/<job_id>/fail", methods=["POST"])
+@swag_from("docs/fail_job.yml")
+def fail_job(job_id):
+    data = _body()
+
+    # Required Params
+    validate_data(["worker_id", "error"], data)
+    worker_id = data.get("worker_id")
+
+    # Optional Params
+    retry = data.get("retry", True)
+    if not isinstance(retry, bool):
+        raise BadRequest("retry must be a boolean")
+
+    try:
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor() as cur:
+                Queries.execute(
+                    cur,
+                    FAIL_JOB_QUERY,
+                    (
+                        retry,
+                        JobQueue.max_attempts,
+                        JobQueue.backoff_seconds,
+                        JobQueue.backoff_max_seconds,
+                        str(data.get("error")),
+                        job_id,
+                        worker_id,
+                    ),
+                )
+                row = cur.fetchone()
+                conn.commit()
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    if row is None:
+        raise Conflict(f"Job {job_id} is not leased to {worker_id}")
+    status, attempts, available_at = row
+    return jsonify(
+        {
+            "job_id": job_id,
+            "status": status,
+            "attempts": attempts,
+            "available_at": available_at if status == "pending" else None,
+        }
+    ), 200
+
+
+@Jobs.route("/stats", methods=["GET"])
+@swag_from("docs/get_job_stats.yml")
+def get_job_stats():
+    game_id = request.args.get("game_id")
+
+    try:
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor() as cur:
+                Queries.execute(cur, JOB_STATS_QUERY, (game_id, game_id))
+                rows = cur.fetchall()
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    return jsonify(
+        {
+            status: {
+                "jobs": jobs,
+                "ready": ready,
+                "oldest_available_at": oldest_available_at,
+            }
+            for status, jobs, ready, oldest_available_at in rows
+        }
+    ), 200
@@ -1,17 +1,66 @@
 from flasgger import swag_from
 from flask import Blueprint, jsonify, request
 
-from src.util import validate_data
+from src.util import Report, parse_format, run_report, shape_records, validate_data
 
+from ..buffer import IngestBuffer, buffered_insert
+from ..cache import cached, invalidate
 from ..db import DatabaseConnection
+from ..dimensions import Dimensions
+from ..http_cache import conditional
+from ..queries import Queries, register
 
 Rooms = Blueprint("rooms", __name__)
 
+ROOM_SURVIVAL_FIELDS = (
+    "room_entity_id",
+    "runs_entered",
+    "runs_ended_here",
+    "death_rate",
+    "avg_completion_ms",
+)
+
+INSERT_ROOM_SQL = """
+    INSERT INTO room_summary
+    (
+        game_id,
+        run_id,
+        room_seq,
+        stage_index,
+        stage_id,
+        room_index,
+        room_name_norm,
+        entered_at,
+        exited_at,
+        completion_ms,
+        damage_taken_in_room,
+        updated_at
+    )
+    VALUES
+    (
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s,
+        %s
+    );
+    """
+
+INSERT_ROOM_QUERY = register("insert_room", INSERT_ROOM_SQL)
+
 
 @Rooms.route("/insert", methods=["POST"])
 @swag_from("docs/insert_rooms.yml")
 def insert_rooms():
     data = request.get_json()
+    Dimensions.resolve([data])
 
     # Required Params
     game_id = data.get("game_id")
@@ -31,57 +80,28 @@ def insert_rooms():
     completion_ms = data.get("completion_ms")
     damage_taken_in_room = data.get("damage_taken_in_room")
 
+    params = (
+        game_id,
+        run_id,
+        room_seq,
+        stage_index,
+        stage_id,
+        room_index,
+        room_name_norm,
+        entered_at,
+        exited_at,
+        completion_ms,
+        damage_taken_in_room,
+        updated_at,
+    )
+
+    if IngestBuffer.enabled:
+        return buffered_insert("room_summary", INSERT_ROOM_SQL, params, game_id)
+
     try:
         with DatabaseConnection.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    INSERT INTO room_summary
-                    (
-                        game_id,
-                        run_id,
-                        room_seq,
-                        stage_index,
-                        stage_id,
-                        room_index,
-                        room_name_norm,
-                        entered_at,
-                        exited_at,
-                        completion_ms,
-                        damage_taken_in_room,
-                        updated_at
-                    )
-                    VALUES
-                    (
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s,
-                        %s
-                    );
-                    """,
-                    (
-                        game_id,
-                        run_id,
-                        room_seq,
-                        stage_index,
-                        stage_id,
-                        room_index,
-                        room_name_norm,
-                        entered_at,
-                        exited_at,
-                        completion_ms,
-                        damage_taken_in_room,
-                        updated_at,
-                    ),
-                )
+                Queries.execute(cur, INSERT_ROOM_QUERY, params)
                 conn.commit()
 
     except Exception as e:
@@ -89,79 +109,82 @@ def insert_rooms():
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    invalidate(game_id)
     return jsonify({"message": "Rooms inserted successfully"})
 
 
 @Rooms.route("/rooms/progression", methods=["GET"])
+@conditional("rooms_progression")
+@cached("rooms_progression", ttl=60)
 @swag_from("docs/get_rooms_progression.yml")
 def get_rooms_progression():
-    params = request.args
-
+    return run_report(rooms_progression_report(request.args))
+
+
+ROOMS_PROGRESSION_QUERY = register(
+    "rooms_progression",
+    """
+    SELECT
+        room_name_norm AS room_entity_id,
+        runs_entered,
+        runs_ended_here,
+        ROUND(runs_ended_here::numeric / runs_entered, 2) AS death_rate,
+        ROUND(
+            completion_ms_sum::numeric / NULLIF(completion_count, 0), 2
+        ) AS avg_completion_ms
+    FROM
+        room_funnel_rollup
+    WHERE
+        game_id = %s
+    AND
+        game_version = %s
+    AND
+        runs_entered > 0
+    ORDER BY
+        death_rate DESC,
+        runs_ended_here DESC;
+    """,
+)
+
+
+def rooms_progression_report(params):
     # Required params
     game_id = params.get("game_id")
     game_version = params.get("game_version")
 
     validate_data(["game_id", "game_version"], params)
-
-    try:
-        with DatabaseConnection.get_connection() as conn:
-            with conn.cursor() as cur:
-                cur.execute(
-                    """
-                    SELECT
-                        room_name_norm,
-                        COUNT(*) AS death_count
-                    FROM
-                        room_summary rs
-                    JOIN
-                        run r
-                    ON
-                        r.run_id = rs.run_id AND r.game_id = rs.game_id
-                    WHERE
-                        exited_at IS NULL
-                    AND
-                        r.game_id = %s
-                    AND
-                        game_version = %s
-                    GROUP BY
-                        room_name_norm
-                    ORDER BY
-                        death_count DESC
-                    ;
-                    """,
-                    (game_id, game_version),
-                )
-                row = cur.fetchone()
-
-                if not row:
-                    row = [None, None]
-
-                cur.execute(
-                    """
-                    SELECT
-                        room_name_norm AS room_entity_id,
-                        COUNT(*) AS runs_entered,
-                        COUNT(CASE WHEN exited_at IS NULL THEN 1 END) AS runs_ended_here,
-                        ROUND(COUNT(CASE WHEN exited_at IS NULL THEN 1 END)::numeric / COUNT(*), 2) AS death_rate
-                    FROM
-                        room_summary
-                    GROUP BY
-                        room_name_norm
-                    ORDER BY
-                        death_rate DESC,
-                        runs_ended_here DESC;
-                    """
-                )
-                room_survival_stats = cur.fetchall()
-    except Exception as e:
-        return jsonify(
-            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
-        ), 400
-
-    return jsonify(
-        {
-            "deadliest_level_entity_id": row[0],
-            "total_deaths": row[1],
-            "room_survival_stats": room_survival_stats,
+    columnar = parse_format(params)
+
+    def shape(rows):
+        room_survival_stats = [
+            {
+                "room_entity_id": row[0],
+                "runs_entered": row[1],
+                "runs_ended_here": row[2],
+                "death_rate": float(row[3]),
+                "avg_completion_ms": (float(row[4]) if row[4] is not None else None),
+            }
+            for row in rows
+        ]
+
+        deadliest = max(
+            room_survival_stats,
+            key=lambda room: room["runs_ended_here"],
+            default=None,
+        )
+        if deadliest is None or deadliest["runs_ended_here"] == 0:
+            deadliest = {"room_entity_id": None, "runs_ended_here": None}
+
+        return {
+            "deadliest_level_entity_id": deadliest["room_entity_id"],
+            "total_deaths": deadliest["runs_ended_here"],
+            "room_survival_stats": shape_records(
+                room_survival_stats, ROOM_SURVIVAL_FIELDS, columnar
+            ),
         }
+
+    return Report(
+        ROOMS_PROGRESSION_QUERY,
+        (game_id, game_version),
+        shape,
     )
@@ -3,16 +3,76 @@ import uuid
 from flasgger import swag_from
 from flask import Blueprint, jsonify, request
 from psycopg.types.json import Json
+from werkzeug.exceptions import BadRequest, Conflict
 
+from ..buffer import IngestBuffer, buffered_insert
+from ..cache import cached, invalidate
 from ..db import DatabaseConnection
+from ..dimensions import Dimensions
+from ..http_cache import conditional
+from ..queries import Queries, register
+from ..util import (
+    PERCENTILES_SQL,
+    Report,
+    parse_timestamp,
+    percentile_fields,
+    run_report,
+    validate_batch,
+    validate_data,
+)
+from .events import (
+    INSERT_BOSS_SUMMARY_SQL,
+    INSERT_CHOICE_WITH_OFFERS_SQL,
+    INSERT_DEATH_SQL,
+    UPSERT_UPGRADES_SQL,
+    _offered_options,
+)
+from .rooms import INSERT_ROOM_SQL
 
 Runs = Blueprint("runs", __name__)
 
 
+INSERT_RUN_SUMMARY_SQL = """
+    INSERT INTO run_summary
+    (
+    game_id,
+    run_id,
+    updated_at,
+    started_at,
+    ended_at,
+    duration_ms,
+    result,
+    final_stage_id,
+    final_stage_index,
+    final_room_index,
+    total_damage_taken,
+    choice_count
+    )
+    VALUES
+    (
+    %s,
+    %s,
+    NOW(),
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s
+    );
+    """
+
+INSERT_RUN_SUMMARY_QUERY = register("insert_run_summary", INSERT_RUN_SUMMARY_SQL)
+
+
 @Runs.route("/overview/insert", methods=["POST"])
 @swag_from("docs/insert_runs.yml")
 def insert_runs_summary():
     data = request.get_json()
+    Dimensions.resolve([data])
     # Required Params
     game_id = data.get("game_id")
     run_id = data.get("run_id")
@@ -36,62 +96,34 @@ def insert_runs_summary():
     total_damage_taken = data.get("total_damage_taken")
     choice_count = data.get("choice_count")
 
+    params = (
+        game_id,
+        run_id,
+        started_at,
+        ended_at,
+        duration_ms,
+        result,
+        final_stage_id,
+        final_stage_index,
+        final_room_index,
+        total_damage_taken,
+        choice_count,
+    )
+
+    if IngestBuffer.enabled:
+        return buffered_insert("run_summary", INSERT_RUN_SUMMARY_SQL, params, game_id)
+
     try:
         with DatabaseConnection.get_connection() as conn:
             with conn.cursor() as cur:
-                cur.execute(
-                    """
-                       INSERT INTO run_summary
-                       (
-                       game_id,
-                       run_id,
-                       updated_at,
-                       started_at,
-                       ended_at,
-                       duration_ms,
-                       result,
-                       final_stage_id,
-                       final_stage_index,
-                       final_room_index,
-                       total_damage_taken,
-                       choice_count
-                       )
-                       VALUES
-                       (
-                       %s,
-                       %s,
-                       NOW(),
-                       %s,
-                       %s,
-                       %s,
-                       %s,
-                       %s,
-                       %s,
-                       %s,
-                       %s,
-                       %s
-                       );
-                       """,
-                    (
-                        game_id,
-                        run_id,
-                        started_at,
-                        ended_at,
-                        duration_ms,
-                        result,
-                        final_stage_id,
-                        final_stage_index,
-                        final_room_index,
-                        total_damage_taken,
-                        choice_count,
-                    ),
-                )
+                Queries.execute(cur, INSERT_RUN_SUMMARY_QUERY, params)
                 conn.commit()
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    invalidate(game_id)
     return jsonify({"message": "Runs inserted successfully"})
 
 
@@ -164,83 +196,425 @@ def insert_runs():
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    invalidate(game_id)
     return jsonify({"message": "Runs inserted successfully", "run_id": run_id})
 
 
-@Runs.route("/overview", methods=["GET"])
-@swag_from("docs/get_runs_overview.yml")
-def get_run_overview():
-    args = request.args
+MAX_FINALIZE_ITEMS = 5000
+
+# Insert parameters of each part of a finalized run, in the column order of
+# its INSERT statement. game_id and run_id come from the run itself.
+SUMMARY_COLUMNS = (
+    "game_id",
+    "run_id",
+    "started_at",
+    "ended_at",
+    "duration_ms",
+    "result",
+    "final_stage_id",
+    "final_stage_index",
+    "final_room_index",
+    "total_damage_taken",
+    "choice_count",
+)
+ROOM_COLUMNS = (
+    "game_id",
+    "run_id",
+    "room_seq",
+    "stage_index",
+    "stage_id",
+    "room_index",
+    "room_name_norm",
+    "entered_at",
+    "exited_at",
+    "completion_ms",
+    "damage_taken_in_room",
+    "updated_at",
+)
+BOSS_COLUMNS = (
+    "game_id",
+    "run_id",
+    "boss_seq",
+    "stage_index",
+    "stage_id",
+    "boss_name",
+    "entered_at",
+    "defeated_at",
+    "duration_ms",
+    "defeated",
+    "damage_taken_in_boss",
+    "updated_at",
+)
+CHOICE_COLUMNS = (
+    "game_id",
+    "run_id",
+    "event_id",
+    "occurred_at",
+    "stage_index",
+    "stage_id",
+    "room_index",
+    "choice_context",
+    "selected_upgrade_id",
+    "options_present",
+    "updated_at",
+)
+DEATH_COLUMNS = (
+    "game_id",
+    "run_id",
+    "occurred_at",
+    "level_index",
+    "level_name",
+    "room_index",
+    "hp",
+    "max_hp",
+    "upgrades_snapshot",
+    "updated_at",
+    "event_id",
+)
+
+# A run opened earlier through /insert is closed instead of duplicated. No
+# row comes back when run_id belongs to another game.
+FINALIZE_RUN_SQL = """
+    INSERT INTO run
+    (
+    run_id,
+    game_id,
+    session_id,
+    started_at,
+    ended_at,
+    end_reason,
+    game_version,
+    run_meta
+    )
+    VALUES
+    (
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s,
+    %s
+    )
+    ON CONFLICT (run_id) DO UPDATE SET
+    ended_at = EXCLUDED.ended_at,
+    end_reason = EXCLUDED.end_reason,
+    game_version = COALESCE(EXCLUDED.game_version, run.game_version),
+    run_meta = COALESCE(EXCLUDED.run_meta, run.run_meta)
+    WHERE run.game_id = EXCLUDED.game_id
+    RETURNING run_id;
+    """
+
+
+@Runs.route("/finalize", methods=["POST"])
+@swag_from("docs/finalize_run.yml")
+def finalize_run():
+    data = request.get_json(silent=True) or {}
 
     # Required Params
-    game_id = args.get("game_id")
-    game_version = args.get("game_version")
+    validate_data(["game_id", "session_id", "started_at"], data)
+    game_id = data.get("game_id")
+    run_id = data.get("run_id") or str(uuid.uuid4())
 
-    if not game_id or not game_version:
-        return jsonify(
-            {
-                "error": "Client Side Error",
-                "message": "game_id or game_version is required.",
-                "type": "ValidationError",
-            }
-        ), 400
+    # Optional Params
+    summary = data.get("summary")
+    rooms = data.get("rooms") or []
+    bosses = data.get("bosses") or []
+    choices = data.get("choices") or []
+    death = data.get("death")
+
+    for key, items in (("rooms", rooms), ("bosses", bosses), ("choices", choices)):
+        if not isinstance(items, list):
+            raise BadRequest(f"{key} must be an array")
+    validate_batch(["room_seq", "entered_at", "updated_at"], rooms, MAX_FINALIZE_ITEMS)
+    validate_batch(
+        ["boss_seq", "boss_name", "entered_at", "updated_at"],
+        bosses,
+        MAX_FINALIZE_ITEMS,
+    )
+    validate_batch(
+        ["event_id", "occurred_at", "selected_upgrade_id", "updated_at"],
+        choices,
+        MAX_FINALIZE_ITEMS,
+    )
+    if summary is not None:
+        if not isinstance(summary, dict):
+            raise BadRequest("summary must be an object")
+        validate_data(["result"], summary)
+    if death is not None:
+        if not isinstance(death, dict):
+            raise BadRequest("death must be an object")
+        validate_data(["occurred_at", "updated_at", "event_id"], death)
+
+    # Nested items name stages and bosses of the run's game.
+    for items in (rooms, bosses, choices, [summary] if summary else []):
+        Dimensions.resolve(items, game_id)
 
+    keys = {"game_id": game_id, "run_id": run_id}
+    run_meta = data.get("run_meta")
+    options = sorted(
+        {
+            option
+            for choice in choices
+            for option in _offered_options(choice.get("options_present"))
+        }
+    )
+
+    death_fact_id = None
     try:
         with DatabaseConnection.get_connection() as conn:
             with conn.cursor() as cur:
                 cur.execute(
-                    """
-                       SELECT
-                       *
-                       FROM run
-                       WHERE
-                       game_id = %s AND game_version = %s
-                       ;
-                       """,
-                    (game_id, game_version),
-                )
-                rows = cur.fetchall()
-                result = [
-                    {
-                        "run_id": row[0],
-                        "game_id": row[1],
-                        "session_id": row[2],
-                        "started_at": row[3],
-                        "ended_at": row[4],
-                        "end_reason": row[5],
-                        "game_version": row[6],
-                        "run_meta": row[7],
-                    }
-                    for row in rows
-                ]
-
-                total_runs = len(result)
-                completions = sum(1 for r in result if r.get("end_reason") == "win")
-                deaths = sum(1 for r in result if r.get("end_reason") == "loss")
-                quits = total_runs - completions - deaths
-
-                duration_values = [
-                    (r["ended_at"] - r["started_at"]).total_seconds() * 1000
-                    for r in result
-                    if r.get("started_at") and r.get("ended_at")
-                ]
-                avg_duration_ms = (
-                    sum(duration_values) / len(duration_values)
-                    if duration_values
-                    else None
+                    FINALIZE_RUN_SQL,
+                    (
+                        run_id,
+                        game_id,
+                        data.get("session_id"),
+                        data.get("started_at"),
+                        data.get("ended_at"),
+                        data.get("end_reason"),
+                        data.get("game_version"),
+                        Json(run_meta) if run_meta is not None else None,
+                    ),
                 )
-
-                response = {
-                    "total_runs": total_runs,
-                    "completions": completions,
-                    "deaths": deaths,
-                    "quits": quits,
-                    "avg_duration_ms": avg_duration_ms,
-                }
-
+                # Checked before the run's items are sent: an item failing
+                # against another game's run must not hide the conflict.
+                owned = cur.fetchone() is not None
+                if owned:
+                    # Pipeline mode sends every statement without waiting
+                    # for the previous result; one commit covers the run.
+                    with conn.pipeline():
+                        if summary is not None:
+                            row = {"started_at": data.get("started_at"), **summary}
+                            cur.execute(
+                                INSERT_RUN_SUMMARY_SQL,
+                                _params({**row, **keys}, SUMMARY_COLUMNS),
+                            )
+                        if rooms:
+                            cur.executemany(
+                                INSERT_ROOM_SQL,
+                                [
+                                    _params({**room, **keys}, ROOM_COLUMNS)
+                                    for room in rooms
+                                ],
+                            )
+                        if bosses:
+                            cur.executemany(
+                                INSERT_BOSS_SUMMARY_SQL,
+                                [
+                                    _params({**boss, **keys}, BOSS_COLUMNS)
+                                    for boss in bosses
+                                ],
+                            )
+                        if options:
+                            cur.execute(UPSERT_UPGRADES_SQL, (game_id, options))
+                        if choices:
+                            cur.executemany(
+                                INSERT_CHOICE_WITH_OFFERS_SQL,
+                                [
+                                    _params(
+                                        {
+                                            **choice,
+                                            **keys,
+                                            "options_present": Json(
+                                                choice.get("options_present")
+                                            ),
+                                        },
+                                        CHOICE_COLUMNS,
+                                    )
+                                    + (_offered_options(choice.get("options_present")),)
+                                    for choice in choices
+                                ],
+                            )
+                        if death is not None:
+                            cur.execute(
+                                INSERT_DEATH_SQL,
+                                _params(
+                                    {
+                                        **death,
+                                        **keys,
+                                        "upgrades_snapshot": Json(
+                                            death.get("upgrades_snapshot")
+                                        ),
+                                    },
+                                    DEATH_COLUMNS,
+                                ),
+                            )
+                    if death is not None:
+                        death_fact_id = int(cur.fetchone()[0])
+                    conn.commit()
+                else:
+                    conn.rollback()
     except Exception as e:
         return jsonify(
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
-    return jsonify(response)
+    if not owned:
+        raise Conflict(f"Run {run_id} belongs to another game")
+
+    invalidate(game_id)
+    return jsonify(
+        {
+            "message": "Run finalized successfully",
+            "run_id": run_id,
+            "rooms": len(rooms),
+            "bosses": len(bosses),
+            "choices": len(choices),
+            "death_fact_id": death_fact_id,
+        }
+    ), 200
+
+
+def _params(row, columns):
+    return tuple(row.get(column) for column in columns)
+
+
+@Runs.route("/overview", methods=["GET"])
+@conditional("runs_overview")
+@cached("runs_overview", ttl=30)
+@swag_from("docs/get_runs_overview.yml")
+def get_run_overview():
+    report = run_overview_report(request.args)
+    if report is None:
+        return jsonify(OVERVIEW_PARAMS_ERROR), 400
+    return run_report(report)
+
+
+OVERVIEW_PARAMS_ERROR = {
+    "error": "Client Side Error",
+    "message": "game_id or game_version is required.",
+    "type": "ValidationError",
+}
+
+
+RUN_OVERVIEW_QUERY = register(
+    "run_overview",
+    f"""
+       SELECT
+       COUNT(*) AS total_runs,
+       COUNT(*) FILTER (WHERE end_reason = 'win') AS completions,
+       COUNT(*) FILTER (WHERE end_reason = 'loss') AS deaths,
+       AVG(EXTRACT(EPOCH FROM (ended_at - started_at)) * 1000)
+           AS avg_duration_ms,
+       metric_sketch_quantiles(
+           %s, %s, 'run_duration_ms', '', NULL, NULL, {PERCENTILES_SQL}
+       ) AS duration_ms_percentiles
+       FROM run
+       WHERE
+       game_id = %s AND game_version = %s
+       ;
+       """,
+)
+
+
+def run_overview_report(args):
+    """
+    Returns None when game_id or game_version is missing.
+    """
+    # Required Params
+    game_id = args.get("game_id")
+    game_version = args.get("game_version")
+
+    if not game_id or not game_version:
+        return None
+
+    def shape(rows):
+        total_runs, completions, deaths, avg_duration_ms, percentiles = rows[0]
+        return {
+            "total_runs": total_runs,
+            "completions": completions,
+            "deaths": deaths,
+            "quits": total_runs - completions - deaths,
+            "avg_duration_ms": (
+                float(avg_duration_ms) if avg_duration_ms is not None else None
+            ),
+            **percentile_fields("duration_ms", percentiles),
+        }
+
+    return Report(
+        RUN_OVERVIEW_QUERY,
+        (game_id, game_version, game_id, game_version),
+        shape,
+    )
+
+
+@Runs.route("/percentiles", methods=["GET"])
+@conditional("run_percentiles")
+@cached("run_percentiles", ttl=60)
+@swag_from("docs/get_run_percentiles.yml")
+def get_run_percentiles():
+    return run_report(run_percentiles_report(request.args))
+
+
+# Metrics kept in metric_sketch for a whole game version (key '').
+SKETCH_METRICS = (
+    "run_duration_ms",
+    "run_damage_taken",
+    "room_completion_ms",
+    "room_damage_taken",
+    "boss_duration_ms",
+    "boss_damage_taken",
+)
+
+RUN_PERCENTILES_QUERY = register(
+    "run_percentiles",
+    f"""
+    SELECT
+        m.metric,
+        (
+            SELECT COALESCE(SUM(s.count), 0)
+            FROM metric_sketch s
+            WHERE s.game_id = %s
+              AND s.game_version = %s
+              AND s.metric = m.metric
+              AND s.key = ''
+              AND (%s::date IS NULL OR s.day >= %s)
+              AND (%s::date IS NULL OR s.day < %s)
+        ) AS samples,
+        metric_sketch_quantiles(%s, %s, m.metric, '', %s, %s, {PERCENTILES_SQL})
+    FROM unnest(%s::text[]) WITH ORDINALITY AS m(metric, ord)
+    ORDER BY m.ord;
+    """,
+)
+
+
+def run_percentiles_report(args):
+    """
+    p50/p90/p99 of each metric over the days [from, to), merged from the
+    daily sketches. Both bounds are optional.
+    """
+    game_id = args.get("game_id")
+    game_version = args.get("game_version")
+
+    validate_data(["game_id", "game_version"], args)
+    start = parse_timestamp(args, "from")
+    end = parse_timestamp(args, "to")
+    start = start.date() if start is not None else None
+    end = end.date() if end is not None else None
+
+    metrics = args.get("metric")
+    metrics = metrics.split(",") if metrics else list(SKETCH_METRICS)
+    unknown = sorted(set(metrics) - set(SKETCH_METRICS))
+    if unknown:
+        raise BadRequest(f"Unknown metric(s): {', '.join(unknown)}")
+
+    def shape(rows):
+        return {
+            "game_id": game_id,
+            "game_version": game_version,
+            "from": start,
+            "to": end,
+            "percentiles": {
+                metric: {"samples": int(samples), **percentile_fields(None, values)}
+                for metric, samples, values in rows
+            },
+        }
+
+    return Report(
+        RUN_PERCENTILES_QUERY,
+        (game_id, game_version, start, start, end, end)
+        + (game_id, game_version, start, end, metrics),
+        shape,
+    )
@@ -5,6 +5,7 @@ from psycopg.types.json import Json
 from src.util import validate_data
 
 from ..db import DatabaseConnection
+from ..dimensions import Dimensions
 
 Stage = Blueprint("stage", __name__)
 
@@ -75,4 +76,5 @@ def insert_stage():
             {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
         ), 400
 
+    Dimensions.invalidate("stage", game_id)
     return jsonify({"message": "Stage inserted successfully"})
@@ -0,0 +1,147 @@
+"""
+Conditional GET and response compression for the analytics routes.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from functools import wraps
+
+from flask import Response, g, make_response, request
+
+from src.db import DatabaseConnection
+from src.queries import Queries, register
+
+try:
+    import zstandard
+except ImportError:  # zstd is offered only when the extra is installed
+    zstandard = None
+
+WATERMARK_QUERY = register(
+    "watermark",
+    """
+    SELECT COALESCE(SUM(changes), 0)
+    FROM data_watermark
+    WHERE game_id = %s AND game_version = %s;
+    """,
+)
+
+
+def _watermark(game_id, game_version):
+    with DatabaseConnection.get_connection() as conn:
+        with conn.cursor() as cur:
+            Queries.execute(cur, WATERMARK_QUERY, (game_id, game_version))
+            return cur.fetchone()[0]
+
+
+def etag(name, watermark, args):
+    query = "&".join(f"{k}={v}" for k, v in sorted(args.items(multi=True)))
+    return hashlib.blake2b(
+        f"{name}:{watermark}:{query}".encode(), digest_size=12
+    ).hexdigest()
+
+
+def conditional(name):
+    """
+    Tags a (game_id, game_version) GET view with a weak ETag built from the
+    data_watermark write counter, and answers a matching If-None-Match
+    with 304 before the view runs. The watermark is left in g for @cached,
+    which keys its entries on it.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            game_id = request.args.get("game_id")
+            game_version = request.args.get("game_version")
+            if not game_id or not game_version:
+                return view(*args, **kwargs)
+
+            try:
+                watermark = _watermark(game_id, game_version)
+            except Exception:
+                # No watermark (e.g. migrations not applied): serve uncached.
+                return view(*args, **kwargs)
+
+            g.data_watermark = watermark
+            digest = etag(name, watermark, request.args)
+            if request.if_none_match.contains_weak(digest):
+                response = Response(status=304)
+            else:
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            response.set_etag(digest, weak=True)
+            response.cache_control.no_cache = True
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+class Compression:
+    min_size = 1024
+    gzip_level = 5
+    zstd_level = 3
+    # zstandard compressors must not be shared between threads.
+    _local = threading.local()
+
+    @classmethod
+    def init_app(cls, app):
+        """
+        Compresses JSON responses of at least COMPRESS_MIN_BYTES with zstd or
+        gzip, whichever the client prefers. COMPRESS_MIN_BYTES=0 disables it.
+        """
+        cls.min_size = int(os.environ.get("COMPRESS_MIN_BYTES", cls.min_size))
+        cls.gzip_level = int(os.environ.get("COMPRESS_GZIP_LEVEL", cls.gzip_level))
+        cls.zstd_level = int(os.environ.get("COMPRESS_ZSTD_LEVEL", cls.zstd_level))
+        if cls.min_size > 0:
+            app.after_request(cls._compress)
+
+    @classmethod
+    def encodings(cls):
+        return ("zstd", "gzip") if zstandard is not None else ("gzip",)
+
+    @classmethod
+    def _compress(cls, response):
+        if (
+            response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or response.mimetype != "application/json"
+        ):
+            return response
+
+        response.vary.add("Accept-Encoding")
+        data = response.get_data()
+        if len(data) < cls.min_size:
+            return response
+
+        encoding, body = cls.encode(data, request.accept_encodings)
+        if encoding is None:
+            return response
+
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    @classmethod
+    def encode(cls, data, accept_encodings):
+        """
+        Returns (encoding, compressed body), or (None, data) when the client
+        accepts none of ours.
+        """
+        encoding = accept_encodings.best_match(cls.encodings())
+        if encoding == "zstd":
+            compressor = getattr(cls._local, "zstd", None)
+            if compressor is None:
+                compressor = cls._local.zstd = zstandard.ZstdCompressor(
+                    level=cls.zstd_level
+                )
+            return encoding, compressor.compress(data)
+        if encoding == "gzip":
+            return encoding, gzip.compress(data, compresslevel=cls.gzip_level)
+        return None, data
@@ -0,0 +1,61 @@
+import os
+from datetime import date
+from decimal import Decimal
+
+import orjson
+from flask.json.provider import DefaultJSONProvider
+from psycopg.types.json import Json, Jsonb
+from werkzeug.http import http_date
+
+
+def _default(o):
+    """
+    Types orjson does not encode on its own, or not the way Flask's encoder
+    does. Dates keep Flask's HTTP date format rather than orjson's ISO 8601,
+    and Decimal stays a string, so payloads match the default provider.
+    UUID and dataclasses are handled natively, as Flask encodes them.
+    """
+    if isinstance(o, date):
+        return http_date(o)
+    if isinstance(o, Decimal):
+        return str(o)
+    if isinstance(o, (Json, Jsonb)):
+        return o.obj
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider backed by orjson. Responses are encoded straight to
+    bytes; keys are still sorted unless `sort_keys` is turned off.
+    """
+
+    def _options(self):
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=_default, option=self._options()).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, default=_default, option=self._options()),
+            mimetype=self.mimetype,
+        )
+
+
+def init_app(app):
+    """
+    Installs the provider named by JSON_PROVIDER: "orjson" (default) or
+    "default" for Flask's standard-library encoder.
+    """
+    if os.environ.get("JSON_PROVIDER", "orjson") == "orjson":
+        app.json = OrjsonProvider(app)
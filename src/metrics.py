@@ -0,0 +1,229 @@
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from flask import Response, g, has_request_context, request
+from psycopg import AsyncCursor, Cursor
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROWS_BUCKETS = (1, 10, 100, 1000, 10000, 100000, 1000000)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    A cumulative-bucket histogram keyed by label values, rendered in the
+    Prometheus text format.
+    """
+
+    def __init__(self, name, help_text, buckets, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+            if index < len(self.buckets):
+                series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram",
+        ]
+        with self._lock:
+            snapshot = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+
+        for labels, counts, total, count in snapshot:
+            base = ",".join(
+                f'{name}="{_escape(value)}"'
+                for name, value in zip(self.label_names, labels)
+            )
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {count}')
+            lines.append(f"{self.name}_sum{{{base}}} {total}")
+            lines.append(f"{self.name}_count{{{base}}} {count}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+LABELS = ("endpoint", "game_id")
+
+REQUEST_SECONDS = Histogram(
+    "gamelens_request_duration_seconds",
+    "Request latency.",
+    LATENCY_BUCKETS,
+    LABELS + ("status",),
+)
+POOL_WAIT_SECONDS = Histogram(
+    "gamelens_pool_wait_seconds",
+    "Time spent waiting for a pool connection.",
+    LATENCY_BUCKETS,
+    LABELS,
+)
+QUERY_SECONDS = Histogram(
+    "gamelens_query_duration_seconds",
+    "Time per SQL statement.",
+    LATENCY_BUCKETS,
+    LABELS,
+)
+QUERY_ROWS = Histogram(
+    "gamelens_query_rows",
+    "Rows fetched per SQL statement.",
+    ROWS_BUCKETS,
+    LABELS,
+)
+RESPONSE_BYTES = Histogram(
+    "gamelens_response_bytes",
+    "Response body size.",
+    BYTES_BUCKETS,
+    LABELS,
+)
+
+HISTOGRAMS = (
+    REQUEST_SECONDS,
+    POOL_WAIT_SECONDS,
+    QUERY_SECONDS,
+    QUERY_ROWS,
+    RESPONSE_BYTES,
+)
+
+
+# Set per request by the async app, whose requests Flask cannot see.
+async_labels = ContextVar("async_labels", default=None)
+
+
+def request_labels():
+    """
+    (endpoint, game_id) for the current request, or empty labels outside a
+    request (e.g. the ingest buffer's flusher thread).
+    """
+    labels = async_labels.get()
+    if labels is not None:
+        return labels
+
+    if not has_request_context():
+        return ("", "")
+
+    labels = getattr(g, "metrics_labels", None)
+    if labels is None:
+        game_id = request.args.get("game_id")
+        if game_id is None and request.is_json:
+            body = request.get_json(silent=True)
+            if isinstance(body, dict):
+                game_id = body.get("game_id")
+        labels = g.metrics_labels = (request.endpoint or "", game_id or "")
+    return labels
+
+
+class TimedCursor(Cursor):
+    """
+    Cursor that records statement time and fetched rows per request.
+    """
+
+    def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().execute(query, params, **kwargs)
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - started, *request_labels())
+
+    def executemany(self, query, params_seq, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().executemany(query, params_seq, **kwargs)
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - started, *request_labels())
+
+    def fetchone(self):
+        row = super().fetchone()
+        if row is not None:
+            QUERY_ROWS.observe(1, *request_labels())
+        return row
+
+    def fetchmany(self, size=0):
+        rows = super().fetchmany(size)
+        QUERY_ROWS.observe(len(rows), *request_labels())
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        QUERY_ROWS.observe(len(rows), *request_labels())
+        return rows
+
+
+class TimedAsyncCursor(AsyncCursor):
+    """
+    TimedCursor for the async pool.
+    """
+
+    async def execute(self, query, params=None, **kwargs):
+        started = time.perf_counter()
+        try:
+            return await super().execute(query, params, **kwargs)
+        finally:
+            QUERY_SECONDS.observe(time.perf_counter() - started, *request_labels())
+
+    async def fetchone(self):
+        row = await super().fetchone()
+        if row is not None:
+            QUERY_ROWS.observe(1, *request_labels())
+        return row
+
+    async def fetchall(self):
+        rows = await super().fetchall()
+        QUERY_ROWS.observe(len(rows), *request_labels())
+        return rows
+
+
+def init_app(app, extra_samples=None):
+    """
+    Installs the request hooks and the /metrics route.
+
+    `extra_samples` returns a {name: (type, value)} dict, type "gauge" or
+    "counter", for numbers owned by other components (pool, ingest buffer).
+    """
+
+    @app.before_request
+    def _start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        started = getattr(g, "metrics_started", None)
+        if started is None or request.endpoint == "metrics":
+            return response
+
+        labels = request_labels()
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started, *labels, str(response.status_code)
+        )
+        if not response.is_streamed and response.content_length is not None:
+            RESPONSE_BYTES.observe(response.content_length, *labels)
+        return response
+
+    @app.route("/metrics", methods=["GET"], endpoint="metrics")
+    def metrics():
+        lines = []
+        for histogram in HISTOGRAMS:
+            lines.extend(histogram.render())
+        for name, (kind, value) in (extra_samples() if extra_samples else {}).items():
+            lines.append(f"# TYPE {name} {kind}")
+            lines.append(f"{name} {value}")
+        return Response("\n".join(lines) + "\n", mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,262 @@
+"""
+Applies the versioned SQL migrations in db/migrations.
+
+    python -m src.migrate            # apply pending migrations
+    python -m src.migrate status     # list applied / pending migrations
+    python -m src.migrate baseline   # mark an existing database as up to date
+
+The connection string comes from --conn or PGSQL_CONN.
+"""
+
+import argparse
+import os
+import re
+import sys
+from pathlib import Path
+
+import psycopg
+from psycopg import errors
+
+DB_DIR = Path(__file__).resolve().parent.parent / "db"
+BASELINE = DB_DIR / "GameLens-Schema.sql"
+MIGRATIONS_DIR = DB_DIR / "migrations"
+
+NO_TRANSACTION = "-- migrate: no-transaction"
+LOCK_KEY = 0x67616D656C656E73  # "gamelens"
+
+_FILENAME = re.compile(r"^(\d+)_[\w-]+\.sql$")
+_CONCURRENT_INDEX = re.compile(
+    r'CREATE\s+(?:UNIQUE\s+)?INDEX\s+CONCURRENTLY\s+IF\s+NOT\s+EXISTS\s+"?(\w+)"?',
+    re.IGNORECASE,
+)
+
+
+class Migration:
+    def __init__(self, path):
+        self.path = path
+        self.version = int(_FILENAME.match(path.name).group(1))
+        self.name = path.stem
+        self.sql = path.read_text()
+        self.transactional = not self.sql.lstrip().startswith(NO_TRANSACTION)
+
+
+def load_migrations(directory=MIGRATIONS_DIR):
+    migrations = [
+        Migration(path)
+        for path in sorted(directory.glob("*.sql"))
+        if _FILENAME.match(path.name)
+    ]
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError("Duplicate migration version numbers")
+    return sorted(migrations, key=lambda m: m.version)
+
+
+def split_statements(sql):
+    """
+    Splits a SQL script on top-level semicolons, leaving quoted strings,
+    dollar-quoted bodies and comments intact.
+    """
+    statements, current = [], []
+    i, length = 0, len(sql)
+    dollar_tag = None
+
+    while i < length:
+        char = sql[i]
+        if dollar_tag:
+            if sql.startswith(dollar_tag, i):
+                current.append(dollar_tag)
+                i += len(dollar_tag)
+                dollar_tag = None
+            else:
+                current.append(char)
+                i += 1
+        elif sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = length if end == -1 else end + 1
+        elif char == "'":
+            end = i + 1
+            while end < length:
+                if sql[end] == "'" and not sql.startswith("''", end):
+                    break
+                end += 2 if sql.startswith("''", end) else 1
+            current.append(sql[i : end + 1])
+            i = end + 1
+        elif char == "$":
+            match = re.match(r"\$\w*\$", sql[i:])
+            if match:
+                dollar_tag = match.group(0)
+                current.append(dollar_tag)
+                i += len(dollar_tag)
+            else:
+                current.append(char)
+                i += 1
+        elif char == ";":
+            statement = "".join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+            i += 1
+        else:
+            current.append(char)
+            i += 1
+
+    statement = "".join(current).strip()
+    if statement:
+        statements.append(statement)
+    return statements
+
+
+def _ensure_table(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version integer PRIMARY KEY,
+            name text NOT NULL,
+            applied_at timestamp NOT NULL DEFAULT NOW()
+        )
+        """
+    )
+
+
+def _applied(conn):
+    return {row[0] for row in conn.execute("SELECT version FROM schema_migrations")}
+
+
+def _has_baseline(conn):
+    row = conn.execute("SELECT to_regclass('public.run') IS NOT NULL").fetchone()
+    return row[0]
+
+
+def load_baseline(conn):
+    """
+    Loads the original schema dump. It re-creates the public schema and the
+    indexes behind its primary keys, so those duplicates are skipped.
+    """
+    for statement in split_statements(BASELINE.read_text()):
+        try:
+            with conn.transaction():
+                conn.execute(statement)
+        except (
+            errors.DuplicateSchema,
+            errors.DuplicateTable,
+            errors.DuplicateObject,
+        ):
+            pass
+
+
+def _drop_invalid_index(conn, statement):
+    # A failed CONCURRENTLY build leaves an invalid index behind, which
+    # IF NOT EXISTS would then silently keep.
+    match = _CONCURRENT_INDEX.search(statement)
+    if not match:
+        return
+    row = conn.execute(
+        """
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+        """,
+        (match.group(1),),
+    ).fetchone()
+    if row and row[0]:
+        print(f"  dropping invalid index {match.group(1)}")
+        conn.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{match.group(1)}"')
+
+
+def apply(conn, migration):
+    statements = split_statements(migration.sql)
+    if migration.transactional:
+        with conn.transaction():
+            for statement in statements:
+                conn.execute(statement)
+            _record(conn, migration)
+    else:
+        for statement in statements:
+            _drop_invalid_index(conn, statement)
+            conn.execute(statement)
+        _record(conn, migration)
+
+
+def _record(conn, migration):
+    conn.execute(
+        "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+        (migration.version, migration.name),
+    )
+
+
+def migrate(conn_str, migrations=None):
+    """
+    Loads the baseline on an empty database, then applies every pending
+    migration in version order. Safe to run concurrently: a session-level
+    advisory lock serialises migrators.
+    """
+    migrations = migrations if migrations is not None else load_migrations()
+    applied_now = []
+    with psycopg.connect(conn_str, autocommit=True) as conn:
+        conn.execute("SELECT pg_advisory_lock(%s)", (LOCK_KEY,))
+        try:
+            if not _has_baseline(conn):
+                print("Loading baseline schema...")
+                load_baseline(conn)
+            _ensure_table(conn)
+            applied = _applied(conn)
+            for migration in migrations:
+                if migration.version in applied:
+                    continue
+                print(f"Applying {migration.name}...")
+                apply(conn, migration)
+                applied_now.append(migration.name)
+        finally:
+            conn.execute("SELECT pg_advisory_unlock(%s)", (LOCK_KEY,))
+    return applied_now
+
+
+def baseline(conn_str, migrations=None):
+    """
+    Records every migration as applied without running it, for databases
+    whose schema was already brought up to date by hand.
+    """
+    migrations = migrations if migrations is not None else load_migrations()
+    with psycopg.connect(conn_str, autocommit=True) as conn:
+        _ensure_table(conn)
+        applied = _applied(conn)
+        for migration in migrations:
+            if migration.version not in applied:
+                _record(conn, migration)
+
+
+def status(conn_str, migrations=None):
+    migrations = migrations if migrations is not None else load_migrations()
+    with psycopg.connect(conn_str, autocommit=True) as conn:
+        _ensure_table(conn)
+        applied = _applied(conn)
+    return [(m.name, m.version in applied) for m in migrations]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "command", nargs="?", default="up", choices=("up", "status", "baseline")
+    )
+    parser.add_argument("--conn", default=os.environ.get("PGSQL_CONN"))
+    args = parser.parse_args(argv)
+
+    if not args.conn:
+        parser.error("--conn or PGSQL_CONN is required")
+
+    if args.command == "up":
+        applied = migrate(args.conn)
+        print(f"Applied {len(applied)} migration(s).")
+    elif args.command == "baseline":
+        baseline(args.conn)
+        print("Marked all migrations as applied.")
+    else:
+        for name, done in status(args.conn):
+            print(f"{'applied' if done else 'pending':<8} {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Monthly partitions for event (occurred_at) and raw_capture (captured_at).
+
+    python -m src.partitions ensure --ahead 3
+    python -m src.partitions list
+    python -m src.partitions detach --before 2026-01 [--drop]
+
+Run `ensure` from cron so partitions exist before data arrives; writes that
+land outside the prepared range create their month on first use.
+"""
+
+import argparse
+import os
+import sys
+import threading
+from datetime import datetime
+
+import psycopg
+
+from src.db import DatabaseConnection
+
+PARTITIONED = {"event": "occurred_at", "raw_capture": "captured_at"}
+
+
+def month_of(value):
+    """
+    Returns the first day of the month `value` falls in, or None when it is
+    not an ISO timestamp. Offsets are dropped, as they are when Postgres casts
+    to timestamp without time zone.
+    """
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return datetime(value.year, value.month, 1)
+
+
+class Partitions:
+    lock_timeout_ms = 5000
+
+    _known = set()
+    _lock = threading.Lock()
+
+    @classmethod
+    def ensure(cls, table, timestamps):
+        """
+        Makes sure every month in `timestamps` has a partition of `table`.
+        Months already checked by this process cost nothing.
+
+        Missing months are created on a connection of their own in
+        autocommit, so a rollback of the caller's transaction does not undo
+        them, and the lock the CREATE takes on `table` is released at once.
+        Call it before the caller's transaction writes to `table`: the
+        CREATE would wait for that transaction's lock, until lock_timeout.
+        """
+        months = {month_of(value) for value in timestamps} - {None}
+        with cls._lock:
+            missing = sorted(m for m in months if (table, m) not in cls._known)
+        if not missing:
+            return
+
+        with psycopg.connect(DatabaseConnection._conn_string, autocommit=True) as conn:
+            conn.execute(f"SET lock_timeout = {int(cls.lock_timeout_ms)}")
+            for month in missing:
+                conn.execute(
+                    "SELECT ensure_monthly_partitions(%s, %s, %s)",
+                    (table, month, month),
+                )
+        # Only once committed: a month recorded earlier could be lost.
+        with cls._lock:
+            cls._known.update((table, m) for m in missing)
+
+    @classmethod
+    def reset(cls):
+        with cls._lock:
+            cls._known.clear()
+
+
+def ensure_ahead(conn, months):
+    for table in PARTITIONED:
+        created = conn.execute(
+            """
+            SELECT ensure_monthly_partitions(
+                %s, now()::timestamp, now()::timestamp + make_interval(months => %s)
+            )
+            """,
+            (table, months),
+        ).fetchone()[0]
+        print(f"{table}: {created} partition(s) created")
+
+
+def list_partitions(conn, table):
+    return conn.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+        """,
+        (table,),
+    ).fetchall()
+
+
+def detach_before(conn, before, drop=False):
+    """
+    Detaches (and optionally drops) every monthly partition older than the
+    `before` month. The legacy partitions are left for manual handling.
+    """
+    cutoff = before.strftime("%Y%m")
+    for table in PARTITIONED:
+        prefix = f"{table}_p"
+        for name, _ in list_partitions(conn, table):
+            month = name.removeprefix(prefix)
+            if not name.startswith(prefix) or not month.isdigit() or month >= cutoff:
+                continue
+            conn.execute(f'ALTER TABLE {table} DETACH PARTITION "{name}" CONCURRENTLY')
+            if drop:
+                conn.execute(f'DROP TABLE "{name}"')
+            print(f"{'dropped' if drop else 'detached'} {name}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conn", default=os.environ.get("PGSQL_CONN"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    ensure = commands.add_parser("ensure")
+    ensure.add_argument("--ahead", type=int, default=3, help="months to prepare")
+    commands.add_parser("list")
+    detach = commands.add_parser("detach")
+    detach.add_argument(
+        "--before",
+        required=True,
+        type=lambda value: datetime.strptime(value, "%Y-%m"),
+        help="YYYY-MM; older months are detached",
+    )
+    detach.add_argument("--drop", action="store_true")
+    args = parser.parse_args(argv)
+
+    if not args.conn:
+        parser.error("--conn or PGSQL_CONN is required")
+
+    # DETACH ... CONCURRENTLY cannot run inside a transaction block.
+    with psycopg.connect(args.conn, autocommit=True) as conn:
+        if args.command == "ensure":
+            ensure_ahead(conn, args.ahead)
+        elif args.command == "detach":
+            detach_before(conn, args.before, args.drop)
+        else:
+            for table in PARTITIONED:
+                for name, bound in list_partitions(conn, table):
+                    print(f"{name:<28}{bound}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
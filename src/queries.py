@@ -0,0 +1,106 @@
+import os
+import threading
+import weakref
+from typing import NamedTuple
+
+
+class Query(NamedTuple):
+    name: str
+    sql: str
+
+
+class Queries:
+    """
+    Registry of the hot, named statements.
+
+    A registered Query is executed as a server-side prepared statement: each
+    pooled connection parses and plans it on first use and only binds and
+    executes it afterwards. QUERY_PREPARE=false turns preparing off (e.g.
+    behind a transaction-pooling PgBouncer).
+    """
+
+    prepare = os.environ.get("QUERY_PREPARE", "true").lower() == "true"
+
+    _registry = {}
+    _stats = {}
+    # Names already prepared on each connection, to count prepares.
+    _prepared = weakref.WeakKeyDictionary()
+    _lock = threading.Lock()
+
+    @classmethod
+    def register(cls, name, sql):
+        """
+        Declares a named statement once, at import time.
+        """
+        registered = cls._registry.get(name)
+        if registered is not None and registered.sql != sql:
+            raise ValueError(f"Query {name!r} is already registered")
+        query = cls._registry[name] = Query(name, sql)
+        cls._stats.setdefault(name, {"executions": 0, "prepares": 0})
+        return query
+
+    @classmethod
+    def _record(cls, conn, name):
+        with cls._lock:
+            stats = cls._stats[name]
+            stats["executions"] += 1
+            prepared = cls._prepared.setdefault(conn, set())
+            if cls.prepare and name not in prepared:
+                prepared.add(name)
+                stats["prepares"] += 1
+
+    @classmethod
+    def execute(cls, cur, query, params=None):
+        """
+        cur.execute for a Query or a plain SQL string.
+        """
+        if not isinstance(query, Query):
+            return cur.execute(query, params)
+        cls._record(cur.connection, query.name)
+        return cur.execute(query.sql, params, prepare=cls.prepare)
+
+    @classmethod
+    async def execute_async(cls, cur, query, params=None):
+        if not isinstance(query, Query):
+            return await cur.execute(query, params)
+        cls._record(cur.connection, query.name)
+        return await cur.execute(query.sql, params, prepare=cls.prepare)
+
+    @classmethod
+    def pipeline(cls, conn, statements):
+        """
+        Sends `[(query, params), ...]` in one pipeline, so the batch costs
+        one round trip, and returns each statement's rows (None when it
+        returns none). A later statement may use what an earlier one wrote.
+        """
+        cursors = []
+        try:
+            with conn.pipeline():
+                for query, params in statements:
+                    cur = conn.cursor()
+                    cursors.append(cur)
+                    cls.execute(cur, query, params)
+            return [cur.fetchall() if cur.description else None for cur in cursors]
+        finally:
+            for cur in cursors:
+                cur.close()
+
+    @classmethod
+    def stats(cls):
+        """
+        Executions and prepares per query; the difference is the number of
+        parse/plan cycles the server skipped.
+        """
+        with cls._lock:
+            return {
+                name: {
+                    **stats,
+                    "plans_saved": (
+                        stats["executions"] - stats["prepares"] if cls.prepare else 0
+                    ),
+                }
+                for name, stats in sorted(cls._stats.items())
+            }
+
+
+register = Queries.register
@@ -0,0 +1,176 @@
+"""
+Content-addressed screenshot store on local disk.
+
+    python -m src.screenshots export [--batch 500]
+
+Frames live at <SCREENSHOT_DIR>/<h[:2]>/<h[2:4]>/<h>, where h is the
+SHA-256 of the bytes; raw_capture keeps only the hash and the ref. `export`
+moves screenshots still held in raw_capture.image_data into the store.
+"""
+
+import argparse
+import hashlib
+import io
+import os
+import re
+import sys
+import tempfile
+
+import psycopg
+from werkzeug.exceptions import RequestEntityTooLarge
+
+HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+# Leading bytes of the formats the capture clients send.
+SIGNATURES = (
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"RIFF", "image/webp"),
+)
+
+
+class ScreenshotStore:
+    root = "data/screenshots"
+    max_bytes = 16 * 2**20
+    chunk_size = 2**20
+
+    @classmethod
+    def initialize(cls):
+        cls.root = os.path.abspath(os.environ.get("SCREENSHOT_DIR", cls.root))
+        cls.max_bytes = int(os.environ.get("SCREENSHOT_MAX_BYTES", cls.max_bytes))
+        os.makedirs(os.path.join(cls.root, "tmp"), exist_ok=True)
+
+    @staticmethod
+    def ref(digest):
+        return f"sha256:{digest}"
+
+    @classmethod
+    def path(cls, digest):
+        """
+        File of a frame, or None when `digest` is not a SHA-256 hex string.
+        """
+        if not isinstance(digest, str) or not HASH_PATTERN.match(digest):
+            return None
+        return os.path.join(cls.root, digest[:2], digest[2:4], digest)
+
+    @classmethod
+    def exists(cls, digest):
+        path = cls.path(digest)
+        return path is not None and os.path.exists(path)
+
+    @classmethod
+    def put(cls, stream):
+        """
+        Copies `stream` into the store in chunks while hashing it. Returns
+        (digest, size, stored); stored is False when the frame was already
+        there, in which case the new copy is discarded.
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(cls.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as tmp:
+                while True:
+                    chunk = stream.read(cls.chunk_size)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > cls.max_bytes:
+                        raise RequestEntityTooLarge(
+                            f"Screenshot larger than {cls.max_bytes} bytes"
+                        )
+                    hasher.update(chunk)
+                    tmp.write(chunk)
+                tmp.flush()
+                os.fsync(tmp.fileno())
+
+            digest = hasher.hexdigest()
+            path = cls.path(digest)
+            if os.path.exists(path):
+                return digest, size, False
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Atomic: readers see the whole frame or no file at all.
+            os.replace(tmp_path, path)
+            return digest, size, True
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+    @classmethod
+    def put_bytes(cls, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if cls.exists(digest):
+            return digest, len(data), False
+        return cls.put(io.BytesIO(data))
+
+    @staticmethod
+    def mimetype(path):
+        with open(path, "rb") as f:
+            head = f.read(12)
+        for signature, mimetype in SIGNATURES:
+            if head.startswith(signature):
+                if mimetype == "image/webp" and head[8:12] != b"WEBP":
+                    continue
+                return mimetype
+        return "application/octet-stream"
+
+
+def export(conn, batch=500):
+    """
+    Moves raw_capture.image_data into the store, a batch per transaction,
+    and clears the column. Returns the number of rows moved.
+    """
+    moved = 0
+    while True:
+        with conn.transaction():
+            rows = conn.execute(
+                """
+                SELECT capture_id, captured_at, image_data
+                FROM raw_capture
+                WHERE image_data IS NOT NULL
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED;
+                """,
+                (batch,),
+            ).fetchall()
+            if not rows:
+                return moved
+
+            updates = []
+            for capture_id, captured_at, image_data in rows:
+                digest, _, _ = ScreenshotStore.put_bytes(bytes(image_data))
+                updates.append(
+                    (ScreenshotStore.ref(digest), digest, capture_id, captured_at)
+                )
+            with conn.cursor() as cur:
+                cur.executemany(
+                    """
+                    UPDATE raw_capture
+                    SET screenshot_ref = %s, screenshot_hash = %s, image_data = NULL
+                    WHERE capture_id = %s AND captured_at = %s;
+                    """,
+                    updates,
+                )
+        moved += len(rows)
+        print(f"Exported {moved} screenshots")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--conn", default=os.environ.get("PGSQL_CONN"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    export_cmd = commands.add_parser("export")
+    export_cmd.add_argument("--batch", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    if not args.conn:
+        parser.error("--conn or PGSQL_CONN is required")
+
+    ScreenshotStore.initialize()
+    with psycopg.connect(args.conn, autocommit=True) as conn:
+        export(conn, args.batch)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
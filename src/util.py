@@ -1,7 +1,14 @@
-from typing import List
+import base64
+import json
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional
 
+from flask import Response, current_app, jsonify, stream_with_context
 from werkzeug.exceptions import BadRequest
 
+from src.db import DatabaseConnection
+from src.queries import Queries, Query
+
 
 def validate_data(required_keys: List[str], req_data):
     """
@@ -19,3 +26,207 @@ def validate_data(required_keys: List[str], req_data):
 
     if missing:
         raise BadRequest(f"Missing parameter(s): {', '.join(sorted(missing))}")
+
+
+def parse_batch(req, key: str):
+    """
+    Reads a batch body as either a JSON array, an object wrapping the array
+    under `key`, or newline-delimited JSON (one object per line).
+    """
+    if req.mimetype in ("application/x-ndjson", "application/jsonl"):
+        lines = req.get_data(as_text=True).splitlines()
+        try:
+            items = [json.loads(line) for line in lines if line.strip()]
+        except ValueError as e:
+            raise BadRequest(f"Invalid NDJSON body: {e}")
+    else:
+        data = req.get_json(silent=True)
+        items = data.get(key) if isinstance(data, dict) else data
+
+    if not isinstance(items, list) or not items:
+        raise BadRequest(f"Expected a non-empty array of {key}")
+
+    return items
+
+
+def validate_batch(required_keys: List[str], items, max_size: int):
+    """
+    Validates every item of a batch up front so nothing is written when a
+    single item is malformed. Errors point at the offending index.
+    """
+    if len(items) > max_size:
+        raise BadRequest(f"Batch too large: {len(items)} > {max_size}")
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            raise BadRequest(f"Item {index}: expected a JSON object")
+        try:
+            validate_data(required_keys, item)
+        except BadRequest as e:
+            raise BadRequest(f"Item {index}: {e.description}")
+
+
+def parse_limit(args, default: int = 100, maximum: int = 1000) -> int:
+    """
+    Reads the `limit` query parameter for paginated endpoints.
+    """
+    raw = args.get("limit")
+    if raw is None:
+        return default
+
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise BadRequest("limit must be an integer")
+
+    if not 1 <= limit <= maximum:
+        raise BadRequest(f"limit must be between 1 and {maximum}")
+
+    return limit
+
+
+def parse_format(args) -> bool:
+    """
+    Reads the `format` query parameter of list endpoints. Returns True for
+    the columnar layout (one array per field).
+    """
+    fmt = args.get("format", "rows")
+    if fmt not in ("rows", "columns"):
+        raise BadRequest("format must be 'rows' or 'columns'")
+    return fmt == "columns"
+
+
+def parse_timestamp(args, key: str, default: Optional[datetime] = None):
+    """
+    Reads an ISO 8601 query parameter as a naive timestamp. Offsets are
+    dropped, as they are when Postgres casts to timestamp without time zone.
+    """
+    raw = args.get(key)
+    if raw is None:
+        return default
+
+    try:
+        return datetime.fromisoformat(raw).replace(tzinfo=None)
+    except ValueError:
+        raise BadRequest(f"{key} must be an ISO 8601 timestamp")
+
+
+# Percentiles reported next to averages, read from metric_sketch with
+# metric_sketch_quantiles(..., PERCENTILES_SQL).
+PERCENTILES = ("p50", "p90", "p99")
+PERCENTILES_SQL = "ARRAY[0.5, 0.9, 0.99]::double precision[]"
+
+
+def percentile_fields(suffix: Optional[str], values, scale: float = 1):
+    """
+    `{"p50_<suffix>": ..., "p90_<suffix>": ..., "p99_<suffix>": ...}` (or
+    just "p50", ... without a suffix) from a metric_sketch_quantiles()
+    array, divided by `scale` and rounded.
+    """
+    values = values or [None] * len(PERCENTILES)
+    return {
+        (f"{name}_{suffix}" if suffix else name): (
+            round(value / scale, 2) if value is not None else None
+        )
+        for name, value in zip(PERCENTILES, values)
+    }
+
+
+def shape_records(records, fields, columnar: bool):
+    """
+    Returns `records` as-is, or as `{field: [values...]}` when `columnar`,
+    which drops the repeated keys from large payloads.
+    """
+    if not columnar:
+        return records
+    return {field: [record[field] for record in records] for field in fields}
+
+
+def encode_cursor(values) -> str:
+    """
+    Packs the keyset of the last row on a page into an opaque token.
+    """
+    raw = json.dumps(list(values), separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(token: str, default):
+    """
+    Inverse of encode_cursor. Returns `default` when no token was sent.
+    """
+    if not token:
+        return default
+
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        values = json.loads(raw)
+    except ValueError:
+        raise BadRequest("Invalid cursor")
+
+    if not isinstance(values, list) or len(values) != len(default):
+        raise BadRequest("Invalid cursor")
+
+    return values
+
+
+def stream_json_rows(key: str, query: str, params, to_dict, itersize: int = 2000):
+    """
+    Streams `{"<key>": [...]}` straight from a named server-side cursor, so
+    only `itersize` rows are held in memory at any time.
+    """
+
+    def generate():
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor(name=f"stream_{key}") as cur:
+                cur.itersize = itersize
+                # Server-side cursors are declared, not prepared.
+                cur.execute(query.sql if isinstance(query, Query) else query, params)
+                yield f'{{"{key}":['
+                separator = ""
+                for row in cur:
+                    yield separator + current_app.json.dumps(to_dict(row))
+                    separator = ","
+                yield "]}"
+            conn.commit()
+
+    return Response(stream_with_context(generate()), mimetype="application/json")
+
+
+class Report(NamedTuple):
+    """
+    A read-only analytics query and how to turn its rows into the response
+    body. Built from the request args (all validation happens there), so the
+    sync views and the async app share the SQL and the response shape.
+
+    With `stream_key` set the rows are streamed as `{stream_key: [...]}`,
+    each passed through `to_dict`, and `shape` is unused.
+    """
+
+    query: Query
+    params: tuple
+    shape: Optional[Callable]
+    stream_key: Optional[str] = None
+    to_dict: Optional[Callable] = None
+
+
+def run_report(report: Report):
+    """
+    Executes a Report on the sync pool and returns the Flask response.
+    """
+    if report.stream_key:
+        return stream_json_rows(
+            report.stream_key, report.query, report.params, report.to_dict
+        )
+
+    try:
+        with DatabaseConnection.get_connection() as conn:
+            with conn.cursor() as cur:
+                Queries.execute(cur, report.query, report.params)
+                rows = cur.fetchall()
+
+    except Exception as e:
+        return jsonify(
+            {"error": "Client Side Error", "message": str(e), "type": type(e).__name__}
+        ), 400
+
+    return jsonify(report.shape(rows)), 200